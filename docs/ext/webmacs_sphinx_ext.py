@@ -5,7 +5,7 @@ from docutils.statemachine import ViewList
 from docutils import nodes
 
 from webmacs import COMMANDS
-from webmacs.commands import InteractiveCommand
+from webmacs.commands import InteractiveCommand, LazyCommand
 from webmacs.commands.webjump import WEBJUMPS
 from webmacs.application import _app_requires
 from webmacs.variables import VARIABLES
@@ -55,6 +55,8 @@ class WebmacsCommands(SimpleAutoDirective):
         result = self._result
 
         def get_doc(cmd):
+            if isinstance(cmd, LazyCommand):
+                cmd = cmd.load()
             if isinstance(cmd, InteractiveCommand):
                 cmd = cmd.binding
             return cmd.__doc__ or "No description"
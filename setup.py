@@ -16,6 +16,7 @@
 import os
 import re
 import subprocess
+import importlib.util
 
 from setuptools import setup, Extension, find_packages
 from distutils.command.build_py import build_py as _build_py
@@ -72,21 +73,34 @@ def get_revision():
         return out.strip().decode("utf-8")
 
 
+def write_command_manifest(target_dir):
+    # loaded from its path, importing the webmacs package requires Qt
+    path = os.path.join(THIS_DIR, "webmacs", "command_manifest.py")
+    spec = importlib.util.spec_from_file_location("command_manifest", path)
+    command_manifest = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(command_manifest)
+    command_manifest.write_manifest(
+        os.path.join(target_dir, command_manifest.MANIFEST_FILE))
+
+
 class build_py(_build_py):
     """
-    Override build to generate a revision file to install.
+    Override build to generate a revision file and the commands manifest to
+    install.
     """
     def run(self):
         rev = get_revision()
+        target_dir = os.path.join(self.build_lib, 'webmacs')
         # honor the --dry-run flag
-        if not self.dry_run and rev:
-            target_dir = os.path.join(self.build_lib, 'webmacs')
-
+        if not self.dry_run:
             # mkpath is a distutils helper to create directories
             self.mkpath(target_dir)
 
-            with open(os.path.join(target_dir, 'revision'), 'w') as f:
-                f.write(rev)
+            if rev:
+                with open(os.path.join(target_dir, 'revision'), 'w') as f:
+                    f.write(rev)
+
+            write_command_manifest(target_dir)
 
         # distutils uses old-style classes, so no super()
         _build_py.run(self)
@@ -117,7 +131,7 @@ Some of the features are:
 ''',
     packages=find_packages(),
     install_requires=["dateparser", "jinja2", "pygments"],
-    entry_points={"console_scripts": ["webmacs = webmacs.main:main"]},
+    entry_points={"console_scripts": ["webmacs = webmacs.client:main"]},
     package_data={"webmacs": [
         "scripts/*.js",
         "scheme_handlers/webmacs/js/*.js",
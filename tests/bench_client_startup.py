@@ -0,0 +1,79 @@
+"""
+Benchmark of the command line client, when an instance is running.
+
+A fake instance answers on the ipc socket, and the time to run
+"python -m webmacs.client URL" is measured. Run it with:
+
+    PYTHONPATH=. python tests/bench_client_startup.py [runs]
+"""
+
+import os
+import sys
+import time
+import socket
+import statistics
+import threading
+import subprocess
+
+from webmacs.client import sock_path
+from webmacs.ipc_protocol import MessageDecoder, encode_message
+
+
+INSTANCE = "bench-%d" % os.getpid()
+
+
+def fake_instance(path):
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(5)
+
+    def run():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            decoder, msg = MessageDecoder(), None
+            while msg is None:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                decoder.feed(data)
+                msg = decoder.next_message()
+            if msg is not None:
+                conn.sendall(encode_message({"id": msg["id"],
+                                             "result": True}))
+            conn.close()
+
+    threading.Thread(target=run, daemon=True).start()
+    return server
+
+
+def timeit(cmd, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call(cmd)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main(runs=20):
+    path = sock_path(INSTANCE)
+    server = fake_instance(path)
+    try:
+        client = timeit([sys.executable, "-m", "webmacs.client",
+                         "-i", INSTANCE, "http://example.com"], runs)
+        python = timeit([sys.executable, "-c", "pass"], runs)
+    finally:
+        server.close()
+        os.unlink(path)
+
+    for name, times in (("python startup", python),
+                        ("webmacs client", client)):
+        print("%-15s min %6.1f ms  median %6.1f ms"
+              % (name, min(times) * 1000, statistics.median(times) * 1000))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,99 @@
+"""
+Benchmark of the work done for each keypress.
+
+A local keymap with a parent, and a global keymap are filled with bindings
+like the default ones, and key sequences are looked up by walking each
+active keymap in turn, then with the compiled dispatch table. The conversion
+of Qt key events to KeyPress is timed too, uncached and cached. Run it with:
+
+    PYTHONPATH=. python tests/bench_keymap_dispatch.py [runs]
+"""
+
+import sys
+import timeit
+import string
+
+from PyQt6.QtCore import QEvent, Qt
+from PyQt6.QtGui import QKeyEvent
+
+from webmacs.keymaps import Keymap, KeyPress, dispatch_table
+
+
+def noop(ctx):
+    pass
+
+
+def make_keymaps():
+    glob = Keymap("bench-global")
+    parent = Keymap("bench-minibuffer")
+    local = Keymap("bench-local", parent=parent)
+    for char in string.ascii_lowercase:
+        glob.define_key("C-x " + char, noop)
+        glob.define_key("C-c " + char, noop)
+        glob.define_key("M-" + char, noop)
+        parent.define_key("C-" + char, noop)
+        local.define_key(char, noop)
+    return local, glob
+
+
+def sequences():
+    # a local key, a parent key, a global key and a global prefix key
+    return [[KeyPress.from_str(k) for k in seq.split()]
+            for seq in ("n", "C-n", "M-x", "C-x b")]
+
+
+def walk_keymaps(keymaps, seqs):
+    for seq in seqs:
+        for i in range(1, len(seq) + 1):
+            for keymap in keymaps:
+                if keymap.lookup(seq[:i]):
+                    break
+
+
+def walk_table(keymaps, seqs):
+    for seq in seqs:
+        for i in range(1, len(seq) + 1):
+            dispatch_table(keymaps).lookup(seq[:i])
+
+
+def key_events():
+    return [QKeyEvent(QEvent.Type.KeyPress, key, modifiers, text)
+            for key, modifiers, text in (
+                (Qt.Key.Key_N, Qt.KeyboardModifier.NoModifier, "n"),
+                (Qt.Key.Key_N, Qt.KeyboardModifier.ControlModifier, "\x0e"),
+                (Qt.Key.Key_X, Qt.KeyboardModifier.AltModifier, "x"),
+                (Qt.Key.Key_B, Qt.KeyboardModifier.NoModifier, "b"))]
+
+
+def convert_uncached(events):
+    for event in events:
+        KeyPress._from_qevent(event.key(), event.modifiers(), event.text())
+
+
+def convert(events):
+    for event in events:
+        KeyPress.from_qevent(event)
+
+
+def main(runs=100000):
+    keymaps = make_keymaps()
+    seqs = sequences()
+    keypresses = sum(len(seq) for seq in seqs) * runs
+    for name, fn in (("keymaps walk", walk_keymaps),
+                     ("dispatch table", walk_table)):
+        elapsed = min(timeit.repeat(lambda: fn(keymaps, seqs),
+                                    number=runs, repeat=3))
+        print("%-15s %6.0f ns per keypress"
+              % (name, elapsed / keypresses * 1e9))
+
+    events = key_events()
+    for name, fn in (("qevent uncached", convert_uncached),
+                     ("qevent cached", convert)):
+        elapsed = min(timeit.repeat(lambda: fn(events),
+                                    number=runs, repeat=3))
+        print("%-15s %6.0f ns per key event"
+              % (name, elapsed / (len(events) * runs) * 1e9))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
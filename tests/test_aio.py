@@ -0,0 +1,165 @@
+import sys
+import time
+import asyncio
+import threading
+
+import pytest
+
+from webmacs import aio
+
+
+@pytest.fixture
+def qcoreapp():
+    from PyQt6.QtCore import QCoreApplication
+    app = QCoreApplication.instance() or QCoreApplication([])
+    yield app
+    aio.shutdown_event_loop()
+
+
+def wait_for(app, task, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not task.done():
+        assert time.monotonic() < deadline
+        app.processEvents()
+        time.sleep(0.001)
+    return task.result()
+
+
+def test_sleep_and_gather(qcoreapp):
+    order = []
+
+    async def sleeper(name, delay):
+        await asyncio.sleep(delay)
+        order.append(name)
+        return name
+
+    async def main():
+        return await asyncio.gather(sleeper("slow", 0.05),
+                                    sleeper("fast", 0.01))
+
+    task = aio.create_task(main())
+    assert not order
+    assert wait_for(qcoreapp, task) == ["slow", "fast"]
+    assert order == ["fast", "slow"]
+
+
+def test_cancel_timer(qcoreapp):
+    called = []
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        handle = loop.call_later(0.01, called.append, 1)
+        handle.cancel()
+        await asyncio.sleep(0.03)
+        return loop._timers
+
+    assert wait_for(qcoreapp, aio.create_task(main())) == {}
+    assert called == []
+
+
+def test_run_in_executor(qcoreapp):
+    async def main():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, lambda: threading.current_thread().name)
+
+    name = wait_for(qcoreapp, aio.create_task(main()))
+    assert name.startswith("webmacs-worker")
+
+
+def test_wait_callback(qcoreapp):
+    def fake_run_javascript(script, world_id, callback):
+        aio.event_loop().call_soon(callback, (script, world_id))
+
+    class Page(object):
+        runJavaScript = staticmethod(fake_run_javascript)
+
+    task = aio.create_task(aio.run_javascript(Page(), "1 + 1"))
+    assert wait_for(qcoreapp, task) == ("1 + 1", 0)
+
+
+def test_run_process(qcoreapp):
+    task = aio.create_task(aio.run_process(
+        sys.executable,
+        ["-c", "import sys; sys.stdout.write(sys.stdin.read().upper())"],
+        input=b"hello"))
+    assert wait_for(qcoreapp, task) == (0, b"HELLO", b"")
+
+
+def test_run_process_failed_to_start(qcoreapp):
+    task = aio.create_task(aio.run_process("/nonexistent/webmacs-program"))
+    with pytest.raises(aio.ProcessError):
+        wait_for(qcoreapp, task)
+
+
+def test_async_command(qcoreapp):
+    try:
+        from webmacs.commands import InteractiveCommand
+    except ImportError as exc:
+        pytest.skip("webmacs.commands requires QtWebEngine: %s" % exc)
+
+    async def command(ctx):
+        await asyncio.sleep(0)
+        return ctx * 2
+
+    task = InteractiveCommand(command)(21)
+    assert wait_for(qcoreapp, task) == 42
+    assert InteractiveCommand(lambda ctx: ctx)(1) == 1
+
+
+def test_shutdown_cancels_tasks(qcoreapp):
+    task = aio.create_task(asyncio.sleep(10))
+    aio.shutdown_event_loop()
+    assert task.cancelled()
+
+
+def test_prompt(qcoreapp):
+    from PyQt6.QtCore import QObject, pyqtSignal
+
+    class FakePrompt(QObject):
+        finished = pyqtSignal()
+        closed = pyqtSignal()
+
+        def __init__(self):
+            QObject.__init__(self)
+            self.text = None
+
+        def value(self):
+            return self.text
+
+        def validate(self, text):
+            self.closed.emit()
+            self.text = text
+            self.finished.emit()
+
+    class FakeMinibuffer(object):
+        def __init__(self):
+            self.current = None
+
+        def do_prompt(self, prompt, flash=False, sync=True):
+            assert not sync
+            self.current = prompt
+
+        def prompt(self):
+            return self.current
+
+        def close_prompt(self):
+            self.current.closed.emit()
+
+    minibuffer = FakeMinibuffer()
+    task = aio.create_task(aio.prompt(minibuffer, FakePrompt()))
+    while minibuffer.current is None:
+        qcoreapp.processEvents()
+    minibuffer.current.validate("hello")
+    assert wait_for(qcoreapp, task) == "hello"
+
+    minibuffer = FakeMinibuffer()
+    task = aio.create_task(aio.prompt(minibuffer, FakePrompt()))
+    while minibuffer.current is None:
+        qcoreapp.processEvents()
+    closed = []
+    minibuffer.current.closed.connect(lambda: closed.append(True))
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        wait_for(qcoreapp, task)
+    assert closed == [True]
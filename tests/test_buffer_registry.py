@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from webmacs.buffer_registry import BufferRegistry
+
+
+class Buffer(object):
+    def __init__(self, name, last_use=0):
+        self.name = name
+        self.last_use = last_use
+
+    def __repr__(self):
+        return self.name
+
+
+def test_registry_behaves_like_a_list():
+    rnd = random.Random(42)
+    registry, reference = BufferRegistry(), []
+    for i in range(2000):
+        op = rnd.random()
+        if op < 0.5 or not reference:
+            index = rnd.randint(-len(reference) - 1, len(reference) + 1)
+            buff = Buffer(str(i))
+            registry.insert(index, buff)
+            reference.insert(index, buff)
+        elif op < 0.8:
+            buff = rnd.choice(reference)
+            registry.remove(buff)
+            reference.remove(buff)
+        else:
+            i, j = (rnd.randrange(len(reference)) for _ in range(2))
+            registry.swap(i, j)
+            reference[i], reference[j] = reference[j], reference[i]
+        assert len(registry) == len(reference)
+
+    assert list(registry) == reference
+    assert list(reversed(registry)) == reference[::-1]
+    assert registry[3:10] == reference[3:10]
+    for i, buff in enumerate(reference):
+        assert registry[i] is buff
+        assert registry[i - len(reference)] is buff
+        assert registry.index(buff) == i
+        assert buff in registry
+
+
+def test_registry_errors():
+    a = Buffer("a")
+    registry = BufferRegistry([a])
+    with pytest.raises(ValueError):
+        registry.append(a)
+    with pytest.raises(ValueError):
+        registry.index(Buffer("b"))
+    with pytest.raises(IndexError):
+        registry[1]
+
+
+def test_registry_replace_and_iterate_while_removing():
+    a, b, c, d = (Buffer(n) for n in "abcd")
+    registry = BufferRegistry([a, b, c])
+    registry[registry.index(b)] = d
+    assert list(registry) == [a, d, c]
+    assert b not in registry
+    for buff in registry:
+        registry.remove(buff)
+    assert len(registry) == 0
+
+
+def test_registry_recent():
+    a, b, c = Buffer("a", 3), Buffer("b", 1), Buffer("c", 2)
+    registry = BufferRegistry([a, b, c])
+    assert registry.recent() == [a, c, b]
+
+    b.last_use = 4
+    registry.last_use_changed(b)
+    assert registry.recent() == [b, a, c]
+
+    # going back in time
+    b.last_use = 0
+    registry.last_use_changed(b)
+    assert registry.recent() == [a, c, b]
+
+    registry.remove(a)
+    assert registry.recent() == [c, b]
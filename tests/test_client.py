@@ -0,0 +1,99 @@
+import os
+import sys
+import socket
+import threading
+import subprocess
+
+import pytest
+
+from webmacs import client
+from webmacs.ipc_protocol import MessageDecoder, encode_message
+
+
+def serve_once(path, reply):
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    received = []
+
+    def run():
+        conn, _ = server.accept()
+        decoder = MessageDecoder()
+        msg = None
+        while msg is None:
+            decoder.feed(conn.recv(4096))
+            msg = decoder.next_message()
+        received.append(msg)
+        conn.sendall(encode_message(dict(reply, id=msg["id"])))
+        conn.close()
+        server.close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, received
+
+
+def test_send(tmpdir, monkeypatch):
+    path = str(tmpdir.join("webmacs.test.ipc"))
+    monkeypatch.setattr(client, "sock_path", lambda instance: path)
+    thread, received = serve_once(path, {"result": True})
+
+    opts, user_opts = client.parse_args(["-i", "test", "http://a",
+                                         "http://b", "--my-opt"])
+    assert client.send("test", client.request_data(opts, user_opts)) == {
+        "result": True, "id": 1}
+    thread.join()
+    assert received[0]["urls"] == [
+        "http://a", {"url": "http://b", "target": "background"}]
+    assert received[0]["user_opts"] == ["--my-opt"]
+
+
+def test_daemon_args():
+    opts, _ = client.parse_args(["--daemon"])
+    assert opts.daemon and opts.url is None
+    with pytest.raises(SystemExit):
+        client.parse_args(["--daemon", "http://a"])
+
+
+def test_send_no_instance(tmpdir, monkeypatch):
+    monkeypatch.setattr(client, "sock_path",
+                        lambda instance: str(tmpdir.join("nothing.ipc")))
+    assert client.send("test", {}) is None
+
+
+def test_sock_path(monkeypatch):
+    monkeypatch.setattr(client, "sock_name", lambda instance: "webmacs.ipc")
+    monkeypatch.setenv("TMPDIR", "/tmp/foo")
+    assert client.sock_path("default") == "/tmp/foo/webmacs.ipc"
+
+
+def test_no_heavy_imports():
+    # the client path must stay cheap to start
+    code = ("import sys, webmacs.client;"
+            " print(' '.join(sys.modules))")
+    modules = subprocess.check_output(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(__file__))).decode().split()
+    for name in ("PyQt6.QtCore", "PyQt6.QtNetwork", "PyQt6.QtWebEngineCore",
+                 "PyQt6.QtWidgets", "webmacs.variables", "webmacs.ipc",
+                 "pstats"):
+        assert name not in modules
+
+
+def test_list_instances(tmpdir, monkeypatch):
+    monkeypatch.setenv("TMPDIR", str(tmpdir))
+    monkeypatch.setattr(client, "sock_name", os.path.basename)
+    live = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    live.bind(str(tmpdir.join("webmacs.ipc")))
+    live.listen(1)
+    # a crashed instance leaves its socket file
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    dead.bind(str(tmpdir.join("webmacs.dead.ipc")))
+    dead.close()
+    tmpdir.join("other.ipc").write("")
+    try:
+        assert client.list_instances(check=False) == ["dead", "default"]
+        assert client.list_instances() == ["default"]
+        assert not tmpdir.join("webmacs.dead.ipc").exists()
+    finally:
+        live.close()
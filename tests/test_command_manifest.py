@@ -0,0 +1,90 @@
+import json
+import shutil
+
+import pytest
+
+from webmacs import command_manifest
+from webmacs.command_manifest import scan_source, build_manifest, \
+    load_manifest, LAZY_MODULES, MANIFEST_FILE
+
+
+SOURCE = '''
+@define_command("do-thing")
+def do_thing(ctx):
+    """
+    Do the thing.
+    """
+
+
+@define_command("hidden", visible=False)
+def hidden(ctx):
+    "Hidden."
+
+
+@autocmd
+def shift_left(ctx):
+    "Shift."
+
+
+def not_a_command(ctx):
+    @define_command("nested")
+    def nested(ctx):
+        pass
+
+
+register_prompt_opener_commands("open-x", XPrompt, "Open x")
+'''
+
+
+def test_scan_source():
+    commands = scan_source(SOURCE, ".commands.test")
+    assert [(c["name"], c["visible"]) for c in commands] == [
+        ("do-thing", True), ("hidden", False), ("shift-left", True),
+        ("open-x-new-window", True), ("open-x-new-buffer", True),
+        ("open-x", True)]
+    assert commands[0]["doc"].strip() == "Do the thing."
+    assert commands[0]["module"] == ".commands.test"
+    assert commands[-1]["doc"].startswith("Open x.")
+
+
+def test_manifest_of_lazy_modules():
+    commands = {c["name"]: c for c in build_manifest()["commands"]}
+    assert commands["close-buffer"]["module"] == ".commands.webbuffer"
+    assert commands["bookmark-open-new-buffer"]["module"] == \
+        ".commands.global"
+    assert commands["M-x"]["visible"] is False
+
+
+def test_load_manifest_outdated(tmpdir):
+    package_dir = tmpdir.mkdir("webmacs")
+    package_dir.mkdir("commands")
+    for module in LAZY_MODULES:
+        path = module.lstrip(".").replace(".", "/") + ".py"
+        shutil.copy(command_manifest._module_path(
+            module, command_manifest.THIS_DIR), str(package_dir.join(path)))
+
+    manifest = build_manifest(str(package_dir))
+    manifest["commands"] = [{"name": "from-file"}]
+    package_dir.join(MANIFEST_FILE).write(json.dumps(manifest))
+    assert load_manifest(str(package_dir)) == [{"name": "from-file"}]
+
+    package_dir.join("commands", "minibuffer.py").write(SOURCE)
+    names = [c["name"] for c in load_manifest(str(package_dir))]
+    assert "do-thing" in names and "from-file" not in names
+
+
+def test_lazy_modules_define_no_variables():
+    import importlib
+    try:
+        from webmacs.application import _app_requires
+    except ImportError as exc:
+        pytest.skip("webmacs.application requires QtWebEngine: %s" % exc)
+    from webmacs.variables import VARIABLES
+
+    # what is imported before the user init module
+    _app_requires()
+    assert "session-journal" in VARIABLES
+    defined = set(VARIABLES)
+    for module in LAZY_MODULES:
+        importlib.import_module(module, "webmacs")
+        assert set(VARIABLES) == defined, module
@@ -0,0 +1,44 @@
+import os
+
+from webmacs import content_scripts
+
+
+def test_bootstrap_source():
+    source = content_scripts.bootstrap_source(42)
+    assert source.startswith("WEBMACS_SECURE_ID = 42;")
+    assert "function webmacs_load_module" in source
+    # the modules are injected in the pages using them
+    for name in content_scripts.MODULES:
+        assert 'webmacs_define_module("%s"' % name not in source
+    # the module code is never evaluated
+    assert "eval(" not in source
+
+
+def test_bootstrap_source_with_modules():
+    source = content_scripts.bootstrap_source(42, modules=True)
+    # defined, wrapped to run on demand
+    for name in content_scripts.MODULES:
+        assert 'webmacs_define_module("%s", function() {' % name in source
+    assert "return {hints: hints, currentLinkUrl: currentLinkUrl};" in source
+    assert len(source) > len(content_scripts.bootstrap_source(42))
+
+
+def test_modules_exist():
+    for filename, exports in content_scripts.MODULES.values():
+        assert filename not in content_scripts.BOOTSTRAP
+        assert os.path.isfile(os.path.join(content_scripts.SCRIPTS_DIR,
+                                           filename))
+        assert exports
+
+
+def test_load_script():
+    assert content_scripts.load_script("textzoom") \
+        == 'webmacs_load_module("textzoom", false);\n'
+    assert content_scripts.load_script("textzoom", sub_frames=True) \
+        == 'webmacs_load_module("textzoom", true);\n'
+
+
+def test_module_source():
+    source = content_scripts.module_source("textzoom")
+    assert source.startswith('webmacs_define_module("textzoom", function() {')
+    assert source.endswith('webmacs_load_module("textzoom", false);\n')
@@ -0,0 +1,89 @@
+import struct
+
+import pytest
+
+from webmacs.ipc_protocol import MessageDecoder, ProtocolError, \
+    encode_message, binary_dumps, binary_loads, HEADER_FMT
+
+
+MESSAGE = {"id": 3, "method": "open-urls", "params": {
+    "urls": ["http://a", {"url": "http://b", "target": "background"}],
+    "ratio": 1.5, "big": 2 ** 40, "neg": -5, "raw": b"\x00\xff",
+    "flags": [True, False, None], "unicode": "été"}}
+
+
+def test_binary_roundtrip():
+    assert binary_loads(binary_dumps(MESSAGE)) == MESSAGE
+    assert len(binary_dumps({"id": 1})) < len(b'{"id": 1}')
+
+
+@pytest.mark.parametrize("data", [b"", b"s\x05ab", b"NN", b"z"])
+def test_binary_invalid(data):
+    with pytest.raises(ProtocolError):
+        binary_loads(data)
+
+
+def test_binary_nesting():
+    nested = [[[1]]]
+    assert binary_loads(binary_dumps(nested)) == nested
+    with pytest.raises(ProtocolError):
+        binary_loads(b"l\x01" * 5000 + b"N")
+    with pytest.raises(ProtocolError):
+        binary_loads(b"m\x01N" * 5000 + b"N")
+
+
+@pytest.mark.parametrize("encoding,data", [
+    ("binary", b"l\x01" * 5000 + b"N"),
+    ("json", b"[" * 100000 + b"]" * 100000),
+])
+def test_decoder_deep_nesting(encoding, data):
+    decoder = MessageDecoder(encoding=encoding)
+    decoder.feed(struct.pack(HEADER_FMT, len(data)) + data)
+    with pytest.raises(ProtocolError):
+        decoder.next_message()
+
+
+@pytest.mark.parametrize("encoding", ["json", "binary"])
+def test_decoder_partial_and_many(encoding):
+    msg = dict(MESSAGE) if encoding == "binary" else {"id": 1, "a": "b"}
+    data = b"".join(encode_message(dict(msg, id=i), encoding)
+                    for i in range(3))
+    decoder = MessageDecoder(encoding=encoding)
+    received = []
+    # feed byte per byte, headers included
+    for i in range(len(data)):
+        decoder.feed(data[i:i + 1])
+        msg = decoder.next_message()
+        if msg is not None:
+            received.append(msg["id"])
+    assert received == [0, 1, 2]
+    assert decoder.next_message() is None
+
+
+def test_decoder_grows_and_reuses_buffer():
+    decoder = MessageDecoder()
+    big = {"data": "x" * 200000}
+    decoder.feed(encode_message(big) + encode_message({"id": 1}))
+    assert decoder.next_message() == big
+    assert decoder.next_message() == {"id": 1}
+    size = len(decoder._buffer)
+    for i in range(100):
+        decoder.feed(encode_message({"id": i}))
+        assert decoder.next_message() == {"id": i}
+    assert len(decoder._buffer) == size
+
+
+def test_decoder_switch_encoding():
+    decoder = MessageDecoder()
+    decoder.feed(encode_message({"id": 1}) +
+                 encode_message({"id": 2}, "binary"))
+    assert decoder.next_message() == {"id": 1}
+    decoder.encoding = "binary"
+    assert decoder.next_message() == {"id": 2}
+
+
+def test_decoder_max_size():
+    decoder = MessageDecoder(max_size=10)
+    decoder.feed(encode_message({"data": "x" * 20})[:6])
+    with pytest.raises(ProtocolError):
+        decoder.next_message()
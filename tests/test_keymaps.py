@@ -0,0 +1,105 @@
+import pytest
+
+from webmacs.keymaps import Keymap, KeyPress, KEYMAPS, dispatch_table
+
+
+def cmd_a(ctx):
+    pass
+
+
+def cmd_b(ctx):
+    pass
+
+
+def cmd_c(ctx):
+    pass
+
+
+@pytest.fixture
+def keymaps():
+    created = []
+
+    def make(name, parent=None):
+        km = Keymap("test-" + name, parent=parent)
+        created.append(km.name)
+        return km
+    yield make
+    for name in created:
+        del KEYMAPS[name]
+
+
+def keys(text):
+    return [KeyPress.from_str(k) for k in text.split()]
+
+
+def test_dispatch_priorities(keymaps):
+    glob = keymaps("global")
+    parent = keymaps("parent")
+    local = keymaps("local", parent=parent)
+    glob.define_key("C-x b", cmd_a)
+    glob.define_key("C-x k", cmd_a)
+    glob.define_key("C-g", cmd_a)
+    parent.define_key("C-g", cmd_b)
+    parent.define_key("n", cmd_b)
+    local.define_key("C-x b", cmd_c)
+
+    table = dispatch_table((local, glob))
+    # the local keymap wins, then its parent, then the global keymap
+    assert table.lookup(keys("C-x b")) == (True, cmd_c, local)
+    assert table.lookup(keys("C-g")) == (True, cmd_b, local)
+    assert table.lookup(keys("n")) == (True, cmd_b, local)
+    # prefix keys are merged
+    assert table.lookup(keys("C-x")) == (False, None, local)
+    assert table.lookup(keys("C-x k")) == (True, cmd_a, glob)
+    assert table.lookup(keys("C-x z")) is None
+    assert table.lookup(keys("z")) is None
+
+    # same results as looking up each keymap in turn
+    for seq in ("C-x b", "C-g", "n", "C-x k", "C-x z"):
+        expected = local.lookup(keys(seq)) or glob.lookup(keys(seq))
+        result = table.lookup(keys(seq))
+        assert (result and result.command) == \
+            (expected and expected.command)
+
+
+def test_dispatch_invalidation(keymaps):
+    glob = keymaps("global")
+    local = keymaps("local")
+    table = dispatch_table((local, glob))
+    assert dispatch_table((local, glob)) is table
+    assert table.lookup(keys("a")) is None
+
+    glob.define_key("a", cmd_a)
+    table = dispatch_table((local, glob))
+    assert table.lookup(keys("a")) == (True, cmd_a, glob)
+
+    other = keymaps("other")
+    other.define_key("a", cmd_b)
+    local.parent = other
+    assert dispatch_table((local, glob)).lookup(keys("a")) == \
+        (True, cmd_b, local)
+
+    other.undefine_key("a")
+    assert dispatch_table((local, glob)).lookup(keys("a")) == \
+        (True, cmd_a, glob)
+
+
+def test_from_qevent_interned():
+    from PyQt6.QtCore import QEvent, Qt
+    from PyQt6.QtGui import QKeyEvent
+
+    def event(key, modifiers, text):
+        return QKeyEvent(QEvent.Type.KeyPress, key, modifiers, text)
+
+    ctrl_a = KeyPress.from_qevent(
+        event(Qt.Key.Key_A, Qt.KeyboardModifier.ControlModifier, "a"))
+    assert ctrl_a == KeyPress.from_str("C-a")
+    assert KeyPress.from_qevent(
+        event(Qt.Key.Key_A, Qt.KeyboardModifier.ControlModifier, "a")) \
+        is ctrl_a
+
+    upper = KeyPress.from_qevent(
+        event(Qt.Key.Key_A, Qt.KeyboardModifier.ShiftModifier, "A"))
+    assert upper == KeyPress.from_str("A") and upper is not ctrl_a
+    assert KeyPress.from_qevent(
+        event(Qt.Key.Key_unknown, Qt.KeyboardModifier.NoModifier, "")) is None
@@ -0,0 +1,42 @@
+from webmacs.killed_buffers_store import KilledBuffersStore
+
+
+def test_killed_buffers_ring(tmpdir):
+    path = str(tmpdir.join("killedbuffers.db"))
+    store = KilledBuffersStore(path)
+    store.add("http://a", "a", b"icon", b"history-a", limit=2)
+    store.add("http://b", "b", b"icon", b"history-b", limit=2)
+    store.add("http://c", "c", None, None, limit=2)
+    # queued until flushed
+    assert store._conn.execute(
+        "SELECT COUNT(*) FROM killedbuffers").fetchone() == (0,)
+    store.flush()
+    assert [e[1] for e in store.entries()] == ["http://c", "http://b"]
+
+    # the icon is shared, history-a is gone with its entry
+    assert store._conn.execute("SELECT COUNT(*) FROM blobs").fetchone() == (2,)
+
+    # persisted
+    store = KilledBuffersStore(path)
+    id, url, title, icon = store.entries()[1]
+    assert store.blob(icon) == b"icon"
+    assert store.pop(id) == ("http://b", "b", b"history-b")
+    assert store.pop(id) is None
+    assert len(store) == 1
+
+    store.trim(0)
+    assert store.entries() == []
+    assert store._conn.execute("SELECT COUNT(*) FROM blobs").fetchone() == (0,)
+
+
+def test_killed_buffers_batch(tmpdir):
+    store = KilledBuffersStore(str(tmpdir.join("killedbuffers.db")))
+    for i in range(5):
+        store.add("http://%d" % i, str(i), None, b"history-%d" % i, limit=3)
+    # entries flush the queue, only the last ones are written
+    assert [e[1] for e in store.entries()] == \
+        ["http://4", "http://3", "http://2"]
+    assert store._conn.execute("SELECT COUNT(*) FROM blobs").fetchone() == (3,)
+
+    store.add("http://5", "5", None, None, limit=0)
+    assert len(store) == 0
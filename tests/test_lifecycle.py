@@ -0,0 +1,59 @@
+import pytest
+
+try:
+    from webmacs import lifecycle
+except ImportError as exc:
+    pytest.skip("webmacs.lifecycle requires QtWebEngine: %s" % exc,
+                allow_module_level=True)
+
+LifecycleState = lifecycle.LifecycleState
+
+
+class FakeBuffer(object):
+    def __init__(self, pid, last_use, keep_alive=False, audible=False,
+                 visible=False):
+        self.pid = pid
+        self.last_use = last_use
+        self.keep_alive = keep_alive
+        self.audible = audible
+        self.visible = visible
+        self.state = LifecycleState.Active
+
+    def view(self):
+        return self.visible
+
+    def renderProcessPid(self):
+        return self.pid
+
+    def recentlyAudible(self):
+        return self.audible
+
+    def lifecycleState(self):
+        return self.state
+
+    def setLifecycleState(self, state):
+        self.state = state
+
+    def recommendedState(self):
+        return LifecycleState.Discarded
+
+    def url(self):
+        from PyQt6.QtCore import QUrl
+        return QUrl("http://buffer")
+
+
+def test_budget_spares_audio_kept_alive_and_visible(monkeypatch):
+    monkeypatch.setattr(lifecycle, "process_rss", lambda pid: 100)
+    visible = FakeBuffer(1, last_use=0, visible=True)
+    audio = FakeBuffer(2, last_use=1, audible=True)
+    kept = FakeBuffer(3, last_use=2, keep_alive=True)
+    old = FakeBuffer(4, last_use=3)
+    recent = FakeBuffer(5, last_use=4)
+    buffers = [visible, audio, kept, old, recent]
+
+    policy = lifecycle.BufferLifecyclePolicy()
+    policy._apply_budget(buffers, 400)
+    # the least recently used hidden buffer that can be discarded
+    assert [b.state for b in buffers] == [
+        LifecycleState.Active, LifecycleState.Active, LifecycleState.Active,
+        LifecycleState.Discarded, LifecycleState.Active]
@@ -0,0 +1,72 @@
+import pytest
+
+from webmacs.omnibox import Candidate, TopKMerger, match_score
+
+
+def test_match_score():
+    # every word must match
+    assert match_score("foo bar", "http://foo.com", "") == 0
+    assert match_score("foo", "http://foo.com", "") > 0
+    # prefix is better than inner match, which is better than doc match
+    assert match_score("foo", "foobar") > match_score("foo", "barfoo")
+    assert match_score("foo", "barfoo") > match_score("foo", "bar", "foo")
+    # matching is case insensitive
+    assert match_score("FoO", "foo") == match_score("foo", "foo")
+    # empty query matches everything, shortest first
+    assert match_score("", "a") > match_score("", "abc") > 0
+
+
+def test_topk_merger():
+    merger = TopKMerger(3)
+    assert merger.results() == []
+
+    merger.add([Candidate(1, "a", "", "s1"), Candidate(5, "b", "", "s1")])
+    assert [c.text for c in merger.results()] == ["b", "a"]
+
+    # results are streamed from another source, only the 3 best are kept
+    merger.add([Candidate(3, "c", "", "s2"), Candidate(4, "d", "", "s2"),
+                Candidate(0.5, "e", "", "s2")])
+    assert [c.text for c in merger.results()] == ["b", "d", "c"]
+
+    # duplicates keep the best score
+    merger.add([Candidate(10, "c", "", "s3"), Candidate(0, "b", "", "s3")])
+    assert [(c.text, c.source) for c in merger.results()] == [
+        ("c", "s3"), ("b", "s1"), ("d", "s2")]
+
+
+@pytest.fixture
+def qcoreapp():
+    from PyQt6.QtCore import QCoreApplication
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def wait_for(app, future, timeout=5):
+    import time
+    deadline = time.monotonic() + timeout
+    results = []
+    future.add_done_callback(results.append)
+    while not results:
+        assert time.monotonic() < deadline
+        app.processEvents()
+        time.sleep(0.001)
+    return future.result()
+
+
+@pytest.mark.parametrize("in_memory", [True, False])
+def test_visited_links_search_in_worker(qcoreapp, tmp_path, in_memory):
+    from webmacs.visited_links import VisitedLinks
+
+    links = VisitedLinks(":memory:" if in_memory
+                         else str(tmp_path / "visitedlinks.db"))
+    links.visit("http://foo.com", "Foo")
+    links.visit("http://bar.com", "Bar foo")
+    links.visit("http://baz.com", "Baz")
+    result = wait_for(qcoreapp, links.search_in_worker("foo", 10))
+    assert sorted(result) == sorted(links.search("foo", 10))
+    assert len(result) == 2
+    # the worker connection sees the new visits
+    links.visit("http://foo.org", "")
+    assert len(wait_for(qcoreapp, links.search_in_worker("foo", 10))) == 3
+    links.close_reader()
+    assert links._reader is None
+    assert len(wait_for(qcoreapp, links.search_in_worker("foo", 10))) == 3
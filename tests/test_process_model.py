@@ -0,0 +1,21 @@
+from webmacs import variables
+from webmacs.process_model import apply_chromium_flags, CHROMIUM_FLAGS_ENV
+
+
+def test_apply_chromium_flags():
+    environ = {}
+    assert apply_chromium_flags(environ) == ""
+    assert environ == {}
+
+    variables.set("renderer-process-model", "process-per-site")
+    variables.set("renderer-process-limit", 4)
+    variables.set("site-isolation", "disabled")
+    try:
+        environ = {CHROMIUM_FLAGS_ENV: "--foo --process-per-site"}
+        assert apply_chromium_flags(environ).split() == [
+            "--foo", "--process-per-site", "--renderer-process-limit=4",
+            "--disable-site-isolation-trials"]
+    finally:
+        variables.set("renderer-process-model", "default")
+        variables.set("renderer-process-limit", 0)
+        variables.set("site-isolation", "default")
@@ -0,0 +1,49 @@
+import os
+
+from webmacs.process_stats import process_rss, process_pss, \
+    process_cpu_time, ProcessSampler, format_size, PAGE_SIZE, CLOCK_TICKS
+
+
+def test_process_rss():
+    assert process_rss(os.getpid()) > 0
+    assert process_rss(-1) is None
+
+
+def fake_proc(tmpdir, pid, cpu_ticks):
+    piddir = tmpdir.join(str(pid))
+    piddir.ensure(dir=True)
+    piddir.join("statm").write("1000 200 50 1 0 100 0\n")
+    piddir.join("smaps_rollup").write(
+        "00400000-7fff [rollup]\nRss:  800 kB\nPss:  300 kB\n")
+    # the command name contains spaces and a parenthesis
+    piddir.join("stat").write(
+        "%d (Web (Content) x) S 1 2 3 0 -1 0 0 0 0 0 %d 0 0 0 20 0\n"
+        % (pid, cpu_ticks))
+
+
+def test_process_stats_fake_proc(tmpdir):
+    fake_proc(tmpdir, 12, CLOCK_TICKS * 3)
+    proc = str(tmpdir)
+    assert process_rss(12, proc) == 200 * PAGE_SIZE
+    assert process_pss(12, proc) == 300 * 1024
+    assert process_cpu_time(12, proc) == 3
+
+
+def test_process_sampler(tmpdir):
+    sampler = ProcessSampler(str(tmpdir))
+    fake_proc(tmpdir, 12, 0)
+    samples = sampler.sample([12, 13], now=10)
+    # unknown processes are ignored, no cpu usage on the first sample
+    assert list(samples) == [12]
+    assert samples[12].cpu is None
+
+    # one second of cpu time in two seconds
+    fake_proc(tmpdir, 12, CLOCK_TICKS)
+    assert sampler.sample([12], now=12)[12].cpu == 50
+
+
+def test_format_size():
+    assert format_size(10) == "10 B"
+    assert format_size(2048) == "2.0 kB"
+    assert format_size(5 * 1024 ** 2) == "5.0 MB"
+    assert format_size(3 * 1024 ** 4) == "3072.0 GB"
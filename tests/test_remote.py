@@ -0,0 +1,91 @@
+import os
+import sys
+import socket
+import threading
+import subprocess
+
+import pytest
+
+from webmacs import remote
+from webmacs.ipc_protocol import MessageDecoder, encode_message
+
+
+def serve(path, handle):
+    """
+    Accept one connection, and reply to its requests with handle(msg), which
+    returns the messages to send.
+    """
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+
+    def run():
+        conn, _ = server.accept()
+        decoder = MessageDecoder()
+        while True:
+            data = conn.recv(4096)
+            if not data:
+                break
+            decoder.feed(data)
+            msg = decoder.next_message()
+            while msg is not None:
+                replies = handle(msg)
+                if replies is None:
+                    conn.close()
+                    server.close()
+                    return
+                for reply in replies:
+                    conn.sendall(encode_message(reply))
+                msg = decoder.next_message()
+        conn.close()
+        server.close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_remote_call_and_events(tmpdir, monkeypatch):
+    path = str(tmpdir.join("webmacs.test.ipc"))
+    monkeypatch.setattr(remote, "sock_path", lambda instance: path)
+
+    def handle(msg):
+        if msg["method"] == "list-buffers":
+            return [{"id": msg["id"], "result": [{"url": "http://a"}]}]
+        if msg["method"] == "subscribe":
+            # the event is read while waiting for the reply
+            return [{"event": "webbuffer_created", "params": {}},
+                    {"id": msg["id"], "result": msg["params"]["hooks"]}]
+        if msg["method"] == "quit":
+            return None
+        return [{"id": msg["id"], "error": "unknown method"}]
+
+    thread = serve(path, handle)
+    with remote.RemoteInstance("test") as instance:
+        assert instance.list_buffers() == [{"url": "http://a"}]
+        with pytest.raises(remote.RemoteError):
+            instance.call("nothing")
+        assert instance.subscribe("webbuffer_created") == [
+            "webbuffer_created"]
+        with pytest.raises(remote.RemoteError):
+            instance.call("quit")
+        assert [e["event"] for e in instance.events()] == [
+            "webbuffer_created"]
+    thread.join()
+
+
+def test_remote_no_instance(tmpdir, monkeypatch):
+    monkeypatch.setattr(remote, "sock_path",
+                        lambda instance: str(tmpdir.join("nothing.ipc")))
+    with pytest.raises(remote.RemoteError):
+        remote.RemoteInstance("test")
+
+
+def test_remote_no_qt_network():
+    code = ("import sys, webmacs.remote;"
+            " print(' '.join(sys.modules))")
+    modules = subprocess.check_output(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(__file__))).decode().split()
+    for name in ("PyQt6.QtNetwork", "webmacs.ipc"):
+        assert name not in modules
@@ -0,0 +1,129 @@
+import json
+import threading
+
+from webmacs import task
+from webmacs.session_journal import read_events, read_history, replay, \
+    write_snapshot, windows_to_ids, SessionJournal, journal_path, \
+    pending_journal_path
+
+
+def url(id, name):
+    return {"id": id, "url": "http://%s" % name, "title": name,
+            "last_use": 0}
+
+
+def window(buffer):
+    return {"geometry": [0, 0, 10, 10], "window-state": 0,
+            "view-layout": {"buffer": buffer, "current": True}}
+
+
+def test_replay():
+    data = {"version": 2, "seq": 2, "urls": [url(1, "a"), url(2, "b")],
+            "windows": [window(0)], "current-window": 0}
+    events = [
+        # already in the snapshot
+        {"seq": 2, "op": "close", "id": 1},
+        {"seq": 3, "op": "create", "id": 3, "after": 1, "url": "http://c",
+         "title": "c", "last_use": 1},
+        {"seq": 4, "op": "update", "id": 1, "url": "http://a2",
+         "title": "a2"},
+        {"seq": 5, "op": "use", "id": 2, "last_use": 5},
+        {"seq": 6, "op": "windows", "current-window": 0,
+         "windows": windows_to_ids([window(2)], [1, 3, 2])},
+        {"seq": 7, "op": "move", "id": 2, "after": None},
+        {"seq": 8, "op": "close", "id": 1},
+    ]
+    replay(data, events)
+    assert data["seq"] == 8
+    assert [(u["id"], u["title"]) for u in data["urls"]] == [
+        (2, "b"), (3, "c")]
+    assert data["urls"][0]["last_use"] == 5
+    # the window still displays buffer 2, now at position 0
+    assert data["windows"][0]["view-layout"]["buffer"] == 0
+
+    # replaying twice is harmless
+    replay(data, events)
+    assert [u["id"] for u in data["urls"]] == [2, 3]
+
+
+def test_replay_ignores_unknown_buffers():
+    data = {"version": 2, "urls": [url(1, "a")], "windows": []}
+    replay(data, [{"seq": 1, "op": "close", "id": 42},
+                  {"seq": 2, "op": "create", "id": 2, "after": 42,
+                   "url": "http://b", "title": "b", "last_use": 0}])
+    assert [u["id"] for u in data["urls"]] == [1]
+    assert data["seq"] == 2
+
+
+def test_read_events_truncated(tmpdir):
+    path = tmpdir.join("session.json.journal")
+    path.write(json.dumps({"seq": 1, "op": "close", "id": 1}) + "\n"
+               + '{"seq": 2, "op": "clo')
+    assert read_events(str(path)) == [{"seq": 1, "op": "close", "id": 1}]
+    assert read_events(str(tmpdir.join("nothing"))) == []
+
+
+def test_write_snapshot(tmpdir):
+    path = str(tmpdir.join("session.json"))
+    write_snapshot(path, {"seq": 1, "urls": []})
+    write_snapshot(path, {"seq": 2, "urls": []})
+    with open(path) as f:
+        assert json.load(f)["seq"] == 2
+    with open(path + ".backup") as f:
+        assert json.load(f)["seq"] == 1
+
+
+def test_snapshot_history(tmpdir):
+    path = str(tmpdir.join("session.json"))
+    for i in range(3):
+        write_snapshot(path, {"urls": [
+            dict(url(1, "a"), history=b"blob-a%d" % i),
+            url(2, "b"),
+            dict(url(3, "c"), history=b"blob-c"),
+        ]})
+    # only the sidecars of the snapshot and its backup are kept
+    assert len(tmpdir.listdir(lambda p: ".history-" in p.basename)) == 2
+
+    with open(path) as f:
+        data = read_history(path, json.load(f))
+    assert [u.get("history") for u in data["urls"]] == [b"blob-a2", None,
+                                                        b"blob-c"]
+    assert "history-file" not in data
+
+    # navigating drops the outdated history
+    replay(data, [{"seq": 1, "op": "update", "id": 1, "url": "http://d",
+                   "title": "d"}])
+    assert "history" not in data["urls"][0]
+
+
+def test_journal_compact(tmpdir):
+    path = str(tmpdir.join("session.json"))
+    journal = SessionJournal(path, lambda: {"urls": []})
+    journal.record("close", id=1)
+    journal.compact()
+    # close waits for the compaction in the worker thread
+    journal.close(remove=False)
+    with open(path) as f:
+        assert json.load(f)["seq"] == 1
+    assert read_events(journal_path(path)) == []
+    assert not tmpdir.join("session.json.journal.old").check()
+
+
+def test_journal_compact_cancelled(tmpdir):
+    path = str(tmpdir.join("session.json"))
+    journal = SessionJournal(path, lambda: {"urls": []})
+    journal.record("close", id=1)
+    task.shutdown_workers()
+    event = threading.Event()
+    blockers = [task.run_in_worker(event.wait)
+                for _ in range(task.WORKER_THREADS)]
+    journal.compact()
+    task.shutdown_workers()
+    event.set()
+    for future in blockers:
+        future.wait()
+    # the compaction never ran, its events are still in the journal
+    journal.close(remove=False)
+    assert not tmpdir.join("session.json").exists()
+    assert read_events(pending_journal_path(path)) == [
+        {"seq": 1, "op": "close", "id": 1}]
@@ -0,0 +1,60 @@
+import os
+import json
+import base64
+import binascii
+
+import pytest
+
+from webmacs.spell_checking import Base64StreamDecoder, Listing, \
+    RemoteBdic, Versions, parse_listing, dictionaries_to_install, LISTING_TTL
+
+
+def test_base64_stream_decoder():
+    raw = os.urandom(10000)
+    encoded = base64.encodebytes(raw)
+    decoder = Base64StreamDecoder()
+    decoded = b"".join(decoder.feed(encoded[i:i + 77])
+                       for i in range(0, len(encoded), 77))
+    assert decoded + decoder.finish() == raw
+
+
+def test_base64_stream_decoder_incomplete():
+    decoder = Base64StreamDecoder()
+    decoder.feed(base64.b64encode(b"abcd")[:-1])
+    with pytest.raises(binascii.Error):
+        decoder.finish()
+
+
+def test_parse_listing():
+    data = b")]}'\n" + json.dumps({"entries": [
+        {"name": "en-US-9-0.bdic"},
+        {"name": "fr-FR-3-0.bdic"},
+        {"name": "README.chromium"},
+    ]}).encode("utf-8")
+    assert parse_listing(data) == {
+        "en-US": RemoteBdic("en-US", [9, 0], ".bdic"),
+        "fr-FR": RemoteBdic("fr-FR", [3, 0], ".bdic"),
+    }
+
+
+def test_listing_cache(tmpdir):
+    path = str(tmpdir.join("listing.json"))
+    assert not Listing.from_file(path).is_fresh()
+
+    remotes = {"en-US": RemoteBdic("en-US", [9, 0], ".bdic")}
+    Listing(remotes, 1000, etag='"abc"').write(path)
+    listing = Listing.from_file(path)
+    assert listing.remotes == remotes
+    assert listing.etag == '"abc"' and listing.last_modified is None
+    assert listing.is_fresh(1000 + LISTING_TTL - 1)
+    assert not listing.is_fresh(1000 + LISTING_TTL)
+
+
+def test_dictionaries_to_install():
+    remotes = {"en-US": RemoteBdic("en-US", [9, 0], ".bdic"),
+               "fr-FR": RemoteBdic("fr-FR", [3, 0], ".bdic"),
+               "de-DE": RemoteBdic("de-DE", [3, 0], ".bdic")}
+    versions = Versions({"en-US": [9, 0], "fr-FR": [2, 0]})
+    assert dictionaries_to_install(
+        ["en-US", "fr-FR", "de-DE", "xx"], remotes, versions,
+        {"en-US", "fr-FR"}) == [remotes["fr-FR"], remotes["de-DE"]]
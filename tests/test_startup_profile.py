@@ -0,0 +1,22 @@
+import json
+
+from webmacs import startup_profile
+
+
+def test_report(tmpdir):
+    with startup_profile.phase("outer"):
+        with startup_profile.phase("inner"):
+            pass
+    startup_profile.mark("done")
+
+    phases = startup_profile.report()["phases"][-3:]
+    assert [(p["name"], p["depth"]) for p in phases] == [
+        ("outer", 0), ("inner", 1), ("done", 0)]
+    outer, inner, done = phases
+    assert outer["start"] <= inner["start"] <= inner["end"] <= outer["end"]
+    assert done["duration"] == 0
+
+    path = str(tmpdir.join("startup.json"))
+    startup_profile.write_report(path)
+    with open(path) as f:
+        assert json.load(f)["phases"][-1]["name"] == "done"
@@ -0,0 +1,133 @@
+import pytest
+
+from webmacs import task as task_module, hooks
+from webmacs.task import Task, TaskRunner, PRIORITY_HIGH, PRIORITY_LOW
+
+
+class FakeTask(Task):
+    def __init__(self, name, priority=None):
+        Task.__init__(self)
+        self.description = name
+        if priority is not None:
+            self.priority = priority
+        self.started = self.aborted = False
+
+    def start(self):
+        self.started = True
+
+    def abort(self):
+        self.aborted = True
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    calls = []
+    monkeypatch.setattr(task_module, "call_later", calls.append)
+    monkeypatch.setattr(task_module.QTimer, "singleShot",
+                        lambda msec, fn: None)
+    runner = TaskRunner(max_running=2)
+
+    def run_loop():
+        while calls:
+            calls.pop(0)()
+    runner.run_loop = run_loop
+    yield runner
+    hooks.webbuffer_load_finished.remove_if_exists(runner._end_deferral)
+
+
+def test_deferred_until_first_load(runner):
+    low = runner.run(FakeTask("low", PRIORITY_LOW))
+    high = runner.run(FakeTask("high", PRIORITY_HIGH))
+    runner.run_loop()
+    assert high.started and not low.started
+
+    hooks.webbuffer_load_finished(None)
+    runner.run_loop()
+    assert low.started
+
+
+def test_priorities_and_limit(runner):
+    runner._end_deferral()
+    tasks = [runner.run(FakeTask(str(p), p)) for p in (20, 10, 0)]
+    runner.run_loop()
+    assert [t.started for t in tasks] == [False, True, True]
+    assert runner.pending_tasks() == [tasks[0]]
+
+    tasks[2].finished.emit()
+    runner.run_loop()
+    assert tasks[0].started
+    assert runner.finished_tasks[0]["description"] == "0"
+    assert runner.finished_tasks[0]["state"] == "finished"
+
+
+def test_cancel(runner):
+    runner._end_deferral()
+    running = runner.run(FakeTask("running"))
+    runner.run_loop()
+    pending = runner.run(FakeTask("pending"))
+
+    assert runner.cancel(pending)
+    assert runner.pending_tasks() == []
+    assert runner.cancel(running)
+    assert running.aborted and not runner.running_tasks
+    assert runner.finished_tasks[0]["state"] == "cancelled"
+    assert not runner.cancel(running)
+
+
+@pytest.fixture
+def qcoreapp():
+    from PyQt6.QtCore import QCoreApplication
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def wait_for(app, future, timeout=5):
+    import time
+    deadline = time.monotonic() + timeout
+    while future in task_module._PENDING_FUTURES:
+        assert time.monotonic() < deadline
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def test_run_in_worker(qcoreapp):
+    import threading
+    results = []
+    future = task_module.run_in_worker(
+        lambda a, b: (a + b, threading.current_thread().name), 1, b=2)
+    future.add_done_callback(
+        lambda f: results.append((f.result(), threading.current_thread())))
+    assert not results
+    wait_for(qcoreapp, future)
+    (value, worker_name), thread = results[0]
+    assert value == 3
+    assert worker_name.startswith("webmacs-worker")
+    assert thread is threading.main_thread()
+
+
+def test_run_in_worker_exception(qcoreapp):
+    def fail():
+        raise ValueError("boom")
+    future = task_module.run_in_worker(fail)
+    wait_for(qcoreapp, future)
+    assert isinstance(future.exception(), ValueError)
+    with pytest.raises(ValueError):
+        future.result()
+
+
+def test_run_in_worker_cancel(qcoreapp):
+    import threading
+    import concurrent.futures
+    event = threading.Event()
+    futures = [task_module.run_in_worker(event.wait)
+               for _ in range(task_module.WORKER_THREADS + 1)]
+    called = []
+    futures[-1].add_done_callback(called.append)
+    futures[-1].cancel()
+    event.set()
+    for future in futures:
+        wait_for(qcoreapp, future)
+    assert called == [futures[-1]]
+    assert futures[-1].cancelled()
+    with pytest.raises(concurrent.futures.CancelledError):
+        futures[-1].result()
+    assert futures[0].result() is True
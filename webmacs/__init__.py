@@ -15,16 +15,14 @@
 
 import importlib
 
-from PyQt6.QtCore import QObject, QEvent, QTimer
-
-from . import hooks
+from .buffer_registry import BufferRegistry
 
 
 __version__ = '0.9.1'
 
 
-# access to every opened buffers
-BUFFERS = []
+# access to every opened buffers, a list-like BufferRegistry
+BUFFERS = BufferRegistry()
 
 # dictionary of all known commands
 COMMANDS = {}
@@ -34,44 +32,14 @@ def require(module, package=__package__):
     return importlib.import_module(module, package)
 
 
-# handler for windows, to be able to list them and determine the one currently
-# active.
-class WindowsHandler(QObject):
-    def __init__(self, parent=None):
-        QObject.__init__(self, parent)
-        self.windows = []
-        self.current_window = None
-
-    def _on_last_window_closing(self):
-        # last window is closed, do not remove it from the list but exit the
-        # application. This is required from proper session saving.
-        from .application import app
-        app().quit()
-        return True
-
-    def register_window(self, window):
-        window.installEventFilter(self)
-        self.windows.append(window)
-
-    def eventFilter(self, window, event):
-        t = event.type()
-        if t == QEvent.Type.WindowActivate:
-            self.current_window = window
-            hooks.window_activated(window)
-        elif t == QEvent.Type.Close:
-            if window.quit_if_last_closed and len(self.windows) == 1:
-                if self._on_last_window_closing():
-                    return True
-            self.windows.remove(window)
-            window.deleteLater()
-            if window == self.current_window:
-                self.current_window = None
-            hooks.window_closed(window)
-
-        return QObject.eventFilter(self, window, event)
-
-
-WINDOWS_HANDLER = WindowsHandler()
+def __getattr__(name):
+    # the windows handler lives in its own module, so that importing the
+    # package does not load Qt: the client only needs the standard library.
+    if name in ("WindowsHandler", "WINDOWS_HANDLER"):
+        from . import windows_handler
+        return getattr(windows_handler, name)
+    raise AttributeError("module {!r} has no attribute {!r}"
+                         .format(__name__, name))
 
 
 def windows():
@@ -80,6 +48,7 @@ def windows():
 
     Do not modify this list.
     """
+    from .windows_handler import WINDOWS_HANDLER
     return WINDOWS_HANDLER.windows
 
 
@@ -87,6 +56,7 @@ def current_window():
     """
     Returns the currently activated window.
     """
+    from .windows_handler import WINDOWS_HANDLER
     return WINDOWS_HANDLER.current_window
 
 
@@ -108,7 +78,7 @@ def recent_buffers():
     """
     Returns an iterable of buffers, most recently used first.
     """
-    return sorted(BUFFERS, key=lambda b: b.last_use, reverse=True)
+    return BUFFERS.recent()
 
 
 def current_minibuffer():
@@ -136,6 +106,7 @@ def call_later(fn, msec=0):
     If msec is 0, the function call is still delayed to the next handling of
     events in the qt event loop.
     """
+    from PyQt6.QtCore import QTimer
     QTimer.singleShot(msec, fn)
 
 
@@ -25,10 +25,10 @@ from _adblock import AdBlock
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import urllib.request
 from . import variables
-from .task import Task
+from .task import Task, PRIORITY_HIGH, run_in_worker
 
 from PyQt6.QtNetwork import QNetworkRequest, QNetworkReply
-from PyQt6.QtCore import QUrl, QThreadPool, pyqtSignal as Signal, Qt
+from PyQt6.QtCore import QUrl
 
 
 DEFAULT_EASYLIST = [
@@ -51,8 +51,29 @@ def cache_file(cache_path):
     return os.path.join(cache_path, "cache.dat")
 
 
+def adblock_from_cache(cache_file):
+    adblock = AdBlock()
+    adblock.load(cache_file)
+    return adblock
+
+
+def parse_adblock_files(paths, cache_file):
+    adblock = AdBlock()
+    for path in paths:
+        logging.info("parsing adblock file: %s", path)
+        try:
+            with open(path) as f:
+                adblock.parse(f.read())
+        except Exception:
+            logging.exception(f"Unable to parse {path} adblock file")
+    adblock.save(cache_file)
+    return adblock
+
+
 class AdBlockUpdateTask(Task):
-    adblock_ready = Signal(AdBlock)
+    description = "adblock update"
+    # the rules are needed to filter the first pages
+    priority = PRIORITY_HIGH
 
     def __init__(self, app, cache_path, ):
         Task.__init__(self)
@@ -67,13 +88,11 @@ class AdBlockUpdateTask(Task):
             for url in adblock_urls_rules.value
         }
 
-        self.adblock_ready.connect(self._on_adblock_ready,
-                                   Qt.ConnectionType.BlockingQueuedConnection)
-
         self._adblock = None
         self._replies = {}
+        self._downloads = 0
         self._modified = False
-        self.__thread_running = False
+        self._future = None
 
     def start(self):
         to_download = [(url, path) for url, path in self._user_urls.items()
@@ -84,10 +103,15 @@ class AdBlockUpdateTask(Task):
             reply.readyRead.connect(self._dl_ready_read)
             reply.finished.connect(self._dl_finished)
             self._replies[reply] = {"path": path}
+        self._downloads = len(self._replies)
+        if self._downloads:
+            self.set_progress(0, self._downloads)
         self._maybe_finish()
 
     def _maybe_finish(self):
         if self._replies:
+            self.set_progress(self._downloads - len(self._replies),
+                              self._downloads)
             return
 
         if not self._modified:
@@ -105,32 +129,27 @@ class AdBlockUpdateTask(Task):
                 if cached_urls != self._user_urls or not os.path.exists(self._cache_file):
                     self._modified = True
 
-        self.__thread_running = True
-        QThreadPool.globalInstance().start(
-            self._parse_adblock_files if self._modified else self._adblock_from_cache)
-
-    def _adblock_from_cache(self):
-        adblock = AdBlock()
-        adblock.load(self._cache_file)
-        self.adblock_ready.emit(adblock)
-
-    def _parse_adblock_files(self):
-        adblock = AdBlock()
-        for path in self._user_urls.values():
-            logging.info("parsing adblock file: %s", path)
-            try:
-                with open(path) as f:
-                    adblock.parse(f.read())
-            except Exception:
-                logging.exception(f"Unable to parse {f.name} adblock file")
-            adblock.save(self._cache_file)
-        self.adblock_ready.emit(adblock)
-
-    def _on_adblock_ready(self, adblock):
-        self.__thread_running = False
-        with open(self._cached_urls_path, "w") as f:
-            json.dump(self._user_urls, f)
-        self._adblock = adblock
+        if self._modified:
+            self._future = run_in_worker(parse_adblock_files,
+                                         list(self._user_urls.values()),
+                                         self._cache_file)
+        else:
+            self._future = run_in_worker(adblock_from_cache, self._cache_file)
+        self._future.add_done_callback(self._on_adblock_ready)
+
+    def _on_adblock_ready(self, future):
+        self._future = None
+        if future.cancelled():
+            return
+        try:
+            adblock = future.result()
+        except Exception as exc:
+            logging.exception("Unable to load the adblock rules")
+            self.set_error(str(exc))
+        else:
+            with open(self._cached_urls_path, "w") as f:
+                json.dump(self._user_urls, f)
+            self._adblock = adblock
         self.finished.emit()
 
     def adblock(self):
@@ -184,6 +203,5 @@ class AdBlockUpdateTask(Task):
             if "file" in data:
                 data["file"].close()
                 os.unlink(data["path"])
-        # wait for any thread to join
-        if self.__thread_running:
-            QThreadPool.globalInstance().waitForDone(1000)
+        if self._future is not None:
+            self._future.cancel()
@@ -0,0 +1,412 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Coroutines running on the Qt event loop.
+
+The asyncio event loop defined here does not run by itself: its callbacks and
+timers are dispatched by the Qt event loop, so coroutines can be used in
+commands (define_command accepts async functions) and completers without
+blocking the UI, and without nested event loops.
+
+The awaitable helpers wrap the Qt asynchronous apis (javascript calls,
+network replies, prompts and processes). Sockets and subprocesses of asyncio
+are not supported (add_reader and friends), use the Qt classes instead.
+"""
+
+import time
+import math
+import asyncio
+import logging
+import collections
+
+from PyQt6.QtCore import QObject, QTimer, QProcess, Qt, pyqtSignal as Signal
+
+
+class NetworkError(Exception):
+    """
+    Raised by :func:`network_reply` when a reply has an error.
+
+    :param error: the QNetworkReply.NetworkError code.
+    :param message: the error description.
+    """
+
+    def __init__(self, error, message):
+        Exception.__init__(self, message)
+        self.error = error
+
+
+class ProcessError(Exception):
+    """
+    Raised by :func:`run_process` when a process can not be started, or
+    crashed.
+    """
+
+
+class _Notifier(QObject):
+    wakeup = Signal()
+
+
+class QtEventLoop(asyncio.AbstractEventLoop):
+    """
+    An asyncio event loop driven by the Qt event loop of the main thread.
+
+    It must be created in the main thread, once the Qt application exists.
+    """
+
+    def __init__(self):
+        self._ready = collections.deque()
+        self._timers = {}
+        self._closed = False
+        self._debug = False
+        self._exception_handler = None
+        self._wakeup_posted = False
+        self._notifier = _Notifier()
+        self._notifier.wakeup.connect(self._run_ready,
+                                      Qt.ConnectionType.QueuedConnection)
+
+    def time(self):
+        return time.monotonic()
+
+    def _check_closed(self):
+        if self._closed:
+            raise RuntimeError("Event loop is closed")
+
+    def _wakeup(self):
+        if not self._wakeup_posted:
+            self._wakeup_posted = True
+            self._notifier.wakeup.emit()
+
+    def call_soon(self, callback, *args, context=None):
+        self._check_closed()
+        handle = asyncio.Handle(callback, args, self, context)
+        self._ready.append(handle)
+        self._wakeup()
+        return handle
+
+    def call_soon_threadsafe(self, callback, *args, context=None):
+        self._check_closed()
+        handle = asyncio.Handle(callback, args, self, context)
+        self._ready.append(handle)
+        # the signal is queued to the main thread, always emit it as the
+        # wakeup flag is not thread safe.
+        self._notifier.wakeup.emit()
+        return handle
+
+    def call_later(self, delay, callback, *args, context=None):
+        return self.call_at(self.time() + delay, callback, *args,
+                            context=context)
+
+    def call_at(self, when, callback, *args, context=None):
+        self._check_closed()
+        handle = asyncio.TimerHandle(when, callback, args, self, context)
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.setTimerType(Qt.TimerType.PreciseTimer)
+        # timer handles compare by value, so they are stored by identity.
+        key = id(handle)
+        timer.timeout.connect(lambda: self._timer_fired(key))
+        self._timers[key] = (handle, timer)
+        handle._scheduled = True
+        timer.start(max(0, math.ceil((when - self.time()) * 1000)))
+        return handle
+
+    def _timer_fired(self, key):
+        handle, timer = self._timers.pop(key)
+        timer.deleteLater()
+        handle._scheduled = False
+        self._ready.append(handle)
+        self._run_ready()
+
+    def _timer_handle_cancelled(self, handle):
+        entry = self._timers.pop(id(handle), None)
+        if entry is not None:
+            entry[1].stop()
+            entry[1].deleteLater()
+
+    def _run_ready(self):
+        self._wakeup_posted = False
+        # only run the callbacks already there, new ones are run on the next
+        # iteration of the Qt event loop to not starve it.
+        count = len(self._ready)
+        previous = asyncio._get_running_loop()
+        asyncio._set_running_loop(self)
+        try:
+            while count and self._ready:
+                count -= 1
+                handle = self._ready.popleft()
+                if not handle.cancelled():
+                    handle._run()
+        finally:
+            asyncio._set_running_loop(previous)
+        if self._ready:
+            self._wakeup()
+
+    def create_future(self):
+        return asyncio.Future(loop=self)
+
+    def create_task(self, coro, *, name=None, context=None):
+        self._check_closed()
+        if context is None:
+            return asyncio.Task(coro, loop=self, name=name)
+        return asyncio.Task(coro, loop=self, name=name, context=context)
+
+    def run_in_executor(self, executor, func, *args):
+        self._check_closed()
+        if executor is None:
+            from .task import _executor
+            executor = _executor()
+        return asyncio.wrap_future(executor.submit(func, *args), loop=self)
+
+    def is_running(self):
+        # the Qt event loop is what runs it
+        return not self._closed
+
+    def is_closed(self):
+        return self._closed
+
+    def close(self):
+        for _, timer in self._timers.values():
+            timer.stop()
+            timer.deleteLater()
+        self._timers.clear()
+        self._ready.clear()
+        self._closed = True
+
+    async def shutdown_asyncgens(self):
+        pass
+
+    async def shutdown_default_executor(self):
+        pass
+
+    def get_debug(self):
+        return self._debug
+
+    def set_debug(self, enabled):
+        self._debug = enabled
+
+    def get_exception_handler(self):
+        return self._exception_handler
+
+    def set_exception_handler(self, handler):
+        self._exception_handler = handler
+
+    def default_exception_handler(self, context):
+        message = context.get("message") or "Unhandled exception in a task"
+        exc = context.get("exception")
+        details = ", ".join("%s=%r" % (k, v) for k, v in context.items()
+                            if k not in ("message", "exception"))
+        logging.error(
+            "%s%s", message, " (%s)" % details if details else "",
+            exc_info=(type(exc), exc, exc.__traceback__) if exc else None)
+
+    def call_exception_handler(self, context):
+        if self._exception_handler is None:
+            self.default_exception_handler(context)
+            return
+        try:
+            self._exception_handler(self, context)
+        except Exception:
+            logging.exception("Error in the asyncio exception handler")
+            self.default_exception_handler(context)
+
+
+LOOP = None
+
+
+def event_loop():
+    """
+    Returns the :class:`QtEventLoop`, created on the first call.
+    """
+    global LOOP
+    if LOOP is None or LOOP.is_closed():
+        LOOP = QtEventLoop()
+    return LOOP
+
+
+def create_task(coro, name=None):
+    """
+    Run the coroutine on the Qt event loop, and returns its asyncio.Task.
+
+    Unlike asyncio.create_task, this can be called outside of a coroutine,
+    from any Qt slot or callback.
+    """
+    return event_loop().create_task(coro, name=name)
+
+
+def shutdown_event_loop():
+    """
+    Cancel the running tasks and close the event loop.
+    """
+    global LOOP
+    if LOOP is None:
+        return
+    loop, LOOP = LOOP, None
+    if not loop.is_closed():
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
+        # let the tasks handle their cancellation
+        loop._run_ready()
+        loop.close()
+
+
+async def wait_callback(fn, *args):
+    """
+    Call fn(*args, callback) and wait until the callback is called.
+    Returns the argument given to the callback, or a tuple of the arguments
+    if there are many.
+
+    For example, with a :class:`webmacs.webbuffer.WebBuffer`::
+
+        await wait_callback(buffer.run_content_script, "textzoom",
+                            "textzoom.getZoom();")
+    """
+    future = asyncio.get_running_loop().create_future()
+
+    def callback(*values):
+        if not future.done():
+            future.set_result(values[0] if len(values) == 1 else values)
+
+    fn(*args, callback)
+    return await future
+
+
+async def run_javascript(page, script, world_id=0):
+    """
+    Run the script in the page, and returns its result.
+
+    :param page: a QWebEnginePage, usually a
+        :class:`webmacs.webbuffer.WebBuffer`.
+    :param script: the javascript source.
+    :param world_id: the javascript world, the main world of the page by
+        default.
+    """
+    return await wait_callback(page.runJavaScript, script, world_id)
+
+
+async def network_reply(reply):
+    """
+    Wait for a QNetworkReply to finish, and returns its content as bytes.
+    Raises :class:`NetworkError` on error. If the awaiting task is cancelled,
+    the request is aborted.
+
+    The reply is deleted once finished.
+    """
+    future = asyncio.get_running_loop().create_future()
+
+    def finished():
+        if not future.done():
+            future.set_result(None)
+
+    reply.finished.connect(finished)
+    if reply.isFinished():
+        finished()
+    try:
+        await future
+    except asyncio.CancelledError:
+        reply.abort()
+        raise
+    finally:
+        reply.deleteLater()
+    if reply.error() != reply.NetworkError.NoError:
+        raise NetworkError(reply.error(), reply.errorString())
+    return bytes(reply.readAll())
+
+
+async def prompt(minibuffer, prompt, flash=False):
+    """
+    Show the prompt in the minibuffer, and returns its value once it is
+    closed (None if it was cancelled). Unlike Prompt.exec, the Qt event loop
+    is not blocked in a nested loop. If the awaiting task is cancelled, the
+    prompt is closed.
+
+    :param minibuffer: the minibuffer, usually ctx.minibuffer in a command.
+    :param prompt: the :class:`webmacs.minibuffer.prompt.Prompt` instance.
+    :param flash: flash the prompt when it is shown.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    state = {"value": None, "closed": False}
+
+    def resolve():
+        if not future.done():
+            future.set_result(state["value"])
+
+    def on_closed():
+        state["closed"] = True
+        state["value"] = prompt.value()
+        # the finished signal, if any, is emitted right after this one.
+        loop.call_soon(resolve)
+
+    def on_finished():
+        state["value"] = prompt.value()
+
+    prompt.closed.connect(on_closed)
+    prompt.finished.connect(on_finished)
+    minibuffer.do_prompt(prompt, flash=flash, sync=False)
+    try:
+        return await future
+    except asyncio.CancelledError:
+        if not state["closed"] and minibuffer.prompt() is prompt:
+            minibuffer.close_prompt()
+        raise
+
+
+async def run_process(program, args=(), input=None):
+    """
+    Run a process until it exits, and returns a tuple (exit_code, stdout,
+    stderr) where the outputs are bytes. Raises :class:`ProcessError` if the
+    process can not be started or crashed. If the awaiting task is
+    cancelled, the process is killed.
+
+    :param program: the program to run.
+    :param args: the program arguments.
+    :param input: optional bytes written to the process standard input.
+    """
+    future = asyncio.get_running_loop().create_future()
+    proc = QProcess()
+
+    def finished(exit_code, exit_status):
+        if future.done():
+            return
+        if exit_status == QProcess.ExitStatus.CrashExit:
+            future.set_exception(ProcessError(
+                "%s crashed: %s" % (program, proc.errorString())))
+        else:
+            future.set_result(exit_code)
+
+    def error_occurred(error):
+        # finished is not emitted when the process fails to start.
+        if error == QProcess.ProcessError.FailedToStart \
+           and not future.done():
+            future.set_exception(ProcessError(
+                "%s: %s" % (program, proc.errorString())))
+
+    proc.finished.connect(finished)
+    proc.errorOccurred.connect(error_occurred)
+    proc.start(program, list(args))
+    if input is not None:
+        proc.write(input)
+    proc.closeWriteChannel()
+    try:
+        exit_code = await future
+    except asyncio.CancelledError:
+        proc.kill()
+        proc.waitForFinished(1000)
+        raise
+    finally:
+        proc.deleteLater()
+    return (exit_code, bytes(proc.readAllStandardOutput()),
+            bytes(proc.readAllStandardError()))
@@ -22,8 +22,9 @@ from PyQt6.QtWebEngineCore import QWebEngineUrlRequestInterceptor
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtNetwork import QNetworkAccessManager
 
-from . import require, version
-from .task import TaskRunner
+from . import require, version, startup_profile
+from .task import TaskRunner, shutdown_workers
+from .aio import shutdown_event_loop
 from .adblock import AdBlockUpdateTask, adblock_urls_rules, AdBlock
 from .download_manager import DownloadManager
 from .profile import named_profile
@@ -82,16 +83,19 @@ def app():
 
 
 def _app_requires():
+    # most command modules are imported when one of their commands is used,
+    # see webmacs.command_manifest.
+    require(".commands").register_lazy_commands()
     require(".commands.follow")
-    require(".commands.buffer_history")
-    require(".commands.global")
-    require(".commands.isearch")
-    require(".commands.webbuffer")
-    require(".commands.caret_browsing")
-    require(".commands.content_edit")
-    require(".commands.minibuffer")
 
     require(".default_webjumps")
+    # defines variables, that must exist when the user init module is loaded
+    require(".session")
+    require(".killed_buffers")
+    require(".lifecycle")
+    require(".buffer_stats")
+    require(".process_model")
+    require(".daemon")
 
     require(".keymaps.global")
     require(".keymaps.caret_browsing")
@@ -108,7 +112,8 @@ class Application(QApplication):
 
     def __init__(self, conf_path, args, instance_name="default",
                  profile_name="default", off_the_record=False):
-        QApplication.__init__(self, args)
+        with startup_profile.phase("qapplication"):
+            QApplication.__init__(self, args)
         self.__class__.INSTANCE = self
         self.instance_name = instance_name
         self.task_runner = TaskRunner()
@@ -127,8 +132,9 @@ class Application(QApplication):
 
         self._download_manager = DownloadManager(self)
 
-        self.profile = named_profile(profile_name,
-                                     off_the_record=off_the_record)
+        with startup_profile.phase("profile"):
+            self.profile = named_profile(profile_name,
+                                         off_the_record=off_the_record)
 
         self.installEventFilter(LOCAL_KEYMAP_SETTER)
 
@@ -137,6 +143,9 @@ class Application(QApplication):
         self.network_manager = QNetworkAccessManager(self)
 
         self.aboutToQuit.connect(self.task_runner.stop)
+        self.aboutToQuit.connect(shutdown_workers)
+        self.aboutToQuit.connect(shutdown_event_loop)
+        self.aboutToQuit.connect(self.profile.shutdown)
 
     def conf_path(self):
         return self._conf_path
@@ -196,3 +205,5 @@ class Application(QApplication):
         self.adblock_update()
         self.update_spell_checking()
         init_minibuffer_right_labels()
+        require(".lifecycle").init_buffer_lifecycle_policy()
+        require(".buffer_stats").init_buffer_stats()
@@ -0,0 +1,265 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The registry of the opened buffers.
+
+It behaves like a list, but positional access, insertion, removal and index
+lookup are O(log n): items are stored in an implicit treap (a randomized
+balanced binary tree ordered by position, where each node knows the size of
+its subtree), with a dict of item to node.
+
+It also maintains the items ordered by their last_use attribute, moving an
+item to the front when it is used.
+"""
+
+import random
+from collections import OrderedDict
+from collections.abc import MutableSequence
+
+
+class _Node(object):
+    __slots__ = ("item", "priority", "size", "left", "right", "parent")
+
+    def __init__(self, item):
+        self.item = item
+        self.priority = random.random()
+        self.size = 1
+        self.left = self.right = self.parent = None
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+    if node.left:
+        node.left.parent = node
+    if node.right:
+        node.right.parent = node
+
+
+def _split(node, k):
+    # split in (first k nodes, other nodes)
+    if node is None:
+        return None, None
+    if _size(node.left) >= k:
+        left, node.left = _split(node.left, k)
+        _update(node)
+        return left, node
+    node.right, right = _split(node.right, k - _size(node.left) - 1)
+    _update(node)
+    return node, right
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class BufferRegistry(MutableSequence):
+    """
+    A list of buffers, see the module documentation.
+
+    Items must be hashable and can be in the registry only once.
+    """
+
+    def __init__(self, items=()):
+        self._root = None
+        self._nodes = {}
+        # least recently used first
+        self._lru = OrderedDict()
+        self._lru_sorted = True
+        for item in items:
+            self.append(item)
+
+    def _set_root(self, root):
+        if root is not None:
+            root.parent = None
+        self._root = root
+
+    def _node_at(self, index):
+        size = len(self._nodes)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("buffer index out of range")
+        node = self._root
+        while True:
+            left = _size(node.left)
+            if index < left:
+                node = node.left
+            elif index == left:
+                return node
+            else:
+                index -= left + 1
+                node = node.right
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, item):
+        return item in self._nodes
+
+    def __iter__(self):
+        # iterate over a copy, so buffers can be closed while iterating
+        return iter(self._items())
+
+    def __reversed__(self):
+        return reversed(self._items())
+
+    def _items(self):
+        items, stack, node = [], [], self._root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            items.append(node.item)
+            node = node.right
+        return items
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._items()[index]
+        return self._node_at(index).item
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            raise TypeError("slice assignment is not supported")
+        node = self._node_at(index)
+        if node.item is item:
+            return
+        if item in self._nodes:
+            raise ValueError("item already in the registry")
+        del self._nodes[node.item]
+        self._lru_remove(node.item)
+        node.item = item
+        self._nodes[item] = node
+        self._lru_add(item)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            for item in self._items()[index]:
+                self.remove(item)
+            return
+        size = len(self._nodes)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("buffer index out of range")
+        left, right = _split(self._root, index)
+        node, right = _split(right, 1)
+        del self._nodes[node.item]
+        self._lru_remove(node.item)
+        self._set_root(_merge(left, right))
+
+    def insert(self, index, item):
+        if item in self._nodes:
+            raise ValueError("item already in the registry")
+        size = len(self._nodes)
+        if index < 0:
+            index = max(0, index + size)
+        node = _Node(item)
+        left, right = _split(self._root, min(index, size))
+        self._set_root(_merge(_merge(left, node), right))
+        self._nodes[item] = node
+        self._lru_add(item)
+
+    def index(self, item, start=0, stop=None):
+        try:
+            node = self._nodes[item]
+        except (KeyError, TypeError):
+            raise ValueError("%r is not in the buffer registry" % (item,))
+        index = _size(node.left)
+        while node.parent:
+            if node is node.parent.right:
+                index += _size(node.parent.left) + 1
+            node = node.parent
+        if index < start or (stop is not None and index >= stop):
+            raise ValueError("%r is not in the buffer registry" % (item,))
+        return index
+
+    def remove(self, item):
+        del self[self.index(item)]
+
+    def swap(self, i, j):
+        """
+        Swap the items at the given positions.
+        """
+        node_i, node_j = self._node_at(i), self._node_at(j)
+        node_i.item, node_j.item = node_j.item, node_i.item
+        self._nodes[node_i.item] = node_i
+        self._nodes[node_j.item] = node_j
+
+    def count(self, item):
+        return 1 if item in self._nodes else 0
+
+    def clear(self):
+        self._root = None
+        self._nodes.clear()
+        self._lru.clear()
+        self._lru_sorted = True
+
+    def __repr__(self):
+        return "BufferRegistry(%r)" % self._items()
+
+    # LRU ordering
+
+    def _lru_add(self, item):
+        if self._lru:
+            last = next(reversed(self._lru))
+            if item.last_use < last.last_use:
+                self._lru_sorted = False
+        self._lru[item] = None
+
+    def _lru_remove(self, item):
+        del self._lru[item]
+
+    def last_use_changed(self, item):
+        """
+        Must be called when the last_use attribute of an item changes.
+        """
+        if item not in self._lru:
+            return
+        # the common case: the item is used now, so it is the most recent
+        self._lru.move_to_end(item)
+        if len(self._lru) > 1:
+            lru = reversed(self._lru)
+            next(lru)
+            if item.last_use < next(lru).last_use:
+                self._lru_sorted = False
+
+    def recent(self):
+        """
+        Returns the list of items, most recently used first.
+        """
+        if not self._lru_sorted:
+            # only when last_use is not increasing, like restoring a session
+            self._lru = OrderedDict(
+                (item, None)
+                for item in sorted(self._lru, key=lambda i: i.last_use))
+            self._lru_sorted = True
+        return list(reversed(self._lru))
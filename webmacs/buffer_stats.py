@@ -0,0 +1,99 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Memory and cpu usage of the buffers, sampled from their render process.
+
+Buffers may share the same render process, in which case they share the same
+numbers.
+"""
+
+from PyQt6.QtCore import QTimer
+
+from . import variables, BUFFERS
+from .webbuffer import WebBuffer
+from .process_stats import ProcessSampler, format_size
+
+
+def _update_interval(var):
+    if STATS is not None:
+        STATS.start()
+
+
+buffer_stats_interval = variables.define_variable(
+    "buffer-stats-interval",
+    "Interval in seconds between two samples of the memory and cpu usage of"
+    " the buffers, displayed in the buffer list and the webmacs://buffers"
+    " page. 0 disables sampling.",
+    10,
+    type=variables.Int(min=0),
+    callbacks=(_update_interval,),
+)
+
+
+class BufferStats(object):
+    def __init__(self):
+        self.samples = {}
+        self._sampler = ProcessSampler()
+        self._timer = QTimer()
+        self._timer.timeout.connect(self.update)
+
+    def start(self):
+        interval = buffer_stats_interval.value
+        if interval:
+            self._timer.start(interval * 1000)
+            self.update()
+        else:
+            self._timer.stop()
+            self.samples = {}
+
+    def update(self):
+        # one sample per render process
+        pids = {b.renderProcessPid() for b in BUFFERS
+                if isinstance(b, WebBuffer)}
+        pids.discard(0)
+        self.samples = self._sampler.sample(pids)
+
+    def buffer_sample(self, buff):
+        if isinstance(buff, WebBuffer):
+            return self.samples.get(buff.renderProcessPid())
+
+
+STATS = None
+
+
+def init_buffer_stats():
+    global STATS
+    STATS = BufferStats()
+    STATS.start()
+
+
+def buffer_sample(buff):
+    """
+    Returns the last :class:`ProcessSample` of the buffer render process, or
+    None.
+    """
+    if STATS is not None:
+        return STATS.buffer_sample(buff)
+
+
+def buffer_usage_text(buff):
+    sample = buffer_sample(buff)
+    if sample is None:
+        return ""
+    text = format_size(sample.pss if sample.pss is not None else sample.rss)
+    if sample.cpu is not None:
+        text += " %.0f%% cpu" % sample.cpu
+    return text
@@ -0,0 +1,315 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The webmacs command line entry point.
+
+When an instance is already running, the command line is sent to it using
+only the standard library: this module must not import Qt modules, nor
+webmacs modules that define variables. Else the full application is
+started, see webmacs.main.
+"""
+
+import os
+import sys
+import time
+import errno
+import socket
+import argparse
+import selectors
+
+from . import startup_profile
+from .ipc_protocol import MessageDecoder, encode_message
+
+
+# seconds to wait for the reply of a running instance
+TIMEOUT = 30
+
+# seconds to wait for all the instances to accept a connection, when listing
+# them
+PROBE_TIMEOUT = 0.5
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-l", "--log-level",
+                        help="Set the log level, defaults to %(default)s.",
+                        default="warning",
+                        choices=("debug", "info", "warning",
+                                 "error", "critical"))
+
+    # There is no such JavaScript error level, critical - still since there
+    # are some logs that are printed anyway and that it is easier to implement.
+    # Let's keep the critical level.
+    parser.add_argument("-w", "--webcontent-log-level",
+                        help="Set the log level for the web contents,"
+                        " defaults to %(default)s.",
+                        default="critical",
+                        choices=("info", "warning", "error", "critical"))
+
+    parser.add_argument("-i", "--instance", default="default",
+                        help="Create or reuse a named webmacs instance."
+                        " If the given instance name is the empty string, an"
+                        " automatically generated name will be used.")
+
+    parser.add_argument("-p", "--profile", default="default",
+                        help="Use the named profile directory."
+                        " Each profile will contain distinct navigation data"
+                        " (history, cookies, ...).")
+
+    parser.add_argument("--list-instances", action="store_true",
+                        help="List running instances and exit.")
+
+    parser.add_argument("--off-the-record", action="store_true",
+                        help="Private browsing mode.")
+
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Profile the startup, and write a report in"
+                        " ~/.webmacs/startup-profile.json. A summary is"
+                        " shown on the webmacs://startup page.")
+
+    parser.add_argument("--daemon", action="store_true",
+                        help="Start the instance without any window, and"
+                        " keep it running when the last window is closed."
+                        " The next webmacs command lines then open their"
+                        " window at once. Stop it with SIGTERM, or with the"
+                        " quit command.")
+
+    parser.add_argument("-t", "--target", default="new-buffer",
+                        choices=("current-buffer", "new-buffer",
+                                 "background", "new-window"),
+                        help="Where the urls are opened in a running"
+                        " instance, defaults to %(default)s. Only the first"
+                        " url is displayed when opening many urls in a new"
+                        " buffer, the others are opened in the background.")
+
+    parser.add_argument("urls", nargs="*", metavar="url",
+                        help="urls to open")
+
+    opts, user_opts = parser.parse_known_args(argv)
+    if opts.daemon and opts.urls:
+        parser.error("urls can not be opened with --daemon")
+
+    # handle local file path
+    opts.urls = [
+        os.path.realpath(url)
+        if os.path.exists(url) and not os.path.isabs(url) else url
+        for url in opts.urls
+    ]
+    # the first url, for compatibility
+    opts.url = opts.urls[0] if opts.urls else None
+
+    return opts, user_opts
+
+
+def sock_name(instance):
+    """
+    Returns the name of the ipc socket of an instance, relative to the temp
+    directory if it is not absolute (see :func:`sock_path`).
+    """
+    run_path = f"/run/user/{os.getuid()}"
+    prefix = run_path if os.access(run_path, os.W_OK) else ""
+
+    if instance == "default":
+        return os.path.join(prefix, "webmacs.ipc")
+    return os.path.join(prefix, f"webmacs.{instance}.ipc")
+
+
+def sock_path(instance):
+    """
+    Returns the path of the ipc socket of an instance.
+    """
+    return os.path.join(_temp_path(), sock_name(instance))
+
+
+def _temp_path():
+    # like QDir.tempPath(), where QLocalServer creates relative sockets
+    return os.environ.get("TMPDIR") or "/tmp"
+
+
+def find_instances():
+    """
+    Returns a dict of instance name -> socket path, for the sockets found
+    (the instances may not be running).
+    """
+    dirs = [_temp_path()]
+    run_dir = os.path.dirname(sock_name("default"))
+    if run_dir:
+        dirs.insert(0, run_dir)
+    instances = {}
+    for dir in dirs:
+        try:
+            names = os.listdir(dir)
+        except OSError:
+            continue
+        for name in names:
+            if name.startswith("webmacs.") and name.endswith(".ipc"):
+                instances.setdefault(name[8:-4] or "default",
+                                     os.path.join(dir, name))
+    return instances
+
+
+def probe_instances(instances, timeout=PROBE_TIMEOUT):
+    """
+    Returns the names of the running instances, connecting to all of them at
+    once. The sockets of dead instances are removed.
+
+    :param instances: a dict of instance name -> socket path.
+    :param timeout: the maximum time to wait, in seconds.
+    """
+    live = []
+    selector = selectors.DefaultSelector()
+    try:
+        for name, path in instances.items():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            err = sock.connect_ex(path)
+            if err == 0:
+                live.append(name)
+                sock.close()
+            elif err in (errno.EINPROGRESS, errno.EAGAIN):
+                # the listen queue is full, the instance is busy
+                selector.register(sock, selectors.EVENT_WRITE, name)
+            else:
+                sock.close()
+                if err == errno.ECONNREFUSED:
+                    # nobody listens, a crashed instance
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+
+        deadline = time.monotonic() + timeout
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                selector.unregister(key.fileobj)
+                if not key.fileobj.getsockopt(socket.SOL_SOCKET,
+                                              socket.SO_ERROR):
+                    live.append(key.data)
+                key.fileobj.close()
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+    return sorted(live)
+
+
+def list_instances(check=True):
+    """
+    Returns the names of the webmacs instances.
+
+    :param check: if True, only the running instances are returned.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return []
+    instances = find_instances()
+    if check:
+        return probe_instances(instances)
+    return sorted(instances)
+
+
+def request_data(opts, user_opts=()):
+    """
+    Returns the ipc message to send to a running instance for the command
+    line options.
+    """
+    return dict(vars(opts), user_opts=list(user_opts), urls=[
+        {"url": url, "target": "background"}
+        if i and opts.target == "new-buffer" else url
+        for i, url in enumerate(opts.urls)
+    ])
+
+
+def print_reply(reply):
+    reply = reply or {}
+    for res in [reply] + reply.get("results", []):
+        if res.get("message"):
+            print(res["message"])
+
+
+def send(instance, data, timeout=TIMEOUT):
+    """
+    Send a message to a running instance and returns its reply.
+
+    Returns None if there is no running instance.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        # windows named pipes, only the Qt ipc can handle them
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.settimeout(1)
+            sock.connect(sock_path(instance))
+        except OSError:
+            return None
+        sock.settimeout(timeout)
+        try:
+            return _request(sock, data)
+        except OSError as exc:
+            # do not start another instance with the same name
+            return {"result": False,
+                    "message": "webmacs instance %r did not answer: %s"
+                    % (instance, exc)}
+    finally:
+        sock.close()
+
+
+def _request(sock, data):
+    sock.sendall(encode_message(dict(data, id=1)))
+    decoder = MessageDecoder()
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            raise ConnectionError("connection closed")
+        decoder.feed(data)
+        msg = decoder.next_message()
+        while msg is not None:
+            if msg.get("id") == 1:
+                return msg
+            msg = decoder.next_message()
+
+
+def main():
+    opts, user_opts = parse_args()
+    if opts.list_instances:
+        for instance in list_instances():
+            print(instance)
+        return 0
+    if opts.instance:
+        if opts.daemon:
+            if probe_instances({opts.instance: sock_path(opts.instance)}):
+                print("webmacs instance %r is already running."
+                      % opts.instance)
+                return 1
+        else:
+            reply = send(opts.instance, request_data(opts, user_opts))
+            if reply is not None:
+                print_reply(reply)
+                return 0 if reply.get("result") else 1
+
+    # nobody answered, start webmacs
+    if opts.profile_startup:
+        startup_profile.enable_profiler()
+    with startup_profile.phase("import webmacs.main"):
+        from .main import main as webmacs_main
+    webmacs_main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
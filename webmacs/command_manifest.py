@@ -0,0 +1,182 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The manifest of the commands defined in the lazily loaded command modules.
+
+The command modules listed in LAZY_MODULES are not imported at startup:
+their commands are registered from the manifest, and the module is imported
+when one of them is first used (see webmacs.commands.LazyCommand). Key
+bindings refer to commands by name, so they work the same.
+
+The manifest is found by reading the sources of the modules (without
+importing them). It is generated at build time in MANIFEST_FILE, and built
+again at startup when the sources have changed, as when running from a git
+checkout.
+
+This module only uses the standard library, so that setup.py can use it.
+"""
+
+import os
+import ast
+import json
+import hashlib
+
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+
+MANIFEST_FILE = "commands-manifest.json"
+
+#: command modules imported on demand. Modules that define variables, hooks
+#: or webjumps at import time must not be listed here.
+LAZY_MODULES = (
+    ".commands.buffer_history",
+    ".commands.caret_browsing",
+    ".commands.content_edit",
+    ".commands.global",
+    ".commands.isearch",
+    ".commands.minibuffer",
+    ".commands.webbuffer",
+)
+
+
+def prompt_opener_docs(name, doc):
+    """
+    Returns the (name, doc) of the commands defined by
+    webmacs.commands.register_prompt_opener_commands.
+    """
+    return [
+        (name + "-new-window", doc + " in a new window."),
+        (name + "-new-buffer", doc + " in a new buffer."),
+        (name, doc + "." + "\n\n You can use <C-u> as a prefix to open"
+         " in a new buffer, or <C-u C-u> to open in a new window."),
+    ]
+
+
+def _module_path(module, package_dir):
+    return os.path.join(package_dir, *module.lstrip(".").split(".")) + ".py"
+
+
+def _str_arg(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _visible(call):
+    for kw in call.keywords:
+        if kw.arg == "visible" and isinstance(kw.value, ast.Constant):
+            return bool(kw.value.value)
+    return True
+
+
+def _decorator_command(func, decorator):
+    def name_of(node):
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.Attribute):
+            return node.attr
+        return None
+
+    doc = ast.get_docstring(func, clean=False) or ""
+    if name_of(decorator) == "autocmd":
+        return func.name.replace("_", "-").lower(), doc, True
+    if isinstance(decorator, ast.Call):
+        fname = name_of(decorator.func)
+        if fname == "autocmd":
+            return (func.name.replace("_", "-").lower(), doc,
+                    _visible(decorator))
+        if fname == "define_command" and decorator.args:
+            name = _str_arg(decorator.args[0])
+            if name is not None:
+                return name, doc, _visible(decorator)
+    return None
+
+
+def scan_source(source, module):
+    """
+    Returns the commands defined in the source of a command module, as a list
+    of dicts with name, module, doc and visible keys.
+    """
+    commands = []
+
+    def add(name, doc, visible=True):
+        commands.append({"name": name, "module": module, "doc": doc,
+                         "visible": visible})
+
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) \
+           and node.col_offset == 0:
+            for decorator in node.decorator_list:
+                command = _decorator_command(node, decorator)
+                if command:
+                    add(*command)
+        elif isinstance(node, ast.Call) and len(node.args) == 3 \
+                and getattr(node.func, "id", None) \
+                == "register_prompt_opener_commands":
+            name, doc = _str_arg(node.args[0]), _str_arg(node.args[2])
+            if name is not None and doc is not None:
+                for cmd_name, cmd_doc in prompt_opener_docs(name, doc):
+                    add(cmd_name, cmd_doc)
+    return commands
+
+
+def _sources(package_dir):
+    sources = {}
+    for module in LAZY_MODULES:
+        with open(_module_path(module, package_dir), "rb") as f:
+            sources[module] = f.read()
+    return sources
+
+
+def _digest(sources):
+    sha = hashlib.sha1()
+    for module in LAZY_MODULES:
+        sha.update(module.encode("utf-8"))
+        sha.update(sources[module])
+    return sha.hexdigest()
+
+
+def build_manifest(package_dir=THIS_DIR):
+    sources = _sources(package_dir)
+    commands = []
+    for module in LAZY_MODULES:
+        commands.extend(scan_source(sources[module], module))
+    return {"digest": _digest(sources), "commands": commands}
+
+
+def write_manifest(path, package_dir=THIS_DIR):
+    with open(path, "w") as f:
+        json.dump(build_manifest(package_dir), f, indent=1)
+
+
+def load_manifest(package_dir=THIS_DIR):
+    """
+    Returns the list of lazy commands, from the generated manifest if it is
+    up to date.
+    """
+    try:
+        with open(os.path.join(package_dir, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is None \
+       or manifest.get("digest") != _digest(_sources(package_dir)):
+        manifest = build_manifest(package_dir)
+    return manifest["commands"]
+
+
+if __name__ == "__main__":
+    write_manifest(os.path.join(THIS_DIR, MANIFEST_FILE))
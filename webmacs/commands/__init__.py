@@ -13,8 +13,12 @@
 # You should have received a copy of the GNU General Public License
 # along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
 
-from .. import COMMANDS
+import inspect
+import logging
+
+from .. import COMMANDS, require, aio
 from .. import url_opener
+from ..command_manifest import load_manifest, prompt_opener_docs
 
 
 class InteractiveCommand(object):
@@ -23,7 +27,9 @@ class InteractiveCommand(object):
 
     A prompt class can be given to get an argument using the minibuffer prompt.
 
-    :param binding: a callable to run when invoking the command.
+    :param binding: a callable to run when invoking the command. It may be an
+        async function, it is then run as a task on the Qt event loop (see
+        webmacs.aio).
     :param visible: whether or not to list the command using M-x
     """
     __slots__ = ("binding", "visible")
@@ -36,7 +42,81 @@ class InteractiveCommand(object):
         return self.binding.__doc__.strip()
 
     def __call__(self, ctx):
-        return self.binding(ctx)
+        result = self.binding(ctx)
+        if inspect.iscoroutine(result):
+            task = aio.create_task(result, name=result.__qualname__)
+            task.add_done_callback(_log_command_error)
+            return task
+        return result
+
+
+def _log_command_error(task):
+    if not task.cancelled() and task.exception() is not None:
+        exc = task.exception()
+        logging.error("Error calling command %s:", task.get_name(),
+                      exc_info=(type(exc), exc, exc.__traceback__))
+
+
+# > 0 while a command module is imported by a LazyCommand
+_LAZY_LOADING = 0
+
+
+class LazyCommand(object):
+    """
+    A command whose module is imported when it is first used, see
+    webmacs.command_manifest.
+    """
+    __slots__ = ("name", "module", "doc", "visible")
+
+    def __init__(self, name, module, doc, visible=True):
+        self.name = name
+        self.module = module
+        self.doc = doc
+        self.visible = visible
+
+    def load(self):
+        """
+        Import the module of the command, and returns the real command.
+        """
+        global _LAZY_LOADING
+        if COMMANDS.get(self.name) is self:
+            _LAZY_LOADING += 1
+            try:
+                require(self.module)
+            finally:
+                _LAZY_LOADING -= 1
+        command = COMMANDS.get(self.name)
+        if command is None or command is self:
+            raise KeyError("Command %s is not defined in %s"
+                           % (self.name, self.module))
+        return command
+
+    @property
+    def binding(self):
+        return self.load().binding
+
+    def getdoc(self):
+        return self.doc.strip()
+
+    def __call__(self, ctx):
+        return self.load()(ctx)
+
+
+def register_lazy_commands():
+    """
+    Register the commands of the lazily loaded command modules.
+    """
+    for entry in load_manifest():
+        if entry["name"] not in COMMANDS:
+            COMMANDS[entry["name"]] = LazyCommand(**entry)
+
+
+def _register(name, command):
+    if _LAZY_LOADING and name in COMMANDS \
+       and not isinstance(COMMANDS[name], LazyCommand):
+        # redefined by the user before the module was loaded
+        return
+    COMMANDS[name] = command
 
 
 def autocmd(binding=None, **args):
@@ -45,7 +125,7 @@ def autocmd(binding=None, **args):
     """
     name = binding.__name__.replace("_", "-").lower()
     command = InteractiveCommand(binding, **args)
-    COMMANDS[name] = command
+    _register(name, command)
     if binding is None:
         def wrapper(func):
             command.binding = func
@@ -58,7 +138,7 @@ def define_command(name, binding=None, **args):
     Register an interactive command.
     """
     command = InteractiveCommand(binding, **args)
-    COMMANDS[name] = command
+    _register(name, command)
     if binding is None:
         def wrapper(func):
             command.binding = func
@@ -126,7 +206,7 @@ def register_prompt_opener_commands(name, opener, doc):
     open_new_buffer.__name__ = open.__name__ + "_new_buffer"
     open_new_window.__name__ = open.__name__ + "_new_window"
 
-    open.__doc__ = doc + "." + "\n\n You can use <C-u> as a prefix to open" \
-        " in a new buffer, or <C-u C-u> to open in a new window."
-    open_new_buffer.__doc__ = doc + " in a new buffer."
-    open_new_window.__doc__ = doc + " in a new window."
+    docs = dict(prompt_opener_docs(name, doc))
+    open.__doc__ = docs[name]
+    open_new_buffer.__doc__ = docs[name + "-new-buffer"]
+    open_new_window.__doc__ = docs[name + "-new-window"]
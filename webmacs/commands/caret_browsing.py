@@ -13,14 +13,11 @@
 # You should have received a copy of the GNU General Public License
 # along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
 
-from PyQt6.QtWebEngineCore import QWebEngineScript
-
 from . import define_command
 
 
 def call_js(ctx, script):
-    ctx.buffer.runJavaScript(script,
-                             QWebEngineScript.ScriptWorldId.ApplicationWorld)
+    ctx.buffer.run_content_script("caret_browsing", script)
 
 
 @define_command("caret-browsing-init")
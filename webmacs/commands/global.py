@@ -637,7 +637,7 @@ class InstancesListPrompt(Prompt):
 
     def __init__(self, ctx):
         super().__init__(ctx)
-        instances = IpcServer.list_all_instances(check=False)
+        instances = IpcServer.list_all_instances()
         if self.exclude_self_instance:
             current = app().instance_name
             instances = [i for i in instances if i != current]
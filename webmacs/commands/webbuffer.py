@@ -23,24 +23,17 @@ from PyQt6.QtWebEngineCore import QWebEngineScript
 from ..application import app
 from ..commands import define_command, autocmd
 from ..minibuffer import Prompt
-from ..webbuffer import WebBuffer, close_buffer, create_buffer
+from ..webbuffer import WebBuffer, close_buffer, create_buffer, \
+    switch_buffer_current_color
 from ..killed_buffers import KilledBuffer
+from ..buffer_stats import buffer_usage_text
 from ..keyboardhandler import send_key_event
 from .. import BUFFERS, version, current_buffer, recent_buffers
-from .. import variables, clipboard, GLOBAL_OBJECTS
+from .. import clipboard, GLOBAL_OBJECTS, hooks
 from ..keymaps import KeyPress, BUFFERLIST_KEYMAP
 from ..password_manager import PasswordManagerNotReady
 
 
-switch_buffer_current_color = variables.define_variable(
-    "switch-buffer-current-color",
-    "The color to use for the current buffer in the switch-buffer list."
-    " Set to an empty string if you don't want a special color.",
-    "#c0d5f7",
-    type=variables.String(),
-)
-
-
 class BufferTableModel(QAbstractTableModel):
 
     def __init__(self, buffers):
@@ -51,7 +44,7 @@ class BufferTableModel(QAbstractTableModel):
         return len(self._buffers)
 
     def columnCount(self, index=QModelIndex()):
-        return 2
+        return 3
 
     def data(self, index, role=Qt.ItemDataRole.DisplayRole):
         buff = index.internalPointer()
@@ -62,6 +55,8 @@ class BufferTableModel(QAbstractTableModel):
         if role == Qt.ItemDataRole.DisplayRole:
             if col == 0:
                 return buff.url().toString()
+            elif col == 2:
+                return buffer_usage_text(buff)
             else:
                 if buff in BUFFERS:
                     return "[{}] {}".format(BUFFERS.index(buff) + 1, buff.title())
@@ -204,7 +199,9 @@ def _shift_buffer(ctx, reverse=False):
         new_indx = (buf_indx - 1) % len(BUFFERS)
     else:
         new_indx = (buf_indx + 1) % len(BUFFERS)
-    BUFFERS[new_indx], BUFFERS[buf_indx] = BUFFERS[buf_indx], BUFFERS[new_indx]
+    BUFFERS.swap(new_indx, buf_indx)
+    hooks.webbuffer_moved(BUFFERS[new_indx])
+    hooks.webbuffer_moved(BUFFERS[buf_indx])
     show_buffer(ctx.buffer, ctx.view)
 
 
@@ -406,6 +403,20 @@ def close_other_buffers(ctx):
             close_buffer(wb)
 
 
+@define_command("toggle-buffer-keep-alive")
+def toggle_buffer_keep_alive(ctx):
+    """
+    Toggle whether the current buffer keeps running when it is hidden.
+
+    A buffer kept alive is never frozen, which is useful for a web radio or
+    a chat for example.
+    """
+    buffer = ctx.buffer
+    buffer.keep_alive = not buffer.keep_alive
+    ctx.minibuffer.show_info("Buffer keep alive: %s"
+                             % ("on" if buffer.keep_alive else "off"))
+
+
 @define_command("select-buffer-content")
 def buffer_select_content(ctx):
     """
@@ -450,9 +461,8 @@ def text_zoom_in(ctx):
     """
     Zom in (text only) in the buffer.
     """
-    ctx.buffer.runJavaScript("textzoom.changeFont(0.1);",
-                             QWebEngineScript.ScriptWorldId.ApplicationWorld,
-                             _show_info_text_zoom(ctx))
+    ctx.buffer.run_content_script("textzoom", "textzoom.changeFont(0.1);",
+                                  _show_info_text_zoom(ctx))
 
 
 @define_command("text-zoom-out")
@@ -460,9 +470,8 @@ def text_zoom_out(ctx):
     """
     Zom out (text only) in the buffer.
     """
-    ctx.buffer.runJavaScript("textzoom.changeFont(-0.1);",
-                             QWebEngineScript.ScriptWorldId.ApplicationWorld,
-                             _show_info_text_zoom(ctx))
+    ctx.buffer.run_content_script("textzoom", "textzoom.changeFont(-0.1);",
+                                  _show_info_text_zoom(ctx))
 
 
 @define_command("text-zoom-reset")
@@ -470,9 +479,8 @@ def text_zoom_reset(ctx):
     """
     Reset the zoom (text only) in the buffer.
     """
-    ctx.buffer.runJavaScript("textzoom.resetChangeFont();",
-                             QWebEngineScript.ScriptWorldId.ApplicationWorld,
-                             _show_info_text_zoom(ctx))
+    ctx.buffer.run_content_script("textzoom", "textzoom.resetChangeFont();",
+                                  _show_info_text_zoom(ctx))
 
 
 @define_command("buffer-unselect")
@@ -501,7 +509,7 @@ class KilledBufferTableModel(QAbstractTableModel):
 
     def __init__(self):
         QAbstractTableModel.__init__(self)
-        self._buffers = list(KilledBuffer.all)
+        self._buffers = KilledBuffer.all()
 
     def rowCount(self, index=QModelIndex()):
         return len(self._buffers)
@@ -543,7 +551,7 @@ class KilledBufferListPrompt(Prompt):
 
     def enable(self, minibuffer):
         Prompt.enable(self, minibuffer)
-        if KilledBuffer.all:
+        if minibuffer.input().completer_model().rowCount():
             minibuffer.input().popup().selectRow(0)
 
 
@@ -555,7 +563,8 @@ def revive_buffer(ctx):
     killed_buffer = ctx.minibuffer.do_prompt(KilledBufferListPrompt(ctx))
     if killed_buffer:
         buff = killed_buffer.revive()
-        ctx.window.current_webview().setBuffer(buff)
+        if buff:
+            ctx.window.current_webview().setBuffer(buff)
 
 
 @define_command("copy-current-link")
@@ -579,8 +588,7 @@ def copy_current_link(ctx):
             minibuff.show_info("No current link url to copy.")
 
     buffer.content_handler.foundCurrentLinkUrl.connect(copy_to_clipboard)
-    buffer.runJavaScript("currentLinkUrl();",
-                         QWebEngineScript.ScriptWorldId.ApplicationWorld)
+    buffer.run_content_script("hint", "currentLinkUrl();")
 
 
 @define_command("copy-current-buffer-url")
@@ -22,13 +22,16 @@ from PyQt6.QtCore import QUrl, pyqtSlot as Slot, \
 from PyQt6.QtNetwork import QNetworkRequest
 
 from ..commands import define_command
-from ..minibuffer.prompt import Prompt, PromptTableModel, PromptHistory
+from ..minibuffer.prompt import Prompt, PromptHistory
+from ..omnibox import Omnibox, OmniboxModel, OmniboxSource, Candidate, \
+    define_omnibox_source
 from .. keymaps import WEBJUMP_KEYMAP
 from ..commands import register_prompt_opener_commands
 from .. import current_buffer
 from ..application import app
 from .. import variables
 from .. import version
+from .. import aio
 
 
 WebJump = namedtuple(
@@ -156,7 +159,43 @@ def empty_completer():
     return SyncWebJumpCompleter(lambda _: [])
 
 
-class WebJumpRequestCompleter(WebJumpCompleter):
+class AsyncWebJumpCompleter(WebJumpCompleter):
+
+    """
+    A completer that provides completion given an async function.
+
+    This completer will not block the UI.
+
+    :param complete_fn: an async function that takes the current string, and
+        must return the possible completions as a list of strings. It is
+        cancelled when a new completion is asked, or when the completion is
+        aborted.
+    """
+
+    def __init__(self, complete_fn):
+        WebJumpCompleter.__init__(self)
+        self.complete_fn = complete_fn
+        self._task = None
+
+    def complete(self, text):
+        self.abort()
+        self._task = aio.create_task(self._complete(text))
+
+    def abort(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _complete(self, text):
+        try:
+            completions = await self.complete_fn(text)
+        except Exception:
+            logging.exception("Error when completing %r", text)
+            completions = []
+        self.completed.emit(completions)
+
+
+class WebJumpRequestCompleter(AsyncWebJumpCompleter):
 
     """
     A completer that executes a Web request to provide completion.
@@ -172,40 +211,31 @@ class WebJumpRequestCompleter(WebJumpCompleter):
     """
 
     def __init__(self, url_fn, extract_completions_fn):
-        WebJumpCompleter.__init__(self)
+        AsyncWebJumpCompleter.__init__(self, self._request_completions)
         self.url_fn = url_fn
         self.extract_completions_fn = extract_completions_fn
-        self.reply = None
 
-    def complete(self, text):
+    async def _request_completions(self, text):
         url = self.url_fn(text)
         if not url:
-            self.completed.emit([])
-            return
+            return []
         elif not isinstance(url, QUrl):
             url = QUrl(url)
         req = QNetworkRequest(QUrl(url))
-        self.reply = app().network_manager.get(req)
-        self.reply.finished.connect(self._on_reply_finished)
-
-    def abort(self):
-        if self.reply:
-            self.reply.abort()
-
-    def _on_reply_finished(self):
-        if self.reply.error() == self.reply.NetworkError.NoError:
-            try:
-                completions = self.extract_completions_fn(self.reply.readAll())
-            except Exception:
-                logging.exception(
-                    "Error when trying to extract completions from %s"
-                    % self.reply.url().toString()
-                )
-                completions = []
-            self.completed.emit(completions)
-
-        self.reply.deleteLater()
-        self.reply = None
+        try:
+            data = await aio.network_reply(app().network_manager.get(req))
+        except aio.NetworkError as exc:
+            logging.debug("Unable to get completions from %s: %s",
+                          url.toString(), exc)
+            return []
+        try:
+            return self.extract_completions_fn(data)
+        except Exception:
+            logging.exception(
+                "Error when trying to extract completions from %s"
+                % url.toString()
+            )
+            return []
 
 
 @define_command("webjump-complete")
@@ -215,30 +245,77 @@ def wb_complete(ctx):
     """
     input = ctx.minibuffer.input()
     if not input.popup().isVisible():
+        ctx.minibuffer.prompt()._text_edited(input.text(), show_popup=True)
         input.show_completions()
     else:
         input.complete()
         ctx.minibuffer.prompt()._text_edited(input.text())
 
 
+@define_omnibox_source
+class WebJumpsSource(OmniboxSource):
+    name = "webjumps"
+    weight = 1.3
+
+    def complete(self, text, limit):
+        self.completed.emit(text, self.candidates(
+            text, limit, ((name, w.doc) for name, w in WEBJUMPS.items())
+        ))
+
+
+@define_omnibox_source
+class SuggestionsSource(OmniboxSource):
+    """
+    Completions of the default webjump, usually a remote search engine.
+    """
+    name = "suggestions"
+    weight = 0.5
+
+    def __init__(self, prompt):
+        OmniboxSource.__init__(self, prompt)
+        self._webjump = WEBJUMPS.get(webjump_default.value)
+        self._completer = None
+        self._text = None
+        self._limit = None
+        if self._webjump and self._webjump.allow_args \
+           and not self._webjump.protocol:
+            self._completer = self._webjump.complete_fn()
+            self._completer.setParent(self)
+            self._completer.completed.connect(self._got_completions)
+
+    def complete(self, text, limit):
+        self._text = text
+        self._limit = limit
+        if self._completer and text.strip():
+            self._completer.complete(text)
+
+    def abort(self):
+        if self._completer:
+            self._completer.abort()
+
+    @Slot(list)
+    def _got_completions(self, data):
+        prefix = self._webjump.name + " "
+        data = data[:self._limit]
+        # keep the order given by the remote side
+        self.completed.emit(self._text, [
+            Candidate(self.weight * (len(data) - i) / len(data),
+                      prefix + d, self._webjump.doc, self.name)
+            for i, d in enumerate(data)
+        ])
+
+
 class WebJumpPrompt(Prompt):
     label = "url/webjump:"
     complete_options = {
-        "match": Prompt.SimpleMatch
+        "match": None
     }
     history = PromptHistory()
     keymap = WEBJUMP_KEYMAP
     default_input = "alternate"
 
     def completer_model(self):
-        data = []
-        for name, w in WEBJUMPS.items():
-            data.append((name, w.doc))
-
-        for url, name in self.bookmarks:
-            data.append((name, url))
-
-        return PromptTableModel(data)
+        return OmniboxModel()
 
     def enable(self, minibuffer):
         self.bookmarks = app().bookmarks().list()
@@ -247,7 +324,11 @@ class WebJumpPrompt(Prompt):
         minibuffer.input().installEventFilter(self)
         self._wc_model = QStringListModel()
         self._wb_model = minibuffer.input().completer_model()
+        self._omnibox = Omnibox(self)
+        self._omnibox.updated.connect(self._got_omnibox_completions)
         self._active_webjump = None
+        # show the omnibox completions even for an empty input
+        self._show_popup = False
         self._completer = None
         self._popup_sel_model = None
         input = minibuffer.input()
@@ -291,7 +372,7 @@ class WebJumpPrompt(Prompt):
             m_input.set_match(None)
             model = self._wc_model
         else:
-            m_input.set_match(Prompt.SimpleMatch)
+            m_input.set_match(None)
             model = self._wb_model
 
         self._active_webjump = wj
@@ -315,16 +396,19 @@ class WebJumpPrompt(Prompt):
         if self._completer:
             self._completer.abort()
 
-    def _text_edited(self, text):
+    def _text_edited(self, text, show_popup=False):
         # search for a matching webjump
         first_word = text.split(" ")[0].split("://")[0]
         if first_word in [w for w in WEBJUMPS if len(w) < len(text)]:
+            self._omnibox.abort()
             self._set_active_webjump(WEBJUMPS[first_word])
             self.start_completion(self._active_webjump)
         else:
             # didn't find a webjump, go back to matching
-            # webjump/bookmark/history
+            # webjump/bookmark/history/buffers
             self._set_active_webjump(None)
+            self._show_popup = show_popup
+            self._omnibox.complete(text)
 
     def start_completion(self, webjump):
         text = self.minibuffer.input().text()
@@ -341,7 +425,19 @@ class WebJumpPrompt(Prompt):
                 ("://" if self._active_webjump.protocol else " ")
             self.minibuffer.input().show_completions(text[len(prefix):])
 
+    @Slot(list)
+    def _got_omnibox_completions(self, candidates):
+        if self._active_webjump:
+            return
+        self._wb_model.set_candidates(candidates)
+        m_input = self.minibuffer.input()
+        if candidates and (m_input.text() or self._show_popup):
+            m_input.show_completions()
+        else:
+            m_input.popup().hide()
+
     def close(self):
+        self._omnibox.abort()
         Prompt.close(self)
         self.minibuffer.input().removeEventFilter(self)
         # not sure if those are required;
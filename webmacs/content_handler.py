@@ -77,3 +77,11 @@ class WebContentHandler(QObject):
             ),
             QWebEngineScript.ScriptWorldId.ApplicationWorld
         )
+
+    @Slot(str, str)
+    def pageAction(self, action, values):
+        # only the webmacs:// pages have actions
+        if self.buffer.url().scheme() != "webmacs":
+            return
+        from .scheme_handlers.webmacs import run_page_action
+        run_page_action(self.buffer, action, json.loads(values))
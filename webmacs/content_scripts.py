@@ -0,0 +1,118 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The javascript injected in the web pages.
+
+A small bootstrap is injected in every frame at document creation. The bigger
+scripts (hinting, caret browsing, text zoom) are modules, only injected in a
+page the first time a command needs them, see
+webmacs.webbuffer.WebBuffer.run_content_script:
+
+- a page script (QWebEnginePage.scripts()) is added, so that the frames
+  created later in the page initialize the module too.
+- the module is run in the current documents of the page: its main frame, and
+  its sub frames with the frame api of QtWebEngine 6.8.
+
+With older QtWebEngine versions, scripts can not be run in the existing sub
+frames, so the modules are defined in the bootstrap instead (wrapped in a
+function, so only parsed lazily), and the main frame initializes them in its
+sub frames with a message carrying the module name.
+
+The module code is never sent in messages nor evaluated, so it works with
+pages whose content security policy forbids eval.
+"""
+
+import os
+import json
+
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                           "scripts")
+
+#: scripts injected in every frame, in this order.
+BOOTSTRAP = ("setup.js", "textedit.js")
+
+#: modules initialized on demand, name -> (script file, names the module
+#: must make global, for the code run later in the page to use them).
+MODULES = {
+    "hint": ("hint.js", ("hints", "currentLinkUrl")),
+    "textzoom": ("textzoom.js", ("textzoom",)),
+    "caret_browsing": ("caret_browsing.js", ("CaretBrowsing",)),
+}
+
+_SOURCES = {}
+
+
+def _read(filename):
+    with open(os.path.join(SCRIPTS_DIR, filename)) as f:
+        return f.read()
+
+
+def frame_api():
+    """
+    Returns True if scripts can be run in the sub frames of a page, with
+    QWebEnginePage.mainFrame (QtWebEngine >= 6.8).
+    """
+    from PyQt6.QtWebEngineCore import QWebEnginePage
+    return hasattr(QWebEnginePage, "mainFrame")
+
+
+def _module_definition(name):
+    filename, exports = MODULES[name]
+    return (
+        "webmacs_define_module({}, function() {{\n{}\nreturn {{{}}};\n}});"
+        .format(json.dumps(name), _read(filename),
+                ", ".join("{0}: {0}".format(e) for e in exports))
+    )
+
+
+def bootstrap_source(secure_id, modules=False):
+    """
+    Returns the source of the script to inject in every frame.
+
+    :param modules: if True, the module definitions are part of it, for
+        QtWebEngine versions without the frame api.
+    """
+    key = ("bootstrap", modules)
+    if key not in _SOURCES:
+        scripts = [_read(filename) for filename in BOOTSTRAP]
+        if modules:
+            scripts.extend(_module_definition(name) for name in MODULES)
+        _SOURCES[key] = "\n".join(scripts)
+    return "WEBMACS_SECURE_ID = {};\n{}".format(secure_id, _SOURCES[key])
+
+
+def load_script(name, sub_frames=False):
+    """
+    Returns the javascript code that initializes a module defined in a frame.
+
+    :param sub_frames: if True, the module is also initialized in the sub
+        frames, with messages.
+    """
+    if name not in MODULES:
+        raise KeyError("No such content script module: %s" % name)
+    return "webmacs_load_module({}, {});\n".format(
+        json.dumps(name), "true" if sub_frames else "false")
+
+
+def module_source(name):
+    """
+    Returns the javascript code that defines and initializes a module in a
+    frame, if it is not already.
+    """
+    if name not in _SOURCES:
+        _SOURCES[name] = _module_definition(name) + "\n" + load_script(name)
+    return _SOURCES[name]
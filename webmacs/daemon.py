@@ -0,0 +1,162 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The daemon mode, see the --daemon command line option.
+
+A daemon starts the application, the profile and the adblocker without any
+window, and waits on the ipc socket. The first webmacs command line then
+initializes the instance (session restore, urls to open) like a normal
+startup, without the cost of starting Qt and the web engine.
+
+Closing the last window keeps the daemon and its buffers alive, like closing
+an emacs client frame. When no window is open for a while, the buffers are
+discarded and caches freed; the buffers are reloaded when displayed again.
+
+To stop a daemon, send it SIGTERM (what a service manager does) or SIGINT,
+or run the quit command through the ipc, e.g.::
+
+    python -c 'from webmacs.remote import RemoteInstance as R; \
+               R("default").run_command("quit")'
+
+The session is then saved as usual.
+"""
+
+import gc
+import copy
+import ctypes
+import ctypes.util
+import logging
+
+from PyQt6.QtCore import QTimer
+from PyQt6.QtGui import QPixmapCache
+
+from . import variables, hooks, windows, recent_buffers, version
+
+
+daemon_idle_delay = variables.define_variable(
+    "daemon-idle-delay",
+    "When running as a daemon, discard the buffers and free the caches once"
+    " no window has been open for the given number of seconds. 0 disables"
+    " it.",
+    60,
+    type=variables.Int(min=0),
+)
+
+
+def _malloc_trim():
+    # give the freed memory back to the system, glibc only
+    if not version.is_linux:
+        return
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        libc.malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def open_window():
+    """
+    Open a window showing the most recently used buffer, or the home page if
+    there is no buffer.
+    """
+    from .window import Window
+    from .webbuffer import create_buffer
+
+    buff = next(iter(recent_buffers()), None)
+    if buff is None:
+        buff = create_buffer(variables.get("home-page") or "about:blank")
+    win = Window()
+    win.current_webview().setBuffer(buff)
+    win.showMaximized()
+    return win
+
+
+class Daemon(object):
+    """
+    Defer the initialization to the first request, and free the resources
+    while there is no window.
+
+    :param opts: the parsed command line of the daemon.
+    :param init: the init function, called with (opts, user_opts).
+    """
+
+    def __init__(self, opts, init):
+        self._opts = opts
+        self._init = init
+        self._idle_timer = QTimer()
+        self._idle_timer.setSingleShot(True)
+        self._idle_timer.timeout.connect(self.free_resources)
+
+    def start(self):
+        hooks.window_created.add(self._window_created)
+        hooks.window_closed.add(self._window_closed)
+
+    def stop(self):
+        self._idle_timer.stop()
+        hooks.window_created.remove_if_exists(self._window_created)
+        hooks.window_closed.remove_if_exists(self._window_closed)
+
+    def initialize(self, data):
+        """
+        Run the init function for the first request. Returns True if it did,
+        the urls of the request are then already opened.
+
+        :param data: the ipc request, usually sent by a command line client.
+        """
+        if self._init is None:
+            return False
+        from .ipc import ipc_urls
+
+        init, self._init = self._init, None
+        opts = copy.copy(self._opts)
+        opts.urls = [url for url, _ in ipc_urls(data)]
+        opts.url = opts.urls[0] if opts.urls else None
+        opts.target = data.get("target") or "new-buffer"
+        init(opts, data.get("user_opts") or [])
+        return True
+
+    def _window_created(self, window):
+        self._idle_timer.stop()
+
+    def _window_closed(self, window):
+        delay = daemon_idle_delay.value
+        if delay and not windows():
+            self._idle_timer.start(delay * 1000)
+
+    def free_resources(self):
+        if windows():
+            return
+        from .lifecycle import discard_hidden_buffers
+        from .application import app
+
+        count = discard_hidden_buffers()
+        profile = app().profile.q_profile
+        if profile.isOffTheRecord():
+            # the http cache is only in memory
+            profile.clearHttpCache()
+        QPixmapCache.clear()
+        gc.collect()
+        _malloc_trim()
+        logging.info("daemon idle: %d buffers discarded", count)
+
+
+DAEMON = None
+
+
+def init_daemon(opts, init):
+    global DAEMON
+    DAEMON = Daemon(opts, init)
+    DAEMON.start()
@@ -37,14 +37,26 @@ class Hook(list):
 
 webbuffer_created = Hook()
 
+# called with (placeholder, webbuffer) when a BufferPlaceholder is replaced
+webbuffer_replaced = Hook()
+
 webbuffer_closed = Hook()
 
 webbuffer_load_finished = Hook()
 
+webbuffer_moved = Hook()
+
 webbuffer_current_changed = Hook()
 
+# called when a buffer is displayed in or removed from a view
+webbuffer_shown = Hook()
+
+webbuffer_hidden = Hook()
+
 local_mode_changed = Hook()
 
+window_created = Hook()
+
 window_activated = Hook()
 
 window_closed = Hook()
@@ -14,17 +14,18 @@
 # along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import json
-import struct
+import time
 import logging
-from PyQt6.QtCore import QObject, pyqtSlot as Slot, pyqtSignal as Signal, Qt, \
-    QDir
+from PyQt6.QtCore import QObject, pyqtSlot as Slot, pyqtSignal as Signal, Qt
 from PyQt6.QtNetwork import QLocalServer, QLocalSocket
 from . import version
+from .client import sock_name, list_instances
+from .ipc_protocol import MessageDecoder, ProtocolError, ENCODINGS, \
+    encode_message
 
 
-HEADER_FMT = "!I"
-HEADER_SIZE = struct.calcsize(HEADER_FMT)
+# seconds to keep the list of running instances
+INSTANCES_CACHE_TIMEOUT = 10
 
 
 class IPcReader(QObject):
@@ -33,39 +34,113 @@ class IPcReader(QObject):
     def __init__(self, sock):
         QObject.__init__(self)
         self.sock = sock
-        self._msg_size = None
-        self._data = b""
+        self._decoder = MessageDecoder()
+        self._encoding = "json"
+        # encoding to use once the current reply is sent
+        self._next_encoding = None
+        self._request_id = 0
+        # replies and events read while waiting for another reply
+        self._replies = {}
+        self._events = []
+        # hook name -> callback, for the events sent on this connection
+        self.subscriptions = {}
+
+    def _read_message(self):
+        msg = self._decoder.next_message()
+        if msg is None:
+            available = self.sock.bytesAvailable()
+            if available:
+                self._decoder.feed(self.sock.read(available))
+                msg = self._decoder.next_message()
+        return msg
+
+    def _protocol_error(self, exc):
+        logging.error("Closing ipc connection: %s", exc)
+        self.sock.abort()
 
     @Slot()
     def on_ready_read(self):
-        if self._msg_size is None:
-            if self.sock.bytesAvailable() < HEADER_SIZE:
-                # not enough data yet
-                return
-            self._msg_size = struct.unpack(HEADER_FMT,
-                                           self.sock.read(HEADER_SIZE))[0]
-        remaining = self._msg_size - len(self._data)
-        if remaining <= 0:
-            return
-        self._data += self.sock.read(min(remaining,
-                                         self.sock.bytesAvailable()))
-        if len(self._data) == self._msg_size:
-            msg = json.loads(self._data.decode("utf-8"))
+        # the socket is cleared if the connection is closed on a message
+        while self.sock is not None:
+            try:
+                msg = self._read_message()
+            except ProtocolError as exc:
+                self._protocol_error(exc)
+                break
+            if msg is None:
+                break
             self.message_received.emit(msg)
-            return msg
 
     @Slot(object)
     def send_data(self, data):
-        data = json.dumps(data).encode("utf-8")
-        len_data = len(data)
-        self.sock.write(struct.pack(HEADER_FMT, len_data))
-        self.sock.write(data)
+        self.sock.write(encode_message(data, self._encoding))
+        if self._next_encoding:
+            self._encoding, self._next_encoding = self._next_encoding, None
+
+    def set_encoding(self, encoding, after_reply=False):
+        """
+        Change the encoding of the next messages on this connection.
+
+        :param after_reply: if True, the next sent message still uses the
+                            current encoding. This is used by the server to
+                            acknowledge the change.
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError("Unknown ipc encoding: %s" % encoding)
+        self._decoder.encoding = encoding
+        if after_reply:
+            self._next_encoding = encoding
+        else:
+            self._encoding = encoding
+
+    def get_data(self, timeout=30000):
+        try:
+            msg = self._read_message()
+            while msg is None and self.sock.waitForReadyRead(timeout):
+                msg = self._read_message()
+        except ProtocolError as exc:
+            self._protocol_error(exc)
+            return None
+        return msg
 
-    def get_data(self):
-        while self.sock.waitForReadyRead():
-            r = self.on_ready_read()
-            if r is not None:
-                return r
+    def send_request(self, data):
+        """
+        Send a request without waiting for its reply, and returns its id.
+
+        Many requests can be sent before reading the replies with
+        :meth:`get_reply`.
+        """
+        self._request_id += 1
+        self.send_data(dict(data, id=self._request_id))
+        return self._request_id
+
+    def get_reply(self, request_id):
+        """
+        Wait for the reply of the given request.
+        """
+        while request_id not in self._replies:
+            if not self._read_pending():
+                return None
+        return self._replies.pop(request_id)
+
+    def get_event(self, timeout=-1):
+        """
+        Wait for the next event sent by a subscription.
+        """
+        while not self._events:
+            if not self._read_pending(timeout):
+                return None
+        return self._events.pop(0)
+
+    def _read_pending(self, timeout=30000):
+        msg = self.get_data(timeout)
+        if msg is None:
+            return False
+        if "event" in msg:
+            self._events.append(msg)
+        else:
+            self._replies[msg.get("id")] = msg
+        return True
 
     def clear(self):
         self.sock.deleteLater()
@@ -75,12 +150,12 @@ class IPcReader(QObject):
 class IpcServer(QObject):
     @classmethod
     def get_sock_name(cls, instance):
-        run_path = f"/run/user/{os.getuid()}"
-        prefix = run_path if os.access(run_path, os.W_OK) else ""
+        return sock_name(instance)
 
-        if instance == "default":
-            return os.path.join(prefix, "webmacs.ipc")
-        return os.path.join(prefix, f"webmacs.{instance}.ipc")
+    # the running instances and when they were listed, see
+    # list_all_instances
+    _live_instances = None
+    _live_instances_time = 0
 
     @classmethod
     def list_all_instances(cls, check=True):
@@ -89,21 +164,15 @@ class IpcServer(QObject):
                 "list all instances is not supported on windows"
             )
             return []
-        # from qt sources, named pipes are created in QDir.tempPath()
-        instances = [
-            n[8:-4] or "default"
-            for n in os.listdir(QDir.tempPath())
-            if n.startswith("webmacs.") and n.endswith(".ipc")
-        ]
-        if check:
-            new_instances = []
-            for instance in instances:
-                local = cls.check_server_connection(instance)
-                if local is not None:
-                    local.clear()
-                    new_instances.append(instance)
-            instances = new_instances
-        return instances
+        if not check:
+            return list_instances(check=False)
+        # probing is cheap, but the instance prompts may list them often.
+        now = time.monotonic()
+        if cls._live_instances is None \
+           or now - cls._live_instances_time > INSTANCES_CACHE_TIMEOUT:
+            cls._live_instances = list_instances()
+            cls._live_instances_time = now
+        return list(cls._live_instances)
 
     @classmethod
     def instance_send(cls, instance, data, cb=None):
@@ -128,6 +197,7 @@ class IpcServer(QObject):
         sock.connectToServer(cls.get_sock_name(instance))
         if sock.waitForConnected(1000):
             return IPcReader(sock)
+        cls._live_instances = None
         return None
 
     def __init__(self, instance=None):
@@ -161,31 +231,269 @@ class IpcServer(QObject):
     @Slot(object)
     def handle_data(self, data):
         reader = self.sender()
+        if "method" in data:
+            reader.send_data(ipc_call(reader, data))
+            return
+
         try:
             res = ipc_dispatch(data)
         except Exception as exc:
             res = str(exc)
 
-        if res in (True, None):
-            reader.send_data({"result": True})
+        if isinstance(res, list):
+            reply = {"result": all(r["result"] for r in res), "results": res}
+        elif res in (True, None):
+            reply = {"result": True}
         else:
-            reader.send_data({"result": False, "message": res})
+            reply = {"result": False, "message": res}
+        if "id" in data:
+            reply["id"] = data["id"]
+        reader.send_data(reply)
 
     def reader_disconnected(self):
         conn = self.sender()
         reader = self._readers.pop(conn)
+        _unsubscribe(reader, list(reader.subscriptions))
         reader.clear()
         reader.deleteLater()
 
 
-def ipc_dispatch(data):
-    from . import current_window
+#: the methods that can be called through ipc, see :func:`ipc_method`.
+IPC_METHODS = {}
+
+
+def ipc_method(name):
+    """
+    Register a function that can be called through ipc.
+
+    The function is called with the connection (an :class:`IPcReader`) and
+    the "params" of the request as keyword arguments. Its result must be
+    serializable in json.
+    """
+    def wrapper(func):
+        IPC_METHODS[name] = func
+        return func
+    return wrapper
+
+
+def ipc_call(reader, data):
+    """
+    Call the method of a json-rpc like request, and returns the reply.
+
+    A request is {"id": ..., "method": ..., "params": {...}}, and the reply
+    is either {"id": ..., "result": ...} or {"id": ..., "error": message}.
+    """
+    reply = {"id": data.get("id")}
+    try:
+        method = IPC_METHODS[data["method"]]
+    except KeyError:
+        reply["error"] = "No such method: %s" % data["method"]
+        return reply
+    try:
+        reply["result"] = method(reader, **(data.get("params") or {}))
+    except Exception as exc:
+        logging.exception("Error calling ipc method %s", data["method"])
+        reply["error"] = str(exc) or exc.__class__.__name__
+    return reply
+
+
+def _buffer_info(buff):
+    return {"id": id(buff), "url": buff.url().toString(),
+            "title": buff.title()}
+
+
+def _ipc_value(value):
+    from .webbuffer import WebBuffer, BufferPlaceholder
+    if isinstance(value, (WebBuffer, BufferPlaceholder)):
+        return _buffer_info(value)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+@ipc_method("set-encoding")
+def _ipc_set_encoding(reader, encoding):
+    """
+    Use another encoding for the next messages on the connection, see
+    webmacs.ipc_protocol.ENCODINGS. The reply is sent in the old encoding.
+    """
+    reader.set_encoding(encoding, after_reply=True)
+    return encoding
+
+
+@ipc_method("open-urls")
+def _ipc_open_urls(reader, urls, target="new-buffer"):
+    return ipc_dispatch({"urls": urls, "target": target})
+
+
+@ipc_method("run-command")
+def _ipc_run_command(reader, name):
+    from . import COMMANDS
+    from .keyboardhandler import CommandContext
+    try:
+        command = COMMANDS[name]
+    except KeyError:
+        raise KeyError("No such command: %s" % name) from None
+    command(CommandContext())
+    return True
+
+
+@ipc_method("list-commands")
+def _ipc_list_commands(reader):
+    from . import COMMANDS
+    return sorted(name for name, cmd in COMMANDS.items() if cmd.visible)
+
+
+@ipc_method("list-buffers")
+def _ipc_list_buffers(reader):
+    from . import BUFFERS, current_buffer
+    current = current_buffer()
+    return [dict(_buffer_info(buff), current=buff is current)
+            for buff in BUFFERS]
+
+
+@ipc_method("get-variable")
+def _ipc_get_variable(reader, name):
+    from . import variables
+    return variables.get(name)
+
+
+@ipc_method("set-variable")
+def _ipc_set_variable(reader, name, value):
+    from . import variables
+    variables.set(name, value)
+    return True
+
+
+def _hook(name):
+    from . import hooks
+    hook = getattr(hooks, name, None)
+    if not isinstance(hook, hooks.Hook):
+        raise KeyError("No such hook: %s" % name)
+    return hook
+
+
+def _unsubscribe(reader, names):
+    for name in names:
+        callback = reader.subscriptions.pop(name, None)
+        if callback is not None:
+            _hook(name).remove_if_exists(callback)
+
+
+@ipc_method("subscribe")
+def _ipc_subscribe(reader, hooks):
+    """
+    Send {"event": hook_name, "params": [...]} on the connection each time
+    one of the given hooks is called.
+    """
+    callbacks = {}
+    for name in hooks:
+        hook = _hook(name)
+        if name in reader.subscriptions:
+            continue
+
+        def callback(*args, name=name):
+            if reader.sock is not None:
+                reader.send_data({"event": name,
+                                  "params": [_ipc_value(a) for a in args]})
+        callbacks[name] = (hook, callback)
+    for name, (hook, callback) in callbacks.items():
+        hook.add(callback)
+        reader.subscriptions[name] = callback
+    return sorted(reader.subscriptions)
+
+
+@ipc_method("unsubscribe")
+def _ipc_unsubscribe(reader, hooks):
+    _unsubscribe(reader, hooks)
+    return sorted(reader.subscriptions)
+
+
+#: where an url is opened: in the current buffer, in a new buffer displayed
+#: in the current view, in a new buffer not displayed, or in a new window.
+URL_TARGETS = ("current-buffer", "new-buffer", "background", "new-window")
+
+
+def ipc_urls(data):
+    """
+    Returns the list of (url, target) to open from an ipc message.
+
+    The message may contain either an "url", or a list of "urls" where each
+    item is an url or a dict with "url" and "target" keys. The "target" key of
+    the message is the default target.
+    """
+    target = data.get("target") or "new-buffer"
+    urls = data.get("urls")
+    if urls is None:
+        urls = [data["url"]] if data.get("url") else []
+    result = []
+    for url in urls:
+        if isinstance(url, dict):
+            result.append((url["url"], url.get("target") or target))
+        else:
+            result.append((url, target))
+    for url, target in result:
+        if target not in URL_TARGETS:
+            raise ValueError("Unknown url target %r" % target)
+    return result
+
+
+def _open_url(win, url, target):
+    from .window import Window
     from .webbuffer import create_buffer
-    win = current_window()
-    url = data.get("url")
-    if url:
-        view = win.current_webview()
-        view.setBuffer(create_buffer(url))
+
+    if target == "current-buffer" and win.current_webview().buffer():
+        win.current_webview().buffer().load(url)
+    elif target == "background":
+        create_buffer(url)
+    elif target == "new-window":
+        w = Window()
+        w.current_webview().setBuffer(create_buffer(url))
+        w.show()
+        return w
+    else:
+        win.current_webview().setBuffer(create_buffer(url))
+    return win
+
+
+def ipc_dispatch(data):
+    from . import current_window, windows, daemon
+    urls = ipc_urls(data)
+
+    if daemon.DAEMON is not None and daemon.DAEMON.initialize(data):
+        # the first request of a daemon, handled like a startup command line
+        if "urls" in data:
+            return [{"url": url, "result": True} for url, _ in urls]
+        return None
+
+    win = current_window() or (windows()[-1] if windows() else None)
+    results = [None] * len(urls)
+    # background buffers are inserted next to the current one, so they are
+    # created from the last one to keep their order.
+    order = [i for i in reversed(range(len(urls)))
+             if urls[i][1] == "background"]
+    order += [i for i in range(len(urls)) if urls[i][1] != "background"]
+    for i in order:
+        url, target = urls[i]
+        if win is None and target != "background":
+            # no window, a daemon (see webmacs.daemon)
+            win = daemon.open_window()
+            if target == "new-window":
+                target = "new-buffer"
+        try:
+            win = _open_url(win, url, target)
+        except Exception as exc:
+            logging.exception("Unable to open %s", url)
+            results[i] = {"url": url, "result": False, "message": str(exc)}
+        else:
+            results[i] = {"url": url, "result": True}
+
+    if urls and all(target == "background" for _, target in urls):
+        # do not steal the focus
+        return results
+
+    if win is None:
+        win = daemon.open_window()
 
     # this is quite hard to raise a window. The following works fine
     # for me with gnome 3.
@@ -195,3 +503,7 @@ def ipc_dispatch(data):
     win.activateWindow()
     win.setWindowFlags(flags)
     win.show()
+    if "urls" in data:
+        return results
+    return results[0]["message"] if results and not results[0]["result"] \
+        else None
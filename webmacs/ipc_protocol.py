@@ -0,0 +1,258 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Framing and encoding of the ipc messages, independent of Qt.
+
+A message is a 4 bytes big endian size followed by the encoded message. The
+encoding is json, unless a connection switches to the compact binary
+encoding (see the set-encoding ipc method).
+"""
+
+import json
+import struct
+
+
+HEADER_FMT = "!I"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+
+# messages bigger than this are refused
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+# initial size of the buffer of a decoder, it grows as needed
+BUFFER_SIZE = 64 * 1024
+
+# maximum nesting of lists and dicts in a binary message
+MAX_DEPTH = 64
+
+
+class ProtocolError(Exception):
+    "Raised when an ipc message can not be read"
+
+
+# binary encoding: a tag byte followed by the value. Integers and sizes are
+# variable length (7 bits per byte), integers are zigzag encoded so small
+# negative numbers are small too.
+
+_FLOAT = struct.Struct("!d")
+_SIZE = struct.Struct(HEADER_FMT)
+
+
+def _pack_varint(value, out):
+    while value > 0x7f:
+        out.append(0x80 | (value & 0x7f))
+        value >>= 7
+    out.append(value)
+
+
+def _unpack_varint(view, offset):
+    result = shift = 0
+    while True:
+        byte = view[offset]
+        offset += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, offset
+        shift += 7
+
+
+def _pack(value, out):
+    if value is None:
+        out.append(0x4e)  # N
+    elif value is True:
+        out.append(0x54)  # T
+    elif value is False:
+        out.append(0x46)  # F
+    elif isinstance(value, int):
+        out.append(0x69)  # i
+        _pack_varint(value * 2 if value >= 0 else -value * 2 - 1, out)
+    elif isinstance(value, float):
+        out.append(0x64)  # d
+        out += _FLOAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        out.append(0x73)  # s
+        _pack_varint(len(data), out)
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(0x79)  # y
+        _pack_varint(len(value), out)
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out.append(0x6c)  # l
+        _pack_varint(len(value), out)
+        for item in value:
+            _pack(item, out)
+    elif isinstance(value, dict):
+        out.append(0x6d)  # m
+        _pack_varint(len(value), out)
+        for key, item in value.items():
+            _pack(key, out)
+            _pack(item, out)
+    else:
+        raise TypeError("Can not encode %r" % (value,))
+
+
+def _unpack(view, offset, depth=0):
+    tag = view[offset]
+    offset += 1
+    if tag == 0x4e:
+        return None, offset
+    if tag == 0x54:
+        return True, offset
+    if tag == 0x46:
+        return False, offset
+    if tag == 0x64:
+        return _FLOAT.unpack_from(view, offset)[0], offset + _FLOAT.size
+    size, offset = _unpack_varint(view, offset)
+    if tag == 0x69:
+        return (size >> 1) if not size & 1 else -(size >> 1) - 1, offset
+    if tag in (0x73, 0x79):
+        end = offset + size
+        if end > len(view):
+            raise ProtocolError("Truncated binary message")
+        if tag == 0x73:
+            return str(view[offset:end], "utf-8"), end
+        return bytes(view[offset:end]), end
+    if tag in (0x6c, 0x6d) and depth >= MAX_DEPTH:
+        raise ProtocolError("Binary message nested too deeply")
+    if tag == 0x6c:
+        result = []
+        for _ in range(size):
+            item, offset = _unpack(view, offset, depth + 1)
+            result.append(item)
+        return result, offset
+    if tag == 0x6d:
+        result = {}
+        for _ in range(size):
+            key, offset = _unpack(view, offset, depth + 1)
+            result[key], offset = _unpack(view, offset, depth + 1)
+        return result, offset
+    raise ProtocolError("Unknown binary tag: %r" % tag)
+
+
+def binary_dumps(value):
+    out = bytearray()
+    _pack(value, out)
+    return out
+
+
+def binary_loads(data):
+    with memoryview(data) as view:
+        try:
+            value, offset = _unpack(view, 0)
+        except (IndexError, struct.error, TypeError,
+                UnicodeDecodeError) as exc:
+            raise ProtocolError("Invalid binary message: %s" % exc) from None
+        if offset != len(view):
+            raise ProtocolError("Trailing data in binary message")
+    return value
+
+
+def _json_dumps(value):
+    return json.dumps(value).encode("utf-8")
+
+
+def _json_loads(data):
+    try:
+        return json.loads(str(data, "utf-8"))
+    except (ValueError, RecursionError) as exc:
+        raise ProtocolError("Invalid json message: %s" % exc) from None
+
+
+#: name -> (dumps, loads)
+ENCODINGS = {
+    "json": (_json_dumps, _json_loads),
+    "binary": (binary_dumps, binary_loads),
+}
+
+
+def encode_message(msg, encoding="json"):
+    """
+    Returns the bytes to send for a message, header included.
+    """
+    data = ENCODINGS[encoding][0](msg)
+    if len(data) > MAX_MESSAGE_SIZE:
+        raise ProtocolError("Message too big: %d bytes" % len(data))
+    return _SIZE.pack(len(data)) + data
+
+
+class MessageDecoder(object):
+    """
+    Decode the messages from a stream of bytes.
+
+    Data is copied once in a buffer that is reused for the next messages of
+    the connection, and messages are decoded from a view on this buffer.
+
+    :param max_size: the maximum size of a message.
+    :param encoding: the encoding of the messages, it may be changed between
+                     two messages.
+    """
+
+    def __init__(self, max_size=MAX_MESSAGE_SIZE, encoding="json"):
+        self.max_size = max_size
+        self.encoding = encoding
+        self._buffer = bytearray(min(BUFFER_SIZE, max_size + HEADER_SIZE))
+        self._start = self._end = 0
+
+    def feed(self, data):
+        """
+        Add received data.
+        """
+        size = len(data)
+        if self._end + size > len(self._buffer):
+            self._make_room(size)
+        self._buffer[self._end:self._end + size] = data
+        self._end += size
+
+    def _make_room(self, size):
+        pending = self._end - self._start
+        if pending + size > len(self._buffer):
+            # grow, the maximum message size is checked when reading headers
+            new_size = len(self._buffer)
+            while new_size < pending + size:
+                new_size *= 2
+            buffer = bytearray(new_size)
+            buffer[:pending] = self._buffer[self._start:self._end]
+            self._buffer = buffer
+        else:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        self._start, self._end = 0, pending
+
+    def next_message(self):
+        """
+        Returns the next complete message, or None.
+
+        :raises: ProtocolError if the message is too big or can not be
+                 decoded. The connection should then be closed.
+        """
+        pending = self._end - self._start
+        if pending < HEADER_SIZE:
+            return None
+        size = _SIZE.unpack_from(self._buffer, self._start)[0]
+        if size > self.max_size:
+            raise ProtocolError("Message too big: %d bytes" % size)
+        if pending < HEADER_SIZE + size:
+            return None
+        start = self._start + HEADER_SIZE
+        self._start = start + size
+        with memoryview(self._buffer) as view:
+            data = view[start:self._start]
+            try:
+                return ENCODINGS[self.encoding][1](data)
+            finally:
+                data.release()
+                if self._start == self._end:
+                    self._start = self._end = 0
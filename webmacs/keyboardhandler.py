@@ -18,7 +18,7 @@ import logging
 from PyQt6.QtCore import QObject, QEvent
 from PyQt6.QtGui import QWindow
 
-from .keymaps import KeyPress, GLOBAL_KEYMAP, CHAR2KEY
+from .keymaps import KeyPress, GLOBAL_KEYMAP, CHAR2KEY, dispatch_table
 from . import hooks
 from . import COMMANDS, minibuffer_show_info, current_minibuffer, \
     current_window
@@ -146,6 +146,7 @@ class KeyEater(object):
         self._keypresses = []
         self._local_key_map = None
         self._use_global_keymap = True
+        self._active_keymaps = (GLOBAL_KEYMAP,)
         self.universal_key = KeyPress.from_str("C-u")
         self._prefix_arg = None
         self._prefix_arg_keys = []
@@ -160,6 +161,7 @@ class KeyEater(object):
     def set_local_key_map(self, keymap):
         if keymap != self._local_key_map:
             self._local_key_map = keymap
+            self._active_keymaps = tuple(self.active_keymaps())
             hooks.local_mode_changed(keymap)
             logging.debug("local keymap activated: %s", keymap)
 
@@ -168,6 +170,7 @@ class KeyEater(object):
 
     def set_global_keymap_enabled(self, enable):
         self._use_global_keymap = enable
+        self._active_keymaps = tuple(self.active_keymaps())
 
     def event_filter(self, obj, event):
         key = KeyPress.from_qevent(event)
@@ -185,7 +188,7 @@ class KeyEater(object):
 
     def _add_keypress(self, keypress):
         self._keypresses.append(keypress)
-        logging.debug("keychord: %s" % self._keypresses)
+        logging.debug("keychord: %s", self._keypresses)
 
     def _num_update_prefix_arg(self, numstr):
         if not isinstance(self._prefix_arg, int):
@@ -220,13 +223,12 @@ class KeyEater(object):
                     self._show_info_kbd()
                     return True
 
-        result = None
         self._add_keypress(keypress)
 
-        for keymap in self.active_keymaps():
-            result = keymap.lookup(self._keypresses)
-            if result:
-                break
+        # the active keymaps are compiled in one table, cached until a
+        # binding changes.
+        keymaps = self._active_keymaps
+        result = dispatch_table(keymaps).lookup(self._keypresses)
 
         if not result:
             if len(self._keypresses) > 1:
@@ -234,7 +236,8 @@ class KeyEater(object):
             else:
                 minibuffer_show_info("")
             self._keypresses = []
-            self.call_handler.no_call(sender, keymap, keypress)
+            self.call_handler.no_call(sender, keymaps[-1] if keymaps else None,
+                                      keypress)
             self._prefix_arg = None
             self._prefix_arg_keys = []
             return False
@@ -246,13 +249,13 @@ class KeyEater(object):
             self._prefix_arg = None
             self._prefix_arg_keys = []
             try:
-                self.call_handler.call(ctx, keymap, keypress,
+                self.call_handler.call(ctx, result.keymap, keypress,
                                        result.command)
             except Exception:
                 logging.exception("Error calling command:")
         else:
             self._show_info_kbd(" -")
-            self.call_handler.partial_call(sender, keymap, keypress)
+            self.call_handler.partial_call(sender, result.keymap, keypress)
 
         return result is not None
 
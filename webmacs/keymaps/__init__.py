@@ -224,11 +224,36 @@ _KeyPress = namedtuple("_KeyPress", ("key", "control_modifier", "alt_modifier",
                                      "is_upper_case"))
 
 
+# the KeyPress of the Qt key events by (key, modifiers, text), see
+# KeyPress.from_qevent. Bounded, as the texts given by input methods are not.
+_QEVENT_KEYPRESSES = {}
+QEVENT_KEYPRESSES_MAX = 1024
+
+
 class KeyPress(_KeyPress):
+    __slots__ = ()
+
     @classmethod
     def from_qevent(cls, event):
+        """
+        Returns the KeyPress of a Qt key event, or None if the key is not
+        handled. The same instance is returned for the same key, modifiers
+        and text, so typing does not allocate new key presses.
+        """
         text = event.text()
+        cache_key = (event.key(), event.modifiers(), text)
+        try:
+            return _QEVENT_KEYPRESSES[cache_key]
+        except KeyError:
+            pass
+        keypress = cls._from_qevent(cache_key[0], cache_key[1], text)
+        if len(_QEVENT_KEYPRESSES) >= QEVENT_KEYPRESSES_MAX:
+            _QEVENT_KEYPRESSES.clear()
+        _QEVENT_KEYPRESSES[cache_key] = keypress
+        return keypress
 
+    @classmethod
+    def _from_qevent(cls, event_key, modifiers, text):
         # Try to get the key value depending on the text. Despite what the qt
         # doc says, it seems more reliable to get the good value this way. For
         # example, to match C-? on my french keyboard (using the bépo layout)
@@ -236,12 +261,10 @@ class KeyPress(_KeyPress):
         # DOWN.
         key = CHAR2KEY.get(text)
         if key is None:
-            key = event.key()
+            key = event_key
             if key not in KEY2CHAR:
                 return None
 
-        modifiers = event.modifiers()
-
         return cls(
             key,
             bool(modifiers & Qt.KeyboardModifier.ControlModifier),
@@ -338,12 +361,25 @@ KeymapLookupResult = namedtuple("KeymapLookupResult",
                                 ("complete", "command", "keymap"))
 
 
+# compiled dispatch tables by active keymaps, see dispatch_table()
+_DISPATCH_TABLES = {}
+
+
 class InternalKeymap(object):
-    __slots__ = ("bindings", "parent")
+    __slots__ = ("bindings", "_parent")
 
     def __init__(self, parent=None):
         self.bindings = {}
-        self.parent = parent
+        self._parent = parent
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent):
+        self._parent = parent
+        _DISPATCH_TABLES.clear()
 
     def _traverse_commands(self, prefix, acc_fn, parent=None):
         for keypress, cmd in self.bindings.items():
@@ -398,6 +434,7 @@ class InternalKeymap(object):
             kmap = othermap
 
         kmap.bindings[keys[-1]] = binding
+        _DISPATCH_TABLES.clear()
 
     def define_key(self, key, binding=None):
         """
@@ -430,6 +467,7 @@ class InternalKeymap(object):
         res = self.lookup(keys)
         if res is not None and res.complete:
             del res.keymap.bindings[keys[-1]]
+            _DISPATCH_TABLES.clear()
             return res.keymap
         return None
 
@@ -464,6 +502,74 @@ class InternalKeymap(object):
             return None
 
 
+class DispatchTable(object):
+    """
+    The bindings of the active keymaps, compiled in one prefix tree.
+
+    Each node maps a keypress to a (result, children) tuple, where children
+    is the next node for a prefix key, or None for a complete binding. The
+    keymap of a result is the active keymap providing the binding.
+
+    :param keymaps: the active keymaps, by order of priority. The parents of
+        each keymap come right after it.
+    """
+    __slots__ = ("keymaps", "root")
+
+    def __init__(self, keymaps):
+        self.keymaps = keymaps
+        self.root = {}
+        for keymap in keymaps:
+            bindings = {}
+            km = keymap
+            while km:
+                for keypress, entry in km.bindings.items():
+                    bindings.setdefault(keypress, entry)
+                km = km.parent
+            self._merge(self.root, bindings, keymap)
+
+    def _merge(self, node, bindings, keymap):
+        for keypress, entry in bindings.items():
+            current = node.get(keypress)
+            if isinstance(entry, InternalKeymap):
+                if current is None:
+                    current = node[keypress] = (
+                        KeymapLookupResult(False, None, keymap), {})
+                elif current[1] is None:
+                    # a binding of a keymap with a higher priority
+                    continue
+                self._merge(current[1], entry.bindings, keymap)
+            elif current is None:
+                node[keypress] = (KeymapLookupResult(True, entry, keymap),
+                                  None)
+
+    def lookup(self, keypresses):
+        """
+        Returns the KeymapLookupResult of the key sequence, or None if it is
+        not bound.
+        """
+        result, node = None, self.root
+        for keypress in keypresses:
+            entry = node.get(keypress)
+            if entry is None:
+                return None
+            result, node = entry
+            if node is None:
+                break
+        return result
+
+
+def dispatch_table(keymaps):
+    """
+    Returns the :class:`DispatchTable` for the given tuple of active keymaps.
+
+    Tables are cached by keymaps identity until a binding changes.
+    """
+    table = _DISPATCH_TABLES.get(keymaps)
+    if table is None:
+        table = _DISPATCH_TABLES[keymaps] = DispatchTable(keymaps)
+    return table
+
+
 class Keymap(InternalKeymap):
     __slots__ = InternalKeymap.__slots__ + ("name", "doc")
 
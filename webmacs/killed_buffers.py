@@ -13,66 +13,126 @@
 # You should have received a copy of the GNU General Public License
 # along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
 
-import collections
-from PyQt6.QtCore import QDataStream, QByteArray, QIODevice
-from .webbuffer import create_buffer
-from . import variables, hooks
+
+import logging
+
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, QUrl
+from PyQt6.QtGui import QIcon, QPixmap
+from .webbuffer import create_buffer, DelayedLoadingUrl
+from . import variables, hooks, call_later
+
+# killed buffers are written to the store in batches, after this delay in
+# milliseconds.
+FLUSH_DELAY = 2000
+_FLUSH_SCHEDULED = False
+
+
+def _trim(nb):
+    store = _store()
+    if store is not None:
+        store.trim(nb)
 
 
 max_size = variables.define_variable(
     "revive-buffers-limit",
     "The maximum number of killed buffers that can be revived."
+    " Killed buffers are stored on disk, and kept across restarts."
     " If set to a -1, there is no limit. Default to 10.",
     10,
     type=variables.Int(min=-1),
     callbacks=(
-        lambda v: KilledBuffer.update_max_size(v.value)
+        lambda v: _trim(v.value)
     ),
 )
 
 
+def _store():
+    from .application import app
+
+    a = app()
+    return a.profile.killed_buffers if a else None
+
+
+def _flush():
+    global _FLUSH_SCHEDULED
+    _FLUSH_SCHEDULED = False
+    store = _store()
+    if store is None:
+        return
+    try:
+        store.flush()
+    except Exception:
+        logging.exception("Unable to store the killed buffers")
+
+
+def _schedule_flush():
+    global _FLUSH_SCHEDULED
+    if not _FLUSH_SCHEDULED:
+        _FLUSH_SCHEDULED = True
+        call_later(_flush, FLUSH_DELAY)
+
+
+def _icon_data(icon):
+    if icon.isNull():
+        return None
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    icon.pixmap(16, 16).save(buffer, "PNG")
+    return bytes(data)
+
+
 class KilledBuffer(object):
-    all = collections.deque(maxlen=max_size.value)
+    """
+    A killed buffer, as listed from the store. The icon is loaded lazily,
+    and the history only when the buffer is revived.
+    """
 
-    @classmethod
-    def update_max_size(cls, nb):
-        new_all = collections.deque(maxlen=nb if nb >= 0 else None)
-        for item in reversed(cls.all):
-            new_all.appendleft(item)
-        cls.all = new_all
-
-    def __init__(self, url, title, icon, history_data, delayed):
-        self.url = url
+    def __init__(self, id, url, title, icon_hash):
+        self.id = id
+        self.url = QUrl(url)
         self.title = title
-        self.icon = icon
-        self.history_data = history_data
-        self.delayed = delayed
-        self.all.appendleft(self)
+        self._icon_hash = icon_hash
+        self._icon = None
 
     @classmethod
-    def from_buffer(cls, buff):
-        data = QByteArray()
-        stream = QDataStream(data, QIODevice.OpenModeFlag.WriteOnly)
-        stream << buff.history()
-
-        return cls(
-            buff.url(),
-            buff.title(),
-            buff.icon(),
-            data,
-            buff.delayed_loading_url()
-        )
+    def all(cls):
+        """
+        Returns the killed buffers, most recently killed first.
+        """
+        store = _store()
+        return [cls(*entry) for entry in store.entries()] if store else []
+
+    @property
+    def icon(self):
+        if self._icon is None:
+            self._icon = QIcon()
+            data = self._icon_hash and _store().blob(self._icon_hash)
+            if data:
+                pixmap = QPixmap()
+                pixmap.loadFromData(data)
+                self._icon = QIcon(pixmap)
+        return self._icon
+
+    @staticmethod
+    def from_buffer(buff):
+        if max_size.value == 0:
+            return
+        _store().add(buff.url().toString(), buff.title(),
+                     _icon_data(buff.icon()), buff.history_blob(),
+                     max_size.value)
+        _schedule_flush()
 
     def revive(self):
-        buff = create_buffer()
-        stream = QDataStream(self.history_data,
-                             QIODevice.OpenModeFlag.ReadOnly)
-        stream >> buff.history()
-        self.all.remove(self)
-
-        if self.delayed:
-            buff.load(self.delayed.url)
-        return buff
+        """
+        Create a buffer from this killed buffer, loaded when displayed.
+        Returns None if it was already revived.
+        """
+        entry = _store().pop(self.id)
+        if entry is None:
+            return None
+        url, title, history = entry
+        return create_buffer(DelayedLoadingUrl(QUrl(url), title, history))
 
 
 hooks.webbuffer_closed.add(KilledBuffer.from_buffer)
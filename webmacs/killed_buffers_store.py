@@ -0,0 +1,137 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+import sqlite3
+import hashlib
+
+
+class KilledBuffersStore(object):
+    """
+    A ring of killed buffers, stored in a sqlite database.
+
+    The (compressed) history and icon of the killed buffers are stored
+    separately by hash, so they are only loaded when needed and shared
+    between entries.
+
+    Added buffers are queued, and written in a single transaction by
+    :meth:`flush`, so closing many buffers costs one commit and one cleanup
+    of the unused blobs. Reading the store flushes it first.
+    """
+
+    def __init__(self, dbpath):
+        self._pending = []
+        self._limit = -1
+        self._conn = sqlite3.connect(dbpath)
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS killedbuffers
+        (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, title TEXT,
+        icon TEXT, history TEXT);
+        CREATE TABLE IF NOT EXISTS blobs
+        (hash TEXT PRIMARY KEY, data BLOB);
+        """)
+
+    def _add_blob(self, data):
+        if not data:
+            return None
+        hash = hashlib.sha1(data).hexdigest()
+        self._conn.execute(
+            "INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)",
+            (hash, data))
+        return hash
+
+    def blob(self, hash):
+        row = self._conn.execute("SELECT data FROM blobs WHERE hash = ?",
+                                 (hash,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, url, title, icon, history, limit=-1):
+        """
+        Queue a killed buffer, given its url, title, icon (bytes) and
+        history (bytes), keeping only the given number of entries (-1 for no
+        limit) once flushed.
+        """
+        self._pending.append((url, title, icon, history))
+        self._limit = limit
+
+    def flush(self):
+        """
+        Write the queued killed buffers.
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        if self._limit >= 0:
+            # older entries would be trimmed right away
+            pending = pending[-self._limit:] if self._limit else []
+        self._conn.executemany("""
+        INSERT INTO killedbuffers (url, title, icon, history)
+        VALUES (?, ?, ?, ?)
+        """, [(url, title, self._add_blob(icon), self._add_blob(history))
+              for url, title, icon, history in pending])
+        self.trim(self._limit)
+
+    def trim(self, limit, commit=True):
+        """
+        Keep only the given number of most recent entries (-1 for no limit).
+        """
+        self._limit = limit
+        self.flush()
+        if limit >= 0:
+            self._conn.execute("""
+            DELETE FROM killedbuffers WHERE id NOT IN
+            (SELECT id FROM killedbuffers ORDER BY id DESC LIMIT ?)
+            """, (limit,))
+        self._remove_unused_blobs()
+        if commit:
+            self._conn.commit()
+
+    def _remove_unused_blobs(self):
+        self._conn.execute("""
+        DELETE FROM blobs WHERE hash NOT IN
+        (SELECT icon FROM killedbuffers WHERE icon IS NOT NULL
+        UNION SELECT history FROM killedbuffers WHERE history IS NOT NULL)
+        """)
+
+    def entries(self):
+        """
+        Returns the (id, url, title, icon hash) of the killed buffers, most
+        recent first.
+        """
+        self.flush()
+        return self._conn.execute(
+            "SELECT id, url, title, icon FROM killedbuffers ORDER BY id DESC"
+        ).fetchall()
+
+    def __len__(self):
+        self.flush()
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM killedbuffers").fetchone()[0]
+
+    def pop(self, id):
+        """
+        Remove a killed buffer, returning its (url, title, history) or None.
+        """
+        self.flush()
+        row = self._conn.execute("""
+        SELECT url, title, history FROM killedbuffers WHERE id = ?
+        """, (id,)).fetchone()
+        if row is None:
+            return None
+        url, title, history = row
+        history = self.blob(history) if history else None
+        self._conn.execute("DELETE FROM killedbuffers WHERE id = ?", (id,))
+        self._remove_unused_blobs()
+        self._conn.commit()
+        return url, title, history
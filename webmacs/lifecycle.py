@@ -0,0 +1,196 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Freeze and discard hidden buffers, see the Qt WebEngine page lifecycle.
+
+A frozen page does not run any javascript (timers, animations), a discarded
+page also releases its resources and is reloaded when displayed again.
+
+Hidden buffers are frozen after a grace period, unless they are playing audio
+or are kept alive (see the toggle-buffer-keep-alive command). The least
+recently used hidden buffers are discarded when the memory budget is exceeded,
+except those playing audio or kept alive too.
+"""
+
+import logging
+
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWebEngineCore import QWebEnginePage
+
+from . import variables, hooks, BUFFERS
+from .webbuffer import WebBuffer
+from .process_stats import process_rss
+
+
+LifecycleState = QWebEnginePage.LifecycleState
+
+# seconds between two checks of the buffers
+CHECK_INTERVAL = 30
+
+
+buffer_freeze_delay = variables.define_variable(
+    "buffer-freeze-delay",
+    "Freeze buffers that have been hidden for the given number of seconds:"
+    " their javascript timers and animations stop until they are displayed"
+    " again. Buffers playing audio or kept alive are never frozen. 0"
+    " disables freezing.",
+    1800,
+    type=variables.Int(min=0),
+)
+
+buffer_memory_budget = variables.define_variable(
+    "buffer-memory-budget",
+    "Memory budget in megabytes for the web content processes. When it is"
+    " exceeded, the least recently used hidden buffers are discarded: their"
+    " resources are released, and they are reloaded transparently when"
+    " displayed again. Buffers playing audio or kept alive are never"
+    " discarded. 0 means no budget.",
+    0,
+    type=variables.Int(min=0),
+)
+
+
+def _can_set(buff, state):
+    # Active < Frozen < Discarded, and the recommended state is the limit
+    return state.value <= buff.recommendedState().value
+
+
+class BufferLifecyclePolicy(object):
+    """
+    Freeze the hidden buffers after a grace period, and periodically discard
+    the hidden buffers if needed.
+    """
+
+    def __init__(self):
+        self._freeze_timers = {}
+        self._timer = QTimer()
+        self._timer.timeout.connect(self.check)
+
+    def start(self):
+        self._timer.start(CHECK_INTERVAL * 1000)
+        hooks.webbuffer_hidden.add(self.buffer_hidden)
+        hooks.webbuffer_shown.add(self.buffer_shown)
+        hooks.webbuffer_current_changed.add(self.buffer_shown)
+        hooks.webbuffer_closed.add(self._cancel_freeze)
+        for buff in BUFFERS:
+            if isinstance(buff, WebBuffer) and not buff.view():
+                self.buffer_hidden(buff)
+
+    def stop(self):
+        self._timer.stop()
+        hooks.webbuffer_hidden.remove_if_exists(self.buffer_hidden)
+        hooks.webbuffer_shown.remove_if_exists(self.buffer_shown)
+        hooks.webbuffer_current_changed.remove_if_exists(self.buffer_shown)
+        hooks.webbuffer_closed.remove_if_exists(self._cancel_freeze)
+        for buff in list(self._freeze_timers):
+            self._cancel_freeze(buff)
+
+    def buffer_hidden(self, buff):
+        delay = buffer_freeze_delay.value
+        if not delay or not isinstance(buff, WebBuffer):
+            return
+        timer = self._freeze_timers.get(buff)
+        if timer is None:
+            timer = self._freeze_timers[buff] = QTimer()
+            timer.setSingleShot(True)
+            timer.timeout.connect(lambda: self._freeze(buff))
+        timer.start(delay * 1000)
+
+    def buffer_shown(self, buff):
+        self._cancel_freeze(buff)
+        if isinstance(buff, WebBuffer) \
+           and buff.lifecycleState() != LifecycleState.Active:
+            buff.setLifecycleState(LifecycleState.Active)
+
+    def _cancel_freeze(self, buff):
+        timer = self._freeze_timers.pop(buff, None)
+        if timer is not None:
+            timer.stop()
+            timer.deleteLater()
+
+    def _freeze(self, buff):
+        if buff.view() or buff.lifecycleState() != LifecycleState.Active:
+            self._cancel_freeze(buff)
+            return
+        if buff.keep_alive or buff.recentlyAudible() \
+           or not _can_set(buff, LifecycleState.Frozen):
+            # try again later, the audio may stop
+            self.buffer_hidden(buff)
+            return
+        self._cancel_freeze(buff)
+        logging.debug("freezing buffer %s", buff.url().toString())
+        buff.setLifecycleState(LifecycleState.Frozen)
+
+    def check(self):
+        budget = buffer_memory_budget.value * 1024 * 1024
+        if budget:
+            # placeholders are not real pages yet, nothing to do with them.
+            buffers = [b for b in BUFFERS if isinstance(b, WebBuffer)]
+            self._apply_budget(buffers, budget)
+
+    def _apply_budget(self, buffers, budget):
+        # buffers may share a render process, so the memory of a process is
+        # spread over its buffers to estimate what discarding one frees.
+        processes = {}
+        for buff in buffers:
+            if buff.lifecycleState() != LifecycleState.Discarded:
+                processes.setdefault(buff.renderProcessPid(), []).append(buff)
+        processes.pop(0, None)
+
+        memory = {pid: process_rss(pid) or 0 for pid in processes}
+        excess = sum(memory.values()) - budget
+        if excess <= 0:
+            return
+
+        candidates = sorted(
+            (b for b in buffers
+             if not b.view() and not b.keep_alive and not b.recentlyAudible()
+             and b.lifecycleState() != LifecycleState.Discarded
+             and _can_set(b, LifecycleState.Discarded)),
+            key=lambda b: b.last_use)
+        for buff in candidates:
+            if excess <= 0:
+                break
+            pid = buff.renderProcessPid()
+            if pid in processes:
+                excess -= memory[pid] / len(processes[pid])
+            logging.debug("discarding buffer %s", buff.url().toString())
+            buff.setLifecycleState(LifecycleState.Discarded)
+
+
+def discard_hidden_buffers():
+    """
+    Discard all the hidden buffers that can be, except those playing audio or
+    kept alive. Returns the number of discarded buffers.
+    """
+    count = 0
+    for buff in BUFFERS:
+        if isinstance(buff, WebBuffer) and not buff.view() \
+           and not buff.keep_alive and not buff.recentlyAudible() \
+           and buff.lifecycleState() != LifecycleState.Discarded \
+           and _can_set(buff, LifecycleState.Discarded):
+            buff.setLifecycleState(LifecycleState.Discarded)
+            count += 1
+    return count
+
+
+POLICY = None
+
+
+def init_buffer_lifecycle_policy():
+    global POLICY
+    POLICY = BufferLifecyclePolicy()
+    POLICY.start()
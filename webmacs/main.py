@@ -13,7 +13,6 @@
 # You should have received a copy of the GNU General Public License
 # along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
 
-import argparse
 import signal
 import socket
 import logging
@@ -25,7 +24,9 @@ import warnings
 from PyQt6.QtNetwork import QAbstractSocket
 
 from .ipc import IpcServer
-from . import variables, proxy, filter_webengine_output, current_window
+from .client import parse_args, request_data, print_reply
+from . import variables, proxy, filter_webengine_output, current_window, \
+    windows, call_later, hooks, startup_profile
 
 
 log_to_disk = variables.define_variable(
@@ -117,52 +118,6 @@ def setup_logging_on_disk(log_dir, backup_count=5):
         logger.addHandler(handler)
 
 
-def parse_args(argv=None):
-    parser = argparse.ArgumentParser()
-    parser.add_argument("-l", "--log-level",
-                        help="Set the log level, defaults to %(default)s.",
-                        default="warning",
-                        choices=("debug", "info", "warning",
-                                 "error", "critical"))
-
-    # There is no such JavaScript error level, critical - still since there
-    # are some logs that are printed anyway and that it is easier to implement.
-    # Let's keep the critical level.
-    parser.add_argument("-w", "--webcontent-log-level",
-                        help="Set the log level for the web contents,"
-                        " defaults to %(default)s.",
-                        default="critical",
-                        choices=("info", "warning", "error", "critical"))
-
-    parser.add_argument("-i", "--instance", default="default",
-                        help="Create or reuse a named webmacs instance."
-                        " If the given instance name is the empty string, an"
-                        " automatically generated name will be used.")
-
-    parser.add_argument("-p", "--profile", default="default",
-                        help="Use the named profile directory."
-                        " Each profile will contain distinct navigation data"
-                        " (history, cookies, ...).")
-
-    parser.add_argument("--list-instances", action="store_true",
-                        help="List running instances and exit.")
-
-    parser.add_argument("--off-the-record", action="store_true",
-                        help="Private browsing mode.")
-
-    parser.add_argument("url", nargs="?",
-                        help="url to open")
-
-    opts, user_opts = parser.parse_known_args(argv)
-
-    # handle local file path
-    if opts.url and os.path.exists(opts.url) \
-       and not os.path.isabs(opts.url):
-        opts.url = os.path.realpath(opts.url)
-
-    return opts, user_opts
-
-
 def init(opts):
     """
     Default initialization of webmacs.
@@ -177,9 +132,10 @@ def init(opts):
     :param opts: the result of the parsed command line.
     """
     from .application import app
-    from .session import session_load, session_save
+    from .session import session_load, session_save, session_journal_new
     from .window import Window
     from .webbuffer import create_buffer
+    from .daemon import open_window
 
     def session_save_on_exit():
         session_save(a.profile.session_file)
@@ -187,6 +143,11 @@ def init(opts):
     a = app()
     a.aboutToQuit.connect(session_save_on_exit)
 
+    # a restored session is journaled as soon as it is loaded. Otherwise,
+    # whatever is opened below (urls, home page, or nothing to restore) is the
+    # new session, journaled once the windows are created.
+    call_later(lambda: session_journal_new(a.profile.session_file))
+
     def create_window(url):
         w = Window()
         buff = create_buffer(url)
@@ -195,6 +156,8 @@ def init(opts):
 
     if opts.url:
         create_window(opts.url)
+        for url in reversed(opts.urls[1:]):
+            create_buffer(url)
         return
 
     always_restore = variables.get("always-restore-session")
@@ -203,7 +166,10 @@ def init(opts):
     # NOTE: This creates two windows if a url is given in opts
     if session_file and always_restore and os.path.exists(session_file):
         try:
-            session_load(session_file)
+            with startup_profile.phase("session load"):
+                session_load(session_file)
+            if not windows():
+                open_window()
             if opts.url:
                 w = current_window()
                 buff = create_buffer(opts.url)
@@ -219,7 +185,10 @@ def init(opts):
         create_window(opts.url)
     elif session_file and os.path.exists(session_file):
         try:
-            session_load(session_file)
+            with startup_profile.phase("session load"):
+                session_load(session_file)
+            if not windows():
+                open_window()
             return
         except Exception:
             logging.exception("Unable to load session from '%s'", session_file)
@@ -263,6 +232,32 @@ else:
         return imp.load_module("_webmacs_userconfig", *spec)
 
 
+def _track_startup_end(report_path):
+    """
+    Mark the end of the startup: when the event loop runs, and when the first
+    page is loaded. The report is written at both times if a path is given.
+    """
+    def write_report():
+        if report_path:
+            try:
+                startup_profile.write_report(report_path)
+            except OSError:
+                logging.exception("Unable to write the startup report")
+
+    def event_loop_started():
+        startup_profile.mark("event loop started")
+        startup_profile.stop_profiler()
+        write_report()
+
+    def first_load_finished(buffer):
+        hooks.webbuffer_load_finished.remove_if_exists(first_load_finished)
+        startup_profile.mark("first page loaded")
+        write_report()
+
+    hooks.webbuffer_load_finished.add(first_load_finished)
+    call_later(event_loop_started)
+
+
 def main():
     opts, user_opts = parse_args()
     if opts.list_instances:
@@ -287,23 +282,31 @@ def main():
     conn = IpcServer.check_server_connection(opts.instance)
 
     if conn:
-        conn.send_data(opts.__dict__)
-        data = conn.get_data()
+        if opts.daemon:
+            conn.sock.close()
+            print("webmacs instance %r is already running." % opts.instance)
+            sys.exit(1)
+        reply = conn.get_reply(conn.send_request(request_data(opts,
+                                                              user_opts)))
         conn.sock.close()
-        msg = data.get("message")
-        if msg:
-            print(msg)
+        print_reply(reply)
         return
 
+    if opts.profile_startup:
+        startup_profile.enable_profiler()
+
     # Delay loading after command line parsing and ipc checking.
     # Loading qwebengine stuff takes a couple of seconds...
-    from .application import Application, _app_requires
+    with startup_profile.phase("import application"):
+        from .application import Application, _app_requires
 
-    _app_requires()
+    with startup_profile.phase("app requires"):
+        _app_requires()
 
     # load a user init module if any
     try:
-        user_init = load_user_module(conf_path)
+        with startup_profile.phase("load user init module"):
+            user_init = load_user_module(conf_path)
     except Exception:
         _handle_user_init_error(
             conf_path,
@@ -312,40 +315,63 @@ def main():
 
     os.environ["QTWEBENGINE_DICTIONARIES_PATH"] = os.path.join(conf_path,
                                                                "spell_checking")
-    app = Application(conf_path, [
-        # The first argument passed to the QApplication args defines
-        # the x11 property WM_CLASS.
-        "webmacs" if opts.instance == "default"
-        else "webmacs-%s" % opts.instance
-    ], instance_name=opts.instance, profile_name=opts.profile,
-                      off_the_record=opts.off_the_record)
-    server = IpcServer(opts.instance)
+    # the process model variables may be set by the user init module
+    from .process_model import apply_chromium_flags
+    apply_chromium_flags()
+
+    with startup_profile.phase("application"):
+        app = Application(conf_path, [
+            # The first argument passed to the QApplication args defines
+            # the x11 property WM_CLASS.
+            "webmacs" if opts.instance == "default"
+            else "webmacs-%s" % opts.instance
+        ], instance_name=opts.instance, profile_name=opts.profile,
+                          off_the_record=opts.off_the_record)
+    with startup_profile.phase("ipc server"):
+        server = IpcServer(opts.instance)
     atexit.register(server.cleanup)
 
-    proxy.init()
+    with startup_profile.phase("proxy"):
+        proxy.init()
     atexit.register(proxy.shutdown)
 
     out_filter.enable()
 
     # execute the user init function if there is one
-    if user_init is None or not hasattr(user_init, "init"):
-        init(opts)
-    else:
-        try:
-            user_init.init(opts, user_opts)
-        except Exception:
-            _handle_user_init_error(
-                conf_path,
-                "Error executing user init function in %s."
-                % user_init.__file__
-            )
+    def run_init(opts, user_opts):
+        if user_init is None or not hasattr(user_init, "init"):
+            init(opts)
+        else:
+            try:
+                user_init.init(opts, user_opts)
+            except Exception:
+                _handle_user_init_error(
+                    conf_path,
+                    "Error executing user init function in %s."
+                    % user_init.__file__
+                )
+
+    with startup_profile.phase("init"):
+        if opts.daemon:
+            # no window, the first client request runs the init
+            from .daemon import init_daemon
+            init_daemon(opts, run_init)
+        else:
+            run_init(opts, user_opts)
 
     if log_to_disk.value > 0 and not opts.off_the_record:
         setup_logging_on_disk(os.path.join(conf_path, "logs"),
                               backup_count=log_to_disk.value)
-    app.post_init()
+    with startup_profile.phase("post init"):
+        app.post_init()
     signal_wakeup(app)
-    signal.signal(signal.SIGINT, lambda s, h: app.quit())
+    # quit cleanly (session saved, ipc socket removed) on C-c, and when
+    # stopped by a service manager.
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda s, h: app.quit())
+    _track_startup_end(
+        os.path.join(conf_path, "startup-profile.json")
+        if opts.profile_startup else None)
     sys.exit(app.exec())
 
 
@@ -108,8 +108,12 @@ def init_minibuffer_right_labels():
         buff.loadProgress.connect(load_changed)
         buff.loadFinished.connect(lambda: load_changed(None))
 
+    from ..webbuffer import BufferPlaceholder
+
     for buff in BUFFERS:
-        register_buffer_load_progress(buff)
+        # placeholders are registered once replaced by a real buffer
+        if not isinstance(buff, BufferPlaceholder):
+            register_buffer_load_progress(buff)
 
     hooks.webbuffer_created.add(register_buffer_load_progress)
     hooks.webbuffer_current_changed.add(update_label_for_buffer)
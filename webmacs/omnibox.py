@@ -0,0 +1,282 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+import heapq
+import logging
+from collections import namedtuple
+
+from PyQt6.QtCore import QObject, QModelIndex, \
+    pyqtSignal as Signal, pyqtSlot as Slot
+
+from .minibuffer.prompt import PromptTableModel
+from . import variables, call_later, BUFFERS
+
+
+OMNIBOX_SOURCES = {}
+
+
+omnibox_sources = variables.define_variable(
+    "omnibox-sources",
+    "List of completion sources queried by the go-to prompt, when no"
+    " webjump is active. Available sources are webjumps, bookmarks,"
+    " buffers, history and suggestions (completions of the default"
+    " webjump).",
+    ("webjumps", "bookmarks", "buffers", "history", "suggestions"),
+    type=variables.List(variables.String()),
+)
+
+omnibox_max_results = variables.define_variable(
+    "omnibox-max-results",
+    "Maximum number of completions displayed by the go-to prompt.",
+    50,
+    type=variables.Int(min=1),
+)
+
+
+# A completion candidate. The text is what ends up in the minibuffer input
+# when the candidate is chosen, the doc is displayed next to it.
+Candidate = namedtuple("Candidate", ("score", "text", "doc", "source"))
+
+
+def match_score(query, text, doc=""):
+    """
+    Score how well a text (and its doc) matches the query.
+
+    Every word of the query must be found, else 0 is returned. Prefix
+    matches on the text are preferred over inner matches, which are
+    preferred over matches in the doc. Shorter texts get a small bonus.
+    """
+    text_l = text.lower()
+    score = 0.0
+    if query:
+        doc_l = doc.lower() if doc else ""
+        for word in query.lower().split():
+            if text_l.startswith(word):
+                score += 4
+            elif word in text_l:
+                score += 2
+            elif word in doc_l:
+                score += 1
+            else:
+                return 0.0
+    return score + 1.0 / (1 + len(text_l))
+
+
+class TopKMerger(object):
+    """
+    Merge scored candidates as they come, keeping only the k best ones.
+
+    Candidates are deduplicated on their text, keeping the best score.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self._best = {}
+
+    def add(self, candidates):
+        best = self._best
+        for candidate in candidates:
+            other = best.get(candidate.text)
+            if other is None or candidate.score > other.score:
+                best[candidate.text] = candidate
+        if len(best) > self.k:
+            self._best = {c.text: c for c in self.results()}
+
+    def results(self):
+        """
+        Returns the k best candidates, best first.
+        """
+        return heapq.nlargest(self.k, self._best.values(),
+                              key=lambda c: c.score)
+
+
+class OmniboxSource(QObject):
+    """
+    A completion source for the omnibox.
+
+    The :meth:`complete` method is called with the current text; the signal
+    `completed` must then be emitted with that text and a list of
+    :class:`Candidate`, synchronously or not. Slow sources must not block,
+    and should implement :meth:`abort`.
+    """
+    completed = Signal(str, list)
+    name = None
+    weight = 1.0
+
+    def __init__(self, prompt):
+        QObject.__init__(self)
+        self.prompt = prompt
+
+    def complete(self, text, limit):
+        """Must be implemented by subclasses."""
+        raise NotImplementedError
+
+    def abort(self):
+        pass
+
+    def candidates(self, text, limit, entries):
+        """
+        Helper to score (text, doc) entries and return the best ones.
+        """
+        result = []
+        for entry_text, doc in entries:
+            score = match_score(text, entry_text, doc)
+            if score > 0:
+                result.append(Candidate(score * self.weight, entry_text, doc,
+                                        self.name))
+        return heapq.nlargest(limit, result, key=lambda c: c.score)
+
+
+def define_omnibox_source(source_class):
+    """
+    Register a :class:`OmniboxSource` subclass, given its name.
+    """
+    OMNIBOX_SOURCES[source_class.name] = source_class
+    return source_class
+
+
+@define_omnibox_source
+class BuffersSource(OmniboxSource):
+    name = "buffers"
+    weight = 1.2
+
+    def complete(self, text, limit):
+        self.completed.emit(text, self.candidates(
+            text, limit, ((b.url().toString(), b.title()) for b in BUFFERS)
+        ))
+
+
+@define_omnibox_source
+class BookmarksSource(OmniboxSource):
+    name = "bookmarks"
+    weight = 1.1
+
+    def complete(self, text, limit):
+        self.completed.emit(text, self.candidates(
+            text, limit, ((name, url) for url, name in self.prompt.bookmarks)
+        ))
+
+
+@define_omnibox_source
+class HistorySource(OmniboxSource):
+    """
+    Visited links, searched in a worker thread so that typing never waits for
+    the database.
+    """
+    name = "history"
+
+    def __init__(self, prompt):
+        OmniboxSource.__init__(self, prompt)
+        self._future = None
+
+    def complete(self, text, limit):
+        from .application import app
+
+        self.abort()
+        self._future = app().visitedlinks().search_in_worker(text, limit)
+        self._future.add_done_callback(
+            lambda future: self._search_done(future, text, limit))
+
+    def abort(self):
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+
+    def _search_done(self, future, text, limit):
+        if future.cancelled():
+            return
+        self._future = None
+        try:
+            entries = future.result()
+        except Exception:
+            logging.exception("Unable to search the visited links")
+            entries = []
+        self.completed.emit(text, self.candidates(text, limit, entries))
+
+
+class OmniboxModel(PromptTableModel):
+    def __init__(self, parent=None):
+        PromptTableModel.__init__(self, [], parent)
+        self._candidates = []
+
+    def columnCount(self, index=QModelIndex()):
+        return 2
+
+    def set_candidates(self, candidates):
+        self.beginResetModel()
+        self._candidates = candidates
+        self._data = [(c.text, c.doc) for c in candidates]
+        self.endResetModel()
+
+    def candidate(self, row):
+        return self._candidates[row]
+
+
+class Omnibox(QObject):
+    """
+    Query every configured source concurrently and merge their results.
+
+    The `updated` signal is emitted with the current best candidates each time
+    a source answers, so slow sources never delay the fast ones.
+    """
+    updated = Signal(list)
+
+    def __init__(self, prompt, source_names=None, limit=None):
+        QObject.__init__(self, prompt)
+        self.limit = limit or omnibox_max_results.value
+        self._sources = []
+        for name in (source_names or omnibox_sources.value):
+            try:
+                source = OMNIBOX_SOURCES[name](prompt)
+            except KeyError:
+                logging.warning("No such omnibox source: %s", name)
+                continue
+            source.setParent(self)
+            source.completed.connect(self._on_source_completed)
+            self._sources.append(source)
+        self._text = None
+        self._merger = None
+        self._update_requested = False
+
+    def complete(self, text):
+        self.abort()
+        self._text = text
+        self._merger = TopKMerger(self.limit)
+        for source in self._sources:
+            try:
+                source.complete(text, self.limit)
+            except Exception:
+                logging.exception("Error in omnibox source %s", source.name)
+
+    def abort(self):
+        self._text = None
+        for source in self._sources:
+            source.abort()
+
+    @Slot(str, list)
+    def _on_source_completed(self, text, candidates):
+        if text != self._text:
+            # stale answer
+            return
+        self._merger.add(candidates)
+        # only update once per loop iteration for the synchronous sources
+        if not self._update_requested:
+            self._update_requested = True
+            call_later(self._emit_update)
+
+    def _emit_update(self):
+        self._update_requested = False
+        if self._merger is not None and self._text is not None:
+            self.updated.emit(self._merger.results())
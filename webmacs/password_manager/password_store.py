@@ -15,7 +15,7 @@
 
 
 from . import BasePaswordManager, Credentials, PasswordManagerNotReady
-from ..task import Task
+from ..task import Task, PRIORITY_LOW
 from .. import variables
 
 from PyQt6.QtCore import QProcess
@@ -87,9 +87,13 @@ class PassCredentials:
 
 
 class ReadCredentialsTask(Task):
+    description = "reading the password store"
+    priority = PRIORITY_LOW
+
     def __init__(self):
         Task.__init__(self)
         self.__names = None
+        self.__total = 0
         # one proc at a time, otherwise authentication might fail;;
         self.__proc = None
         self.__output = b""
@@ -99,6 +103,7 @@ class ReadCredentialsTask(Task):
         self.__names = [os.path.splitext(fname)[0] for fname in
                         glob.glob("**/*.gpg", recursive=True,
                                   root_dir=pass_store_path.value)]
+        self.__total = len(self.__names)
 
         self.__process_next()
 
@@ -107,6 +112,7 @@ class ReadCredentialsTask(Task):
         if not self.__names:
             self.finished.emit()
             return
+        self.set_progress(self.__total - len(self.__names), self.__total)
 
         self.__name = name = self.__names.pop(0)
         self.__proc = QProcess()
@@ -117,10 +123,10 @@ class ReadCredentialsTask(Task):
 
     def __process_finished(self, code, status):
         if status == QProcess.ExitStatus.CrashExit:
-            self.set_error_message("The pass process crashed.")
+            self.set_error("The pass process crashed.")
             self.finished.emit()
         elif code != 0:
-            self.set_error_message(f"The pass process exited with {code}.")
+            self.set_error(f"The pass process exited with {code}.")
             self.finished.emit()
         else:
             lines = self.__output.decode("utf-8").splitlines()
@@ -0,0 +1,89 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Control how Chromium assigns the web pages to render processes.
+
+These variables are only used at startup, so they must be set in the user
+configuration file.
+"""
+
+import os
+
+from . import variables
+
+
+CHROMIUM_FLAGS_ENV = "QTWEBENGINE_CHROMIUM_FLAGS"
+
+
+renderer_process_model = variables.define_variable(
+    "renderer-process-model",
+    "How pages are assigned to render processes. default lets Chromium"
+    " decide. process-per-site uses one process for all the pages of the"
+    " same site, saving memory. process-per-site-instance uses one process"
+    " per group of connected pages of a site. Only used at startup.",
+    "default",
+    type=variables.String(choices=("default", "process-per-site",
+                                   "process-per-site-instance")),
+)
+
+renderer_process_limit = variables.define_variable(
+    "renderer-process-limit",
+    "Maximum number of render processes, pages being grouped in the existing"
+    " processes once reached. Less processes use less memory, at the cost"
+    " of isolation and responsiveness. 0 lets Chromium decide. Only used at"
+    " startup.",
+    0,
+    type=variables.Int(min=0),
+)
+
+site_isolation = variables.define_variable(
+    "site-isolation",
+    "Site isolation policy. strict puts every site in its own process (more"
+    " secure, more memory), disabled allows sites to share processes. Only"
+    " used at startup.",
+    "default",
+    type=variables.String(choices=("default", "strict", "disabled")),
+)
+
+
+def chromium_flags():
+    """
+    Returns the Chromium command line flags given by the variables.
+    """
+    flags = []
+    if renderer_process_model.value != "default":
+        flags.append("--" + renderer_process_model.value)
+    if renderer_process_limit.value:
+        flags.append("--renderer-process-limit=%d"
+                     % renderer_process_limit.value)
+    if site_isolation.value == "strict":
+        flags.append("--site-per-process")
+    elif site_isolation.value == "disabled":
+        flags.append("--disable-site-isolation-trials")
+    return flags
+
+
+def apply_chromium_flags(environ=os.environ):
+    """
+    Add the Chromium flags to the environment, must be called before the
+    application is created. Flags already in the environment are kept.
+    """
+    flags = chromium_flags()
+    if flags:
+        current = environ.get(CHROMIUM_FLAGS_ENV, "").split()
+        environ[CHROMIUM_FLAGS_ENV] = " ".join(
+            current + [f for f in flags if f not in current])
+    return environ.get(CHROMIUM_FLAGS_ENV, "")
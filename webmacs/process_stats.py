@@ -0,0 +1,128 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Cheap process statistics, read from /proc (so only available on linux).
+"""
+
+import os
+import time
+from collections import namedtuple
+
+try:
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (ValueError, AttributeError, OSError):
+    PAGE_SIZE = 4096
+
+
+def process_rss(pid, proc="/proc"):
+    """
+    Returns the resident memory of the given process in bytes, or None if it
+    can not be read.
+    """
+    try:
+        with open("%s/%d/statm" % (proc, pid), "rb") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+try:
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+except (ValueError, AttributeError, OSError):
+    CLOCK_TICKS = 100
+
+
+# rss and pss are in bytes, cpu is a percentage of one cpu since the previous
+# sample (None for the first sample). pss is None when not available.
+ProcessSample = namedtuple("ProcessSample", ("rss", "pss", "cpu"))
+
+
+def process_pss(pid, proc="/proc"):
+    """
+    Returns the proportional set size of the given process in bytes, that is
+    its memory with the shared memory divided among the processes sharing it,
+    or None if it can not be read.
+    """
+    try:
+        with open("%s/%d/smaps_rollup" % (proc, pid), "rb") as f:
+            for line in f:
+                if line.startswith(b"Pss:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def process_cpu_time(pid, proc="/proc"):
+    """
+    Returns the user and system cpu time of the given process in seconds, or
+    None if it can not be read.
+    """
+    try:
+        with open("%s/%d/stat" % (proc, pid), "rb") as f:
+            # the command name may contain spaces, skip it
+            fields = f.read().rsplit(b")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ProcessSampler(object):
+    """
+    Sample processes memory and cpu usage, the cpu usage being computed
+    between two calls of :meth:`sample`.
+    """
+
+    def __init__(self, proc="/proc"):
+        self.proc = proc
+        self._cpu_times = {}
+
+    def sample(self, pids, now=None):
+        """
+        Returns a dict of pid: :class:`ProcessSample` for the given pids,
+        ignoring the processes that can not be read.
+        """
+        if now is None:
+            now = time.monotonic()
+        samples = {}
+        cpu_times = {}
+        for pid in pids:
+            rss = process_rss(pid, self.proc)
+            if rss is None:
+                continue
+            cpu = None
+            cpu_time = process_cpu_time(pid, self.proc)
+            if cpu_time is not None:
+                cpu_times[pid] = (now, cpu_time)
+                previous = self._cpu_times.get(pid)
+                if previous and now > previous[0]:
+                    cpu = 100 * (cpu_time - previous[1]) / (now - previous[0])
+            samples[pid] = ProcessSample(rss, process_pss(pid, self.proc),
+                                         cpu)
+        self._cpu_times = cpu_times
+        return samples
+
+
+def format_size(size):
+    """
+    Format a size in bytes for humans.
+    """
+    if size < 1024:
+        return "%d B" % size
+    for unit in ("kB", "MB", "GB"):
+        size /= 1024
+        if size < 1024 or unit == "GB":
+            return "%.1f %s" % (size, unit)
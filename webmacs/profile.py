@@ -24,7 +24,8 @@ from .visited_links import VisitedLinks
 from .ignore_certificates import IgnoredCertificates
 from .bookmarks import Bookmarks
 from .features import Features
-from . import variables, version, require
+from .killed_buffers_store import KilledBuffersStore
+from . import variables, version, require, startup_profile, content_scripts
 from .password_manager import make_password_manager
 from .variables import define_variable, Bool
 
@@ -80,8 +81,8 @@ class Profile(object):
         self.path = None
         self.session_file = None
 
-        visited_links, ignored_certs, bookmarks, features = \
-            ":memory:", ":memory:", ":memory:", ":memory:"
+        visited_links, ignored_certs, bookmarks, features, killed_buffers = \
+            ":memory:", ":memory:", ":memory:", ":memory:", ":memory:"
 
         if not off_the_record:
             self.path = path = make_dir(app.profiles_path(), self.name)
@@ -104,16 +105,20 @@ class Profile(object):
             ignored_certs = os.path.join(path, "ignoredcerts.db")
             bookmarks = os.path.join(path, "bookmarks.db")
             features = os.path.join(path, "features.db")
+            killed_buffers = os.path.join(path, "killedbuffers.db")
 
-        self.visitedlinks = VisitedLinks(visited_links)
-        self.ignored_certs = IgnoredCertificates(ignored_certs)
-        self.bookmarks = Bookmarks(bookmarks)
-        self.features = Features(features)
+        with startup_profile.phase("profile databases"):
+            self.visitedlinks = VisitedLinks(visited_links)
+            self.ignored_certs = IgnoredCertificates(ignored_certs)
+            self.bookmarks = Bookmarks(bookmarks)
+            self.features = Features(features)
+            self.killed_buffers = KilledBuffersStore(killed_buffers)
 
         self.q_profile.downloadRequested.connect(
             app.download_manager().download_requested
         )
-        self.password_manager = make_password_manager()
+        with startup_profile.phase("password manager"):
+            self.password_manager = make_password_manager()
 
         self.update_spell_checking()
 
@@ -138,22 +143,11 @@ class Profile(object):
 
         inject_js(":/qtwebchannel/qwebchannel.js")
 
-        contentjs = ["WEBMACS_SECURE_ID = {};".format(str(id(self)))]
-        with open(os.path.join(THIS_DIR, "scripts", "setup.js")) as f:
-            contentjs.append(f.read())
-        with open(os.path.join(THIS_DIR, "scripts", "textedit.js")) as f:
-            contentjs.append(f.read())
-        with open(os.path.join(THIS_DIR, "scripts", "hint.js")) as f:
-            contentjs.append(f.read())
-        with open(os.path.join(THIS_DIR, "scripts", "textzoom.js")) as f:
-            contentjs.append(f.read())
-        with open(os.path.join(THIS_DIR, "scripts", "caret_browsing.js")) as f:
-            contentjs.append(f.read())
-
         script = QWebEngineScript()
         script.setInjectionPoint(
             QWebEngineScript.InjectionPoint.DocumentCreation)
-        script.setSourceCode("\n".join(contentjs))
+        script.setSourceCode(content_scripts.bootstrap_source(
+            id(self), modules=not content_scripts.frame_api()))
         script.setWorldId(QWebEngineScript.ScriptWorldId.ApplicationWorld)
         script.setRunsOnSubFrames(True)
         self.q_profile.scripts().insert(script)
@@ -193,5 +187,13 @@ class Profile(object):
     def is_off_the_record(self):
         return self.q_profile.isOffTheRecord()
 
+    def shutdown(self):
+        """
+        Write the pending data and release the databases used by the worker
+        threads, when the application quits.
+        """
+        self.killed_buffers.flush()
+        self.visitedlinks.close_reader()
+
 
 named_profile = Profile
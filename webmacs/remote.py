@@ -0,0 +1,172 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Drive a running webmacs instance from another program.
+
+Example::
+
+    from webmacs.remote import RemoteInstance
+
+    with RemoteInstance() as webmacs:
+        for buffer in webmacs.list_buffers():
+            print(buffer["url"], buffer["title"])
+        webmacs.run_command("next-buffer")
+
+        webmacs.subscribe("webbuffer_load_finished")
+        for event in webmacs.events():
+            print(event["event"], event["params"])
+
+The connection is a plain unix socket, like the one of the webmacs command
+line (see webmacs.client): no Qt application nor event loop is needed, and
+the Qt network module is not loaded.
+"""
+
+import socket
+
+from .client import sock_path, TIMEOUT
+from .ipc_protocol import MessageDecoder, ProtocolError, encode_message
+
+
+class RemoteError(Exception):
+    "Raised when a remote method call fails"
+
+
+class RemoteInstance(object):
+    """
+    A connection to a running webmacs instance.
+
+    :param instance: the name of the instance.
+    :param encoding: "json", or "binary" for a more compact encoding of the
+                     messages.
+    :param timeout: the time to wait for a reply, in seconds.
+    :raises: RemoteError if the instance is not running.
+    """
+
+    def __init__(self, instance="default", encoding="json", timeout=TIMEOUT):
+        self._sock = None
+        if not hasattr(socket, "AF_UNIX"):
+            raise RemoteError("Unix sockets are not supported")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(1)
+            sock.connect(sock_path(instance))
+        except OSError:
+            sock.close()
+            raise RemoteError("No running webmacs instance named %r"
+                              % instance)
+        self._sock = sock
+        self._timeout = timeout
+        self._decoder = MessageDecoder()
+        self._encoding = "json"
+        self._request_id = 0
+        # replies and events read while waiting for another reply
+        self._replies = {}
+        self._events = []
+        if encoding != "json":
+            # the reply is still in json
+            self.call("set-encoding", encoding=encoding)
+            self._encoding = self._decoder.encoding = encoding
+
+    def _read_pending(self, timeout):
+        msg = self._decoder.next_message()
+        try:
+            self._sock.settimeout(timeout)
+            while msg is None:
+                data = self._sock.recv(65536)
+                if not data:
+                    return False
+                self._decoder.feed(data)
+                msg = self._decoder.next_message()
+        except (OSError, ProtocolError) as exc:
+            raise RemoteError(str(exc) or exc.__class__.__name__)
+        if "event" in msg:
+            self._events.append(msg)
+        else:
+            self._replies[msg.get("id")] = msg
+        return True
+
+    def call(self, method, **params):
+        """
+        Call a method of the instance (see webmacs.ipc.IPC_METHODS) and
+        returns its result.
+        """
+        if self._sock is None:
+            raise RemoteError("Connection closed")
+        self._request_id += 1
+        request_id = self._request_id
+        try:
+            self._sock.settimeout(self._timeout)
+            self._sock.sendall(encode_message(
+                {"method": method, "params": params, "id": request_id},
+                self._encoding))
+        except OSError as exc:
+            raise RemoteError(str(exc))
+        while request_id not in self._replies:
+            if not self._read_pending(self._timeout):
+                raise RemoteError("Connection closed")
+        reply = self._replies.pop(request_id)
+        if "error" in reply:
+            raise RemoteError(reply["error"])
+        return reply["result"]
+
+    def open_urls(self, urls, target="new-buffer"):
+        return self.call("open-urls", urls=list(urls), target=target)
+
+    def run_command(self, name):
+        return self.call("run-command", name=name)
+
+    def list_commands(self):
+        return self.call("list-commands")
+
+    def list_buffers(self):
+        return self.call("list-buffers")
+
+    def get_variable(self, name):
+        return self.call("get-variable", name=name)
+
+    def set_variable(self, name, value):
+        return self.call("set-variable", name=name, value=value)
+
+    def subscribe(self, *hooks):
+        """
+        Subscribe to hooks (like "webbuffer_created"), see :meth:`events`.
+        """
+        return self.call("subscribe", hooks=hooks)
+
+    def unsubscribe(self, *hooks):
+        return self.call("unsubscribe", hooks=hooks)
+
+    def events(self):
+        """
+        Iterate over the events of the subscribed hooks, until the connection
+        is closed.
+        """
+        while True:
+            while self._events:
+                yield self._events.pop(0)
+            if self._sock is None or not self._read_pending(None):
+                return
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -16,19 +16,22 @@
 import os
 import sys
 import re
+import time
+import logging
 import importlib
 import inspect
 from itertools import groupby
 from PyQt6.QtCore import QBuffer, QFile, QUrlQuery
 from PyQt6.QtWebEngineCore import QWebEngineUrlSchemeHandler
 from jinja2 import Environment, PackageLoader
-from ... import version, COMMANDS
+from ... import version, COMMANDS, BUFFERS, call_later, startup_profile
 from ...variables import VARIABLES
 from ...keymaps import KEYMAPS
 
 
 PAGES = []
 _REQUESTS_HANDLER = []
+_PAGE_ACTIONS = {}
 THIS_DIR = os.path.dirname(os.path.realpath(__file__))
 
 
@@ -49,6 +52,57 @@ def register_page(match_url=None, visible=True):
     return wrapper
 
 
+def register_page_action(name):
+    """
+    Register an action of the webmacs:// pages, run with the ids of the
+    selected items when a form having a data-webmacs-action attribute is
+    submitted (see scripts/setup.js).
+    """
+    def wrapper(fn):
+        _PAGE_ACTIONS[name] = fn
+        return fn
+    return wrapper
+
+
+def run_page_action(buffer, name, ids):
+    """
+    Run a page action requested by the webmacs:// page of the given buffer,
+    then reload the page.
+    """
+    action = _PAGE_ACTIONS.get(name)
+    if action is None:
+        logging.warning("Unknown webmacs page action: %s", name)
+        return
+    ids = set(str(i) for i in ids)
+
+    def run():
+        action(ids)
+        # the buffer of this page may have been closed
+        if buffer in BUFFERS:
+            buffer.reload()
+
+    # not in the web channel call, as it may close its buffer
+    call_later(run)
+
+
+@register_page_action("close-buffers")
+def close_buffers(ids):
+    from ...webbuffer import close_buffer
+
+    for buff in [b for b in BUFFERS if str(id(b)) in ids]:
+        close_buffer(buff)
+
+
+@register_page_action("cancel-tasks")
+def cancel_tasks(ids):
+    from ...application import app
+
+    runner = app().task_runner
+    for task in list(runner.running_tasks) + runner.pending_tasks():
+        if str(id(task)) in ids:
+            runner.cancel(task)
+
+
 class WebmacsSchemeHandler(QWebEngineUrlSchemeHandler):
     scheme = b"webmacs"
 
@@ -102,6 +156,127 @@ class WebmacsSchemeHandler(QWebEngineUrlSchemeHandler):
     def downloads(self, job, _, name):
         self.reply_template(job, name, {})
 
+    @register_page(match_url=r"^buffers(?:\?.*)?$")
+    def buffers(self, job, url):
+        from ...webbuffer import WebBuffer
+        from ...buffer_stats import buffer_sample
+        from ...process_stats import format_size
+
+        sort = QUrlQuery(url).queryItemValue("sort") or "index"
+
+        rows = []
+        for index, buff in enumerate(BUFFERS, 1):
+            sample = buffer_sample(buff)
+            memory = None
+            if sample:
+                memory = sample.pss if sample.pss is not None else sample.rss
+            rows.append({
+                "id": id(buff),
+                "index": index,
+                "title": buff.title(),
+                "url": buff.url().toString(),
+                "state": (buff.lifecycleState().name.lower()
+                          if isinstance(buff, WebBuffer) else "not loaded"),
+                "pid": (buff.renderProcessPid()
+                        if isinstance(buff, WebBuffer) else 0),
+                "last_use": buff.last_use,
+                "memory": memory or 0,
+                "memory_text": format_size(memory) if memory else "",
+                "cpu": (sample and sample.cpu) or 0,
+                "cpu_text": "%.1f%%" % sample.cpu
+                if sample and sample.cpu is not None else "",
+            })
+
+        columns = (("index", "#"), ("title", "title"), ("url", "url"),
+                   ("state", "state"), ("pid", "pid"), ("memory", "memory"),
+                   ("cpu", "cpu"))
+        if sort not in dict(columns) and sort != "last_use":
+            sort = "index"
+        # most expensive first
+        rows.sort(key=lambda r: r[sort],
+                  reverse=sort in ("memory", "cpu", "last_use"))
+
+        self.reply_template(job, "buffers", {
+            "buffers": rows,
+            "columns": columns,
+            "sort": sort,
+        })
+
+    @register_page()
+    def processes(self, job, _, name):
+        from ...webbuffer import WebBuffer
+        from ...buffer_stats import buffer_sample
+        from ...process_model import CHROMIUM_FLAGS_ENV
+        from ...process_stats import format_size
+
+        processes = {}
+        for index, buff in enumerate(BUFFERS, 1):
+            if isinstance(buff, WebBuffer):
+                pid = buff.renderProcessPid()
+                if pid:
+                    processes.setdefault(pid, []).append((index, buff))
+
+        rows = []
+        for pid, buffers in processes.items():
+            sample = buffer_sample(buffers[0][1])
+            memory = 0
+            if sample:
+                memory = sample.pss if sample.pss is not None else sample.rss
+            rows.append({
+                "pid": pid,
+                "memory": memory,
+                "memory_text": format_size(memory) if memory else "",
+                "cpu_text": "%.1f%%" % sample.cpu
+                if sample and sample.cpu is not None else "",
+                "buffers": [(i, b.title(), b.url().toString())
+                            for i, b in buffers],
+            })
+        rows.sort(key=lambda r: r["memory"], reverse=True)
+
+        total = sum(r["memory"] for r in rows)
+        self.reply_template(job, name, {
+            "processes": rows,
+            "total_memory": format_size(total) if total else "",
+            "buffer_count": len(BUFFERS),
+            "flags": os.environ.get(CHROMIUM_FLAGS_ENV, ""),
+        })
+
+    @register_page()
+    def startup(self, job, _, name):
+        report = startup_profile.report()
+        self.reply_template(job, name, {
+            "report": report,
+            "scale": report["total"] or 1,
+        })
+
+    @register_page(match_url=r"^tasks(?:\?.*)?$")
+    def tasks(self, job, url):
+        from ...application import app
+
+        runner = app().task_runner
+
+        now = time.time()
+
+        def row(task, since):
+            progress = task.progress()
+            return {
+                "id": id(task),
+                "description": str(task),
+                "priority": task.priority,
+                "elapsed": now - since,
+                "progress": progress,
+            }
+
+        self.reply_template(job, "tasks", {
+            "running": sorted((row(t, t.started_at)
+                               for t in runner.running_tasks),
+                              key=lambda r: -r["elapsed"]),
+            "pending": [row(t, t.queued_at) for t in runner.pending_tasks()],
+            "finished": [dict(t, ago=now - t["finished_at"])
+                         for t in runner.finished_tasks],
+            "max_running": runner.max_running,
+        })
+
     @register_page()
     def commands(self, job, _, name):
         self.reply_template(job, name, {"commands": COMMANDS})
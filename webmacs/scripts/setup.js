@@ -68,6 +68,55 @@ function post_webmacs_message(name, args) {
     }
 }
 
+// content script modules, by name: the function initializing the module in
+// this frame and returning its exported values, or true once initialized.
+let CONTENT_MODULES = {};
+
+/*
+  Define a content script module, only initialized the first time a command
+  needs it (see webmacs/content_scripts.py). A module already defined is
+  kept.
+
+  name: the module name.
+  init: a function running the module code, and returning the values to make
+        global, so that the code run later in the frame can use them.
+*/
+function webmacs_define_module(name, init) {
+    if (CONTENT_MODULES[name] === undefined) {
+        CONTENT_MODULES[name] = init;
+    }
+}
+
+/*
+  Initialize a content script module defined in this frame, if it is not
+  already. Only the module name is sent to the sub frames: the code always
+  comes from the injected scripts, never from a message.
+
+  name: the module name.
+  sub_frames: if true, the module is also initialized in the sub frames.
+*/
+function webmacs_load_module(name, sub_frames) {
+    let init = CONTENT_MODULES[name];
+    if (typeof(init) !== "function") {
+        // unknown, or already initialized
+        return;
+    }
+    CONTENT_MODULES[name] = true;
+    let exports = init();
+    for (let exported in exports) {
+        window[exported] = exports[exported];
+    }
+
+    if (sub_frames) {
+        for (let i=0; i<window.frames.length; i++) {
+            post_message(window.frames[i], "webmacs_load_module", name);
+        }
+    }
+}
+
+register_message_handler("webmacs_load_module",
+                         name => webmacs_load_module(name, true));
+
 function isTextInput(node) {
     return node.isContentEditable
         || node.nodeName == "INPUT" || node.nodeName == "TEXTAREA";
@@ -137,3 +186,28 @@ if (self === top) {
 
     registerWebChannel();
 }
+
+/*
+  The forms of the webmacs:// pages run their actions (e.g. closing buffers)
+  through the web channel, not with a url query: a link or another page can
+  not run them. Such a form has a data-webmacs-action attribute, and the
+  values of its checked boxes are sent.
+*/
+if (self === top && location.protocol === "webmacs:") {
+    document.addEventListener("submit", function(e) {
+        let form = e.target;
+        let action = form.dataset.webmacsAction;
+        if (!action) {
+            return;
+        }
+        e.preventDefault();
+        if (!e.isTrusted) {
+            return;
+        }
+        let values = Array.from(
+            form.querySelectorAll("input[type=checkbox]:checked"),
+            input => input.value);
+        post_webmacs_message("pageAction",
+                             [action, JSON.stringify(values)]);
+    }, true);
+}
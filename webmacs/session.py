@@ -15,19 +15,45 @@
 
 import json
 import logging
-import shutil
 import sys
 
-from . import BUFFERS, windows, current_window
-from .webbuffer import create_buffer, QUrl, DelayedLoadingUrl, close_buffer
+from PyQt6.QtCore import QObject, QTimer, QEvent
+
+from . import BUFFERS, windows, current_window, hooks, variables
+from .webbuffer import BufferPlaceholder, QUrl, DelayedLoadingUrl, \
+    close_buffer
 from .window import Window
+from .session_journal import SessionJournal, journal_path, \
+    pending_journal_path, read_events, read_history, replay, write_snapshot, \
+    remove_journal, windows_to_ids, windows_from_ids
 
 
 FORMAT_VERSION = 2
 
 
-def _session_load(stream):
-    data = json.load(stream)
+session_journal = variables.define_variable(
+    "session-journal",
+    "Record the session changes in a journal as they happen, so the session"
+    " survives a crash. The journal starts once the session has been"
+    " restored, or once the windows of a new session are opened.",
+    True,
+    type=variables.Bool(),
+)
+
+session_journal_compact_interval = variables.define_variable(
+    "session-journal-compact-interval",
+    "Interval in seconds between two compactions of the session journal"
+    " into the session file. Compactions are done in the background.",
+    60,
+    type=variables.Int(min=1),
+)
+
+
+# the active session recorder, if any
+RECORDER = None
+
+
+def _session_load(data):
     version = data.get("version", 0)
     urls = data["urls"]
     if version < 2:
@@ -36,14 +62,15 @@ def _session_load(stream):
     # apply the session config
 
     # now, load urls in buffers
+    restored = {}
     for url in urls:
         # new format, url must be a dict
-        buff = create_buffer(DelayedLoadingUrl(
+        buff = BufferPlaceholder(DelayedLoadingUrl(
             url=QUrl(url["url"]),
-            title=url["title"]
-        ))
-        if version >= 2:
-            buff.last_use = url["last_use"]
+            title=url["title"],
+            history=url.get("history"),
+        ), last_use=url["last_use"] if version >= 2 else None)
+        restored[buff] = url
 
     def create_window(wdata):
         win = Window()
@@ -55,32 +82,346 @@ def _session_load(stream):
         if i != current_index:
             create_window(wdata)
 
-    # create the current last, so it has focus and is on top
-    create_window(data["windows"][current_index])
+    # create the current last, so it has focus and is on top. There is no
+    # window in a session saved by a daemon with all its windows closed.
+    if data["windows"]:
+        create_window(data["windows"][current_index])
+    return restored
+
 
+def _current_window_index():
+    try:
+        return windows().index(current_window())
+    except Exception:
+        return 0
 
-def _session_save(stream):
+
+def _session_data():
     win_state = [w.dump_state() for w in windows()]
     urls = [{
         "url": b.url().toString(),
         "title": b.title(),
         "last_use": b.last_use,
+        "history": b.history_blob(),
     } for b in BUFFERS]
 
-    try:
-        win_index = windows().index(current_window())
-    except Exception:
-        if current_window() is None:
-            win_index = 0
-    json.dump({
+    return {
         "version": FORMAT_VERSION,
         "urls": urls,
         "windows": win_state,
-        "current-window": win_index,
-    }, stream)
+        "current-window": _current_window_index(),
+    }
+
+
+def _session_read(path, session_file):
+    """
+    Read the session snapshot in path, then replay the journal of the
+    session file on it.
+    """
+    events = read_events(pending_journal_path(session_file)) \
+        + read_events(journal_path(session_file))
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        if not events:
+            raise
+        # crashed before the first compaction
+        data = {"version": FORMAT_VERSION, "urls": [], "windows": []}
+    read_history(path, data)
+    if data.get("version", 0) >= 2:
+        replay(data, events)
+    return data
+
+
+class SessionRecorder(QObject):
+    """
+    Record the session changes in a :class:`SessionJournal`.
+
+    Buffers are identified in the journal by ids, that are stored in the
+    session file. Changes are signaled by the hooks and the buffers, and the
+    session entries are kept up to date as they are recorded, so a snapshot
+    of the session does not have to query every buffer and window.
+
+    :param session_file: the session file.
+    :param data: the session data that was loaded.
+    :param restored: a dict of the restored buffers to their session entry.
+    """
+
+    # the window layouts are recorded at most once per second
+    WINDOWS_DELAY = 1000
+
+    def __init__(self, session_file, data=None, restored=None):
+        QObject.__init__(self)
+        data = data or {}
+        restored = restored or {}
+        self.journal = SessionJournal(session_file, self.snapshot,
+                                      data.get("seq", 0))
+        self._ids = {}
+        self._entries = {}
+        self._created = []
+        self._changed = set()
+        self._used = set()
+        self._stale_history = set()
+        self._windows = None
+        self._next_id = 1 + max((e.get("id") or 0 for e in restored.values()),
+                                default=0)
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.timeout.connect(self.flush)
+        self._windows_timer = QTimer(self)
+        self._windows_timer.setSingleShot(True)
+        self._windows_timer.timeout.connect(self._record_windows)
+        self._compact_timer = QTimer(self)
+        self._compact_timer.timeout.connect(self.journal.compact)
+        self._compact_timer.start(
+            session_journal_compact_interval.value * 1000)
+
+        for buff in BUFFERS:
+            entry = restored.get(buff)
+            if entry and entry.get("id") is not None:
+                self._ids[buff] = entry["id"]
+                self._entries[buff] = {
+                    "id": entry["id"],
+                    "url": entry["url"],
+                    "title": entry["title"],
+                    "last_use": buff.last_use,
+                    "history": entry.get("history"),
+                }
+                self._watch(buff)
+            else:
+                self._on_created(buff)
+        for window in windows():
+            window.installEventFilter(self)
+
+        hooks.webbuffer_created.add(self._on_created)
+        hooks.webbuffer_replaced.add(self._on_replaced)
+        hooks.webbuffer_closed.add(self._on_closed)
+        hooks.webbuffer_moved.add(self._on_moved)
+        hooks.webbuffer_load_finished.add(self._on_changed)
+        hooks.webbuffer_shown.add(self._on_shown)
+        hooks.webbuffer_hidden.add(self._on_layout_changed)
+        hooks.webbuffer_current_changed.add(self._on_layout_changed)
+        hooks.window_created.add(self._on_window_created)
+        hooks.window_activated.add(self._on_layout_changed)
+        hooks.window_closed.add(self._on_layout_changed)
+
+        self.journal.compact(force=True)
+
+    def _watch(self, buff):
+        if isinstance(buff, BufferPlaceholder):
+            # never changes, it is replaced instead
+            return
+        buff.urlChanged.connect(lambda: self._on_changed(buff))
+        buff.titleChanged.connect(lambda: self._on_changed(buff))
+
+    def _after(self, buff):
+        index = BUFFERS.index(buff)
+        return self._ids[BUFFERS[index - 1]] if index > 0 else None
+
+    def _schedule_flush(self):
+        if not self._flush_timer.isActive():
+            self._flush_timer.start(0)
+
+    def eventFilter(self, window, event):
+        if event.type() in (QEvent.Type.Move, QEvent.Type.Resize,
+                            QEvent.Type.WindowStateChange):
+            self._on_layout_changed()
+        return False
+
+    def _on_layout_changed(self, *args):
+        if not self._windows_timer.isActive():
+            self._windows_timer.start(self.WINDOWS_DELAY)
+
+    def _on_window_created(self, window):
+        window.installEventFilter(self)
+        self._on_layout_changed()
+
+    def _on_created(self, buff):
+        if buff in self._ids:
+            # a replaced placeholder
+            return
+        # url and title are not known yet, so it is recorded on the next flush
+        self._ids[buff] = self._next_id
+        self._next_id += 1
+        self._created.append(buff)
+        self._watch(buff)
+        self._schedule_flush()
+
+    def _on_replaced(self, placeholder, buff):
+        if placeholder not in self._ids:
+            # unknown, so the buffer is recorded as created
+            return
+        self._ids[buff] = self._ids.pop(placeholder)
+        if placeholder in self._created:
+            self._created[self._created.index(placeholder)] = buff
+        if placeholder in self._entries:
+            self._entries[buff] = self._entries.pop(placeholder)
+        for pending in (self._changed, self._used, self._stale_history):
+            if placeholder in pending:
+                pending.discard(placeholder)
+                pending.add(buff)
+        self._watch(buff)
+
+    def _on_changed(self, buff):
+        if buff in self._ids:
+            self._changed.add(buff)
+            self._schedule_flush()
+
+    def _on_shown(self, buff):
+        # its last use is updated once it is displayed
+        if buff in self._ids:
+            self._used.add(buff)
+            self._schedule_flush()
+        self._on_layout_changed()
+
+    def _on_closed(self, buff):
+        if buff in self._created:
+            self._created.remove(buff)
+        else:
+            self.flush()
+            self.journal.record("close", id=self._ids[buff])
+        for pending in (self._changed, self._used, self._stale_history):
+            pending.discard(buff)
+        self._entries.pop(buff, None)
+        del self._ids[buff]
+
+    def _on_moved(self, buff):
+        self.flush()
+        self.journal.record("move", id=self._ids[buff],
+                            after=self._after(buff))
+
+    def flush(self):
+        """
+        Record the pending buffer creations and changes.
+        """
+        record = self.journal.record
+        # in order, so a buffer is always positioned after a known one
+        for buff in sorted(self._created, key=BUFFERS.index):
+            entry = {
+                "id": self._ids[buff],
+                "url": buff.url().toString(),
+                "title": buff.title(),
+                "last_use": buff.last_use,
+                "history": None,
+            }
+            record("create", id=entry["id"], after=self._after(buff),
+                   url=entry["url"], title=entry["title"],
+                   last_use=entry["last_use"])
+            self._entries[buff] = entry
+            self._stale_history.add(buff)
+        self._created = []
+
+        for buff in self._changed:
+            entry = self._entries[buff]
+            url, title = buff.url().toString(), buff.title()
+            if (entry["url"], entry["title"]) != (url, title):
+                record("update", id=entry["id"], url=url, title=title)
+                entry.update(url=url, title=title)
+            # the history is serialized when a snapshot is taken
+            self._stale_history.add(buff)
+        self._changed.clear()
+
+        for buff in self._used:
+            entry = self._entries[buff]
+            if entry["last_use"] != buff.last_use:
+                record("use", id=entry["id"], last_use=buff.last_use)
+                entry["last_use"] = buff.last_use
+        self._used.clear()
+
+    def _record_windows(self):
+        self._windows_timer.stop()
+        ids = [self._ids.get(b) for b in BUFFERS]
+        state = {
+            "windows": windows_to_ids([w.dump_state() for w in windows()],
+                                      ids),
+            "current-window": _current_window_index(),
+        }
+        if state != self._windows:
+            self.journal.record("windows", **state)
+            self._windows = state
+
+    def snapshot(self):
+        self.flush()
+        if self._windows is None or self._windows_timer.isActive():
+            self._record_windows()
+        for buff in self._stale_history:
+            self._entries[buff]["history"] = buff.history_blob()
+        self._stale_history.clear()
+        # copied, the snapshot is written in another thread
+        return {
+            "version": FORMAT_VERSION,
+            "urls": [dict(self._entries[b]) for b in BUFFERS],
+            "windows": windows_from_ids(self._windows["windows"],
+                                        [self._ids[b] for b in BUFFERS]),
+            "current-window": self._windows["current-window"],
+        }
+
+    def stop(self, remove=True):
+        """
+        Stop recording, waiting for a running compaction.
+        """
+        hooks.webbuffer_created.remove_if_exists(self._on_created)
+        hooks.webbuffer_replaced.remove_if_exists(self._on_replaced)
+        hooks.webbuffer_closed.remove_if_exists(self._on_closed)
+        hooks.webbuffer_moved.remove_if_exists(self._on_moved)
+        hooks.webbuffer_load_finished.remove_if_exists(self._on_changed)
+        hooks.webbuffer_shown.remove_if_exists(self._on_shown)
+        hooks.webbuffer_hidden.remove_if_exists(self._on_layout_changed)
+        hooks.webbuffer_current_changed.remove_if_exists(
+            self._on_layout_changed)
+        hooks.window_created.remove_if_exists(self._on_window_created)
+        hooks.window_activated.remove_if_exists(self._on_layout_changed)
+        hooks.window_closed.remove_if_exists(self._on_layout_changed)
+        for window in windows():
+            window.removeEventFilter(self)
+        self._ids.clear()
+        self._entries.clear()
+        self._flush_timer.stop()
+        self._windows_timer.stop()
+        self._compact_timer.stop()
+        self.journal.close(remove=remove)
+
+
+def session_journal_start(session_file, data=None, restored=None):
+    """
+    Start recording the session changes in the journal, if enabled.
+    """
+    global RECORDER
+    if session_file is None or not session_journal.value:
+        return
+    if RECORDER is not None:
+        RECORDER.stop()
+    try:
+        RECORDER = SessionRecorder(session_file, data, restored)
+    except Exception:
+        logging.exception("Unable to start the session journal for %s",
+                          session_file)
+
+
+def session_journal_new(session_file):
+    """
+    Start recording the session changes in the journal, if the session was
+    not restored. The saved session is replaced by the new one, as
+    :func:`session_save` would do on exit.
+    """
+    if session_file is None or RECORDER is not None:
+        return
+    remove_journal(session_file)
+    session_journal_start(session_file)
+
+
+def session_journal_stop(remove=True):
+    global RECORDER
+    if RECORDER is not None:
+        RECORDER.stop(remove=remove)
+        RECORDER = None
 
 
 def session_clean():
+    # keep the journal, it is the session being cleaned
+    session_journal_stop(remove=False)
     # clean every opened buffers and windows
     for window in windows():
         window.quit_if_last_closed = False
@@ -102,33 +443,43 @@ def session_load(session_file):
     if session_file is None:
         return
     try:
-        with open(session_file) as f:
-            _session_load(f)
+        data = _session_read(session_file, session_file)
+        restored = _session_load(data)
     except Exception:
         logging.warning("Unable to load the session from %s. Trying backup",
                         session_file)
+        backup_file = session_file + ".backup"
         try:
-            session_file = session_file + ".backup"
-            with open(session_file) as f:
-                _session_load(f)
+            data = _session_read(backup_file, session_file)
+            restored = _session_load(data)
         except Exception:
             logging.exception("Unable to load the session from backup file %s.",
-                              session_file)
+                              backup_file)
             y_n = None
             while y_n not in {"y", "n"}:
                 y_n = input("Could not load from backup. Create new session? (y/n)")
             if y_n == "y":
                 session_clean()
+                data, restored = None, None
             else:
                 sys.exit(1)
+    session_journal_start(session_file, data, restored)
 
 
 def session_save(session_file):
-    if session_file is None:
-        return
     """
     Save the session for the given profile.
     """
-    shutil.copy(session_file, session_file + ".backup")
-    with open(session_file, "w") as f:
-        _session_save(f)
+    if session_file is None:
+        return
+    recorder = RECORDER
+    if recorder is not None:
+        data = recorder.snapshot()
+        data["seq"] = recorder.journal.seq
+        session_journal_stop(remove=False)
+    else:
+        data = _session_data()
+    write_snapshot(session_file, data)
+    # the snapshot is complete, and a journal left from a previous run would
+    # be outdated anyway
+    remove_journal(session_file)
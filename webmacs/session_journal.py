@@ -0,0 +1,318 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Append-only journal of the session changes.
+
+Every change (buffer created, closed, navigated, moved or used, window layout
+changed) is appended as a json line to a journal file next to the session
+file. Periodically, the journal is compacted: the session is written as a
+snapshot in a worker thread and atomically renamed, then the journal is
+dropped. Loading a session is loading the snapshot then replaying the journal.
+
+Each event has a sequence number, and the snapshot stores the last sequence
+number it includes, so replaying an event twice is harmless.
+
+The compressed navigation histories of the buffers are stored in a sidecar
+file, referenced from the snapshot.
+"""
+
+import os
+import json
+import uuid
+import logging
+
+from .task import run_in_worker
+
+
+def journal_path(session_file):
+    return session_file + ".journal"
+
+
+def pending_journal_path(session_file):
+    # the journal being compacted
+    return session_file + ".journal.old"
+
+
+def read_events(path):
+    """
+    Read the events of a journal file, ignoring a truncated last line.
+    """
+    events = []
+    try:
+        f = open(path)
+    except FileNotFoundError:
+        return events
+    with f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                logging.warning("Ignoring corrupted session journal line"
+                                " in %s", path)
+    return events
+
+
+def _map_layout_buffers(layout, fn):
+    if "views" in layout:
+        return dict(layout, views=[_map_layout_buffers(v, fn)
+                                   for v in layout["views"]])
+    return dict(layout, buffer=fn(layout["buffer"]))
+
+
+def windows_to_ids(windows, ids):
+    """
+    Returns windows states referencing buffers by journal id instead of
+    their position.
+    """
+    return [dict(w, **{"view-layout": _map_layout_buffers(
+        w["view-layout"], lambda index: ids[index])}) for w in windows]
+
+
+def windows_from_ids(windows, ids):
+    positions = {id: i for i, id in enumerate(ids)}
+    return [dict(w, **{"view-layout": _map_layout_buffers(
+        w["view-layout"], lambda id: positions.get(id, 0))}) for w in windows]
+
+
+def replay(data, events):
+    """
+    Apply journal events on session data, as given by the session snapshot.
+    """
+    seq = data.get("seq", 0)
+    urls = data.setdefault("urls", [])
+    windows = None
+
+    def position(id):
+        for i, url in enumerate(urls):
+            if url.get("id") == id:
+                return i
+        raise KeyError(id)
+
+    def after(id):
+        # buffers are positioned after another one (None for the first)
+        # rather than by index, so buffers not known yet do not matter.
+        return 0 if id is None else position(id) + 1
+
+    for event in events:
+        if event["seq"] <= seq:
+            continue
+        seq = event["seq"]
+        op = event["op"]
+        try:
+            if op == "create":
+                urls.insert(after(event["after"]), {
+                    "id": event["id"],
+                    "url": event["url"],
+                    "title": event["title"],
+                    "last_use": event["last_use"],
+                })
+            elif op == "close":
+                del urls[position(event["id"])]
+            elif op == "update":
+                url = urls[position(event["id"])]
+                url.update(url=event["url"], title=event["title"])
+                # the history is outdated
+                url.pop("history", None)
+            elif op == "use":
+                urls[position(event["id"])]["last_use"] = event["last_use"]
+            elif op == "move":
+                url = urls.pop(position(event["id"]))
+                urls.insert(after(event["after"]), url)
+            elif op == "windows":
+                windows = event
+            else:
+                logging.warning("Unknown session journal event: %s", op)
+        except (KeyError, IndexError):
+            logging.warning("Unable to replay session journal event %r",
+                            event)
+
+    if windows is not None:
+        data["windows"] = windows_from_ids(windows["windows"],
+                                           [url.get("id") for url in urls])
+        data["current-window"] = windows["current-window"]
+    data["seq"] = seq
+    return data
+
+
+def _history_prefix(session_file):
+    return os.path.basename(session_file) + ".history-"
+
+
+def _write_history(session_file, data):
+    """
+    Write the history blobs of the session data in a new sidecar file, and
+    returns the session data referencing them by (offset, size).
+    """
+    urls = []
+    name = _history_prefix(session_file) + uuid.uuid4().hex
+    path = os.path.join(os.path.dirname(session_file), name)
+    offset = 0
+    with open(path, "wb") as f:
+        for url in data["urls"]:
+            url = dict(url)
+            blob = url.pop("history", None)
+            if blob:
+                f.write(blob)
+                url["history"] = (offset, len(blob))
+                offset += len(blob)
+            urls.append(url)
+        f.flush()
+        os.fsync(f.fileno())
+    return dict(data, urls=urls, **{"history-file": name})
+
+
+def _clean_history(session_file, keep=2):
+    # keep the sidecars of the snapshot and its backup, the most recent ones
+    dirname = os.path.dirname(session_file) or "."
+    prefix = _history_prefix(session_file)
+    paths = [os.path.join(dirname, name) for name in os.listdir(dirname)
+             if name.startswith(prefix)]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        os.unlink(path)
+
+
+def read_history(path, data):
+    """
+    Replace the history references of session data read from path by the
+    history blobs of its sidecar file. History is dropped if the sidecar is
+    not readable.
+    """
+    name = data.pop("history-file", None)
+    blobs = b""
+    if name:
+        try:
+            with open(os.path.join(os.path.dirname(path), name), "rb") as f:
+                blobs = f.read()
+        except OSError:
+            logging.warning("Unable to read the session history file %s",
+                            name)
+    for url in data["urls"]:
+        ref = url.pop("history", None)
+        if ref and blobs:
+            offset, size = ref
+            url["history"] = blobs[offset:offset + size]
+    return data
+
+
+def write_snapshot(session_file, data):
+    """
+    Atomically write the session data, keeping the previous one as a backup.
+    """
+    data = _write_history(session_file, data)
+    tmp = session_file + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    if os.path.exists(session_file):
+        os.replace(session_file, session_file + ".backup")
+    os.replace(tmp, session_file)
+    _clean_history(session_file)
+
+
+class SessionJournal(object):
+    """
+    Record session events in the journal and compact it.
+
+    :param session_file: the session file path.
+    :param snapshot_fn: a function returning the current session data, called
+        in the main thread.
+    :param seq: the last sequence number of the loaded session.
+    """
+
+    def __init__(self, session_file, snapshot_fn, seq=0):
+        self.session_file = session_file
+        self.path = journal_path(session_file)
+        self.pending_path = pending_journal_path(session_file)
+        self._snapshot_fn = snapshot_fn
+        self._seq = seq
+        self._dirty = False
+        # the running compaction
+        self._future = None
+        self._file = open(self.path, "a")
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def record(self, op, **kwargs):
+        self._seq += 1
+        kwargs["op"] = op
+        kwargs["seq"] = self._seq
+        self._file.write(json.dumps(kwargs) + "\n")
+        # no fsync, this is enough to survive a crash of the process.
+        self._file.flush()
+        self._dirty = True
+
+    def _rotate(self):
+        self._file.close()
+        if os.path.exists(self.pending_path):
+            # a previous compaction did not finish: keep its events.
+            with open(self.path) as src, open(self.pending_path, "a") as dst:
+                dst.write(src.read())
+            os.unlink(self.path)
+        else:
+            os.replace(self.path, self.pending_path)
+        self._file = open(self.path, "a")
+
+    def _write(self, data):
+        try:
+            write_snapshot(self.session_file, data)
+            os.unlink(self.pending_path)
+        except Exception:
+            logging.exception("Unable to compact the session journal %s",
+                              self.path)
+
+    def compact(self, force=False):
+        """
+        Write a snapshot of the session in the background, if anything
+        changed since the last one.
+        """
+        if not (self._dirty or force):
+            return
+        if self._future is not None and not self._future.done():
+            # a compaction is still running
+            return
+        data = self._snapshot_fn()
+        data["seq"] = self._seq
+        self._rotate()
+        self._dirty = False
+        self._future = run_in_worker(self._write, data)
+
+    def close(self, remove=True):
+        """
+        Wait for any running compaction and stop journaling.
+
+        :param remove: if True, the journal files are removed. The session
+            must then be saved by the caller.
+        """
+        if self._future is not None:
+            # a compaction cancelled by the shutdown of the workers leaves its
+            # journal pending, it is replayed on the next start.
+            self._future.wait()
+        self._file.close()
+        if remove:
+            remove_journal(self.session_file)
+
+
+def remove_journal(session_file):
+    for path in (journal_path(session_file),
+                 pending_journal_path(session_file)):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
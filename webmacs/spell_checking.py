@@ -14,23 +14,31 @@
 # along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
 
 from . import variables
-from .task import Task
+from .task import Task, PRIORITY_LOW
 
 from PyQt6.QtNetwork import QNetworkRequest, QNetworkReply
 from PyQt6.QtCore import QUrl
 
 import os
 import re
+import time
 import json
 import logging
-import base64
-from collections import namedtuple
+import binascii
+import tempfile
+from collections import namedtuple, deque
 
 
 RemoteBdic = namedtuple("RemoteBdic", ("name", "version", "extension"))
 
 BDIC_FILES_URL = "https://chromium.googlesource.com/chromium/deps/hunspell_dictionaries.git/+/master/" # noqa
 
+# seconds the remote list of dictionaries is reused without asking the server
+LISTING_TTL = 24 * 3600
+
+# maximum number of dictionaries downloaded at the same time
+MAX_DOWNLOADS = 3
+
 
 spell_checking_dictionaries = variables.define_variable(
     "spell-checking-dictionaries",
@@ -40,6 +48,18 @@ spell_checking_dictionaries = variables.define_variable(
 )
 
 
+def _write_json(path, data):
+    # written in a temp file renamed, so a crash never leaves a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
 class Versions(dict):
     @classmethod
     def from_file(cls, path):
@@ -53,19 +73,132 @@ class Versions(dict):
         return self.get(name, [0, 0])
 
     def write(self, path):
-        with open(path, "w") as f:
-            json.dump(dict(**self), f)
+        _write_json(path, dict(**self))
+
+
+class Listing(object):
+    """
+    The cached list of the remote dictionaries, with the http validators to
+    ask the server if it changed.
+    """
+
+    def __init__(self, remotes=None, time=0, etag=None, last_modified=None):
+        self.remotes = remotes or {}
+        self.time = time
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            return cls({name: RemoteBdic(*r)
+                        for name, r in data["remotes"].items()},
+                       data["time"], data.get("etag"),
+                       data.get("last-modified"))
+        except FileNotFoundError:
+            return cls()
+        except Exception:
+            logging.exception("Unable to read the spell checking dictionaries"
+                              " listing in %s", path)
+            return cls()
+
+    def write(self, path):
+        _write_json(path, {
+            "remotes": {name: list(r) for name, r in self.remotes.items()},
+            "time": self.time,
+            "etag": self.etag,
+            "last-modified": self.last_modified,
+        })
+
+    def is_fresh(self, now=None):
+        now = time.time() if now is None else now
+        return bool(self.remotes) and 0 <= now - self.time < LISTING_TTL
+
+
+def parse_listing(data):
+    """
+    Returns a dict of name -> RemoteBdic from the gitiles json listing.
+    """
+    # A special 5-byte prefix must be stripped from the response
+    # See: https://github.com/google/gitiles/issues/22
+    #      https://github.com/google/gitiles/issues/82
+    json_data = json.loads(data[5:].decode("utf-8"))
+
+    re_bdic = re.compile(r"(.*)-(\d+-\d+)(\.bdic)$")
+    remotes = {}
+    for entry in json_data["entries"]:
+        res = re_bdic.match(entry["name"])
+        if res:
+            name, version, extension = (res.group(1), res.group(2),
+                                        res.group(3))
+            version = [int(e) for e in version.split("-")]
+
+            remotes[name] = RemoteBdic(name, version, extension)
+    return remotes
+
+
+def dictionaries_to_install(names, remotes, versions, local_files):
+    """
+    Returns the RemoteBdic to download, for the wanted dictionary names.
+    """
+    to_install = []
+    for name in names:
+        try:
+            r = remotes[name]
+        except KeyError:
+            logging.warning(
+                "No spell checking dict for %s. \nAvailable: %s"
+                % (name, list(remotes))
+            )
+            continue
+        if name not in local_files:
+            logging.info("Downloading dict %s" % name)
+            to_install.append(r)
+        elif r.version > versions.get_version(name):
+            logging.info("Updating dict %s" % name)
+            to_install.append(r)
+    return to_install
+
+
+class Base64StreamDecoder(object):
+    """
+    Decode base64 data given in chunks, keeping only the incomplete last
+    quantum between two chunks.
+    """
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data):
+        data = self._pending + b"".join(data.split())
+        end = len(data) - len(data) % 4
+        self._pending = data[end:]
+        return binascii.a2b_base64(data[:end]) if end else b""
+
+    def finish(self):
+        if self._pending:
+            raise binascii.Error("Incomplete base64 data")
+        return b""
 
 
 class SpellCheckingTask(Task):
+    description = "spell checking dictionaries update"
+    priority = PRIORITY_LOW
+
     def __init__(self, app, path):
         Task.__init__(self)
         self.app = app
         self.path = path
         self.__versions_path = os.path.join(self.path, "versions.json")
+        self.__listing_path = os.path.join(self.path, "listing.json")
         self.__versions = None
-        self.__modified = False
+        self.__listing = None
+        self.__queue = deque()
         self.__bdic_replies = {}
+        self.__downloads = 0
+        self.__done = False
 
     def start(self):
         if not os.path.isdir(self.path):
@@ -76,52 +209,85 @@ class SpellCheckingTask(Task):
                                 % (self.path, exc))
                 return False
         self.__versions = Versions.from_file(self.__versions_path)
+        self.__listing = Listing.from_file(self.__listing_path)
+        self.__queue.clear()
         self.__bdic_replies.clear()
+        self.__done = False
+
+        if self.__listing.is_fresh():
+            # no network work when the dictionaries are current
+            self._install_all(self.__listing.remotes)
+            return
 
-        reply = self.app.network_manager.get(
-            QNetworkRequest(QUrl(BDIC_FILES_URL + "?format=json")))
+        request = QNetworkRequest(QUrl(BDIC_FILES_URL + "?format=json"))
+        if self.__listing.remotes:
+            if self.__listing.etag:
+                request.setRawHeader(b"If-None-Match",
+                                     self.__listing.etag.encode("utf-8"))
+            if self.__listing.last_modified:
+                request.setRawHeader(
+                    b"If-Modified-Since",
+                    self.__listing.last_modified.encode("utf-8"))
+        reply = self.app.network_manager.get(request)
         reply.finished.connect(self._on_bdic_files_list)
 
     def _on_bdic_files_list(self):
         reply = self.sender()
-        # A special 5-byte prefix must be stripped from the response
-        # See: https://github.com/google/gitiles/issues/22
-        #      https://github.com/google/gitiles/issues/82
-        json_data = json.loads(bytes(reply.readAll())[5:].decode("utf-8"))
-
-        re_bdic = re.compile(r"(.*)-(\d+-\d+)(\.bdic)$")
-        remotes = {}
-        for entry in json_data["entries"]:
-            res = re_bdic.match(entry["name"])
-            if res:
-                name, version, extension = (res.group(1), res.group(2),
-                                            res.group(3))
-                version = [int(e) for e in version.split("-")]
-
-                remotes[name] = RemoteBdic(name, version, extension)
+        reply.deleteLater()
+        listing = self.__listing
+        if reply.error() != QNetworkReply.NetworkError.NoError:
+            logging.warning("Unable to list the spell checking dictionaries:"
+                            " %s", reply.errorString())
+            # use the outdated listing if any
+            self._install_all(listing.remotes)
+            return
+
+        status = reply.attribute(
+            QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        if status != 304:
+            listing.remotes = parse_listing(bytes(reply.readAll()))
+
+            def header(name):
+                value = bytes(reply.rawHeader(name)).decode("utf-8")
+                return value or None
+
+            listing.etag = header(b"ETag")
+            listing.last_modified = header(b"Last-Modified")
+        listing.time = time.time()
+        try:
+            listing.write(self.__listing_path)
+        except OSError:
+            logging.exception("Unable to write %s", self.__listing_path)
+
+        self._install_all(listing.remotes)
 
+    def _install_all(self, remotes):
         local_files = set(os.path.splitext(f)[0] for f in os.listdir(self.path)
                           if f.endswith(".bdic"))
+        self.__queue.extend(dictionaries_to_install(
+            spell_checking_dictionaries.value, remotes, self.__versions,
+            local_files))
+        self.__downloads = len(self.__queue)
+        if self.__downloads:
+            self.set_progress(0, self.__downloads)
+        self._download_next()
+        self._maybe_finish()
 
-        for name in spell_checking_dictionaries.value:
-            try:
-                r = remotes[name]
-            except KeyError:
-                logging.warning(
-                    "No spell checking dict for %s. \nAvailable: %s"
-                    % (name, list(remotes))
-                )
-                continue
-            if name not in local_files:
-                logging.info("Downloading dict %s" % name)
-                self._install(r)
-
-            elif r.version > self.__versions.get(name, [0, 0]):
-                logging.info("Updating dict %s" % name)
-                self._install(r)
-
-        if not self.__bdic_replies:
-            self.finished.emit()
+    def _maybe_finish(self):
+        # replies aborted on error finish while another one is handled, so
+        # this may be called many times once they are all done.
+        if self.__bdic_replies or self.__done:
+            return
+        self.__done = True
+        try:
+            self.__versions.write(self.__versions_path)
+        except OSError:
+            logging.exception("Unable to write %s", self.__versions_path)
+        self.finished.emit()
+
+    def _download_next(self):
+        while self.__queue and len(self.__bdic_replies) < MAX_DOWNLOADS:
+            self._install(self.__queue.popleft())
 
     def _install(self, r):
         url = "{}{}-{}{}?format=TEXT".format(
@@ -131,33 +297,67 @@ class SpellCheckingTask(Task):
             r.extension
         )
         dest = os.path.join(self.path, "{}{}".format(r.name, r.extension))
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".part")
 
         reply = self.app.network_manager.get(QNetworkRequest(QUrl(url)))
-        self.__bdic_replies[reply] = {"bdic": r, "dest": dest, "data": b""}
+        self.__bdic_replies[reply] = {"bdic": r, "dest": dest, "tmp": tmp,
+                                      "file": os.fdopen(fd, "wb"),
+                                      "decoder": Base64StreamDecoder()}
         reply.readyRead.connect(self._bdic_ready_read)
         reply.finished.connect(self._bdic_finished)
 
     def _bdic_ready_read(self):
         reply = self.sender()
-        self.__bdic_replies[reply]["data"] += bytes(reply.readAll())
+        data = self.__bdic_replies[reply]
+        data["file"].write(data["decoder"].feed(bytes(reply.readAll())))
+
+    def _discard(self, data):
+        data["file"].close()
+        try:
+            os.unlink(data["tmp"])
+        except OSError:
+            pass
+
+    def _fail(self, message):
+        if not self.error():
+            self.set_error(message)
+        # abort other replies, their finished signal is emitted
+        self.__queue.clear()
+        for r in list(self.__bdic_replies):
+            r.abort()
 
     def _bdic_finished(self):
         reply = self.sender()
+        reply.deleteLater()
         data = self.__bdic_replies.pop(reply)
         if reply.error() != QNetworkReply.NetworkError.NoError:
-            if not self.error():
-                self.set_error_message(reply.errorString())
-                # abort other replies
-                for r in self.__bdic_replies:
-                    r.abort()
-            if not self.__bdic_replies:
-                self.finished.emit()
-            return
-        with open(data["dest"], 'bw') as f:
-            f.write(base64.decodebytes(data["data"]))
+            self._discard(data)
+            self._fail(reply.errorString())
+        else:
+            try:
+                data["file"].write(data["decoder"].feed(
+                    bytes(reply.readAll())))
+                data["file"].write(data["decoder"].finish())
+                data["file"].close()
+                os.replace(data["tmp"], data["dest"])
+            except (OSError, binascii.Error) as exc:
+                self._discard(data)
+                self._fail("Unable to install %s: %s"
+                           % (data["bdic"].name, exc))
+            else:
+                self.__versions[data["bdic"].name] = data["bdic"].version
 
-        self.__versions[data["bdic"].name] = data["bdic"].version
+        self._download_next()
+        if self.__downloads:
+            self.set_progress(self.__downloads - len(self.__queue)
+                              - len(self.__bdic_replies), self.__downloads)
+        self._maybe_finish()
 
-        if not self.__bdic_replies:
-            self.__versions.write(self.__versions_path)
-            self.finished.emit()
+    def abort(self):
+        self.__queue.clear()
+        for reply, data in list(self.__bdic_replies.items()):
+            reply.readyRead.disconnect(self._bdic_ready_read)
+            reply.finished.disconnect(self._bdic_finished)
+            reply.abort()
+            self._discard(data)
+        self.__bdic_replies.clear()
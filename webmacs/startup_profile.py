@@ -0,0 +1,151 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Timing of the startup phases.
+
+Phases are always timed, it only costs a few clock reads. They are shown on
+the webmacs://startup page, and with the --profile-startup command line
+option, the python functions are profiled too and a json report is written
+so that startup times can be compared between versions.
+
+This module is imported by the command line client, it must not import Qt.
+"""
+
+import os
+import json
+import time
+import contextlib
+
+
+# origin of the times, close to the start of the process
+START = time.monotonic()
+START_TIME = time.time()
+
+_PHASES = []
+_DEPTH = 0
+_PROFILER = None
+_PROFILE_STATS = None
+
+
+def _process_age():
+    # seconds the process ran before START (python startup and first
+    # imports), linux only.
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    age = uptime - start_ticks / os.sysconf("SC_CLK_TCK") \
+        - (time.monotonic() - START)
+    return max(age, 0.0)
+
+
+_PROCESS_AGE = _process_age()
+
+
+def _now():
+    return time.monotonic() - START
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Time a startup phase; phases can be nested.
+    """
+    global _DEPTH
+    entry = {"name": name, "depth": _DEPTH, "start": _now(), "end": None}
+    _PHASES.append(entry)
+    _DEPTH += 1
+    try:
+        yield
+    finally:
+        _DEPTH -= 1
+        entry["end"] = _now()
+
+
+def mark(name):
+    """
+    Record that something happened, like the first page being loaded.
+    """
+    now = _now()
+    _PHASES.append({"name": name, "depth": _DEPTH, "start": now,
+                    "end": now})
+
+
+def enable_profiler():
+    global _PROFILER
+    # imported here, pstats alone takes longer to import than the client
+    import cProfile
+    if _PROFILER is None:
+        _PROFILER = cProfile.Profile()
+        _PROFILER.enable()
+
+
+def stop_profiler():
+    """
+    Stop the profiler if it is running, and keep its statistics.
+    """
+    global _PROFILER, _PROFILE_STATS
+    if _PROFILER is not None:
+        import io
+        import pstats
+        _PROFILER.disable()
+        _PROFILE_STATS = pstats.Stats(_PROFILER, stream=io.StringIO())
+        _PROFILER = None
+
+
+def _profile_functions(limit):
+    if _PROFILE_STATS is None:
+        return []
+    rows = []
+    for (filename, line, func), (_, calls, total, cumulative, _) in \
+            _PROFILE_STATS.stats.items():
+        rows.append({"function": "%s:%d(%s)" % (filename, line, func),
+                     "calls": calls, "total": total,
+                     "cumulative": cumulative})
+    rows.sort(key=lambda r: r["cumulative"], reverse=True)
+    return rows[:limit]
+
+
+def report(functions=50):
+    """
+    Returns the startup report, a dict that can be serialized in json.
+
+    Times are in seconds from the start.
+    """
+    phases = [dict(p, duration=(p["end"] - p["start"])
+                   if p["end"] is not None else None)
+              for p in _PHASES]
+    return {
+        "start-time": START_TIME,
+        "python-startup": _PROCESS_AGE,
+        "total": max((p["end"] or p["start"] for p in phases), default=0),
+        "phases": phases,
+        "functions": _profile_functions(functions),
+    }
+
+
+def write_report(path):
+    """
+    Write the json report, and the profiler statistics next to it (in a
+    .prof file that can be read with pstats or snakeviz) if any.
+    """
+    with open(path, "w") as f:
+        json.dump(report(), f, indent=2)
+    if _PROFILE_STATS is not None:
+        _PROFILE_STATS.dump_stats(os.path.splitext(path)[0] + ".prof")
@@ -13,11 +13,37 @@
 # You should have received a copy of the GNU General Public License
 # along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
+import heapq
 import logging
+import itertools
+import concurrent.futures
+from collections import deque
 
-from PyQt6.QtCore import QObject, pyqtSignal as Signal, pyqtSlot as Slot
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal as Signal, \
+    pyqtSlot as Slot
 
-from . import call_later
+from . import call_later, hooks
+
+
+#: task priorities, the lower the sooner a task is started.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+# maximum number of tasks running at the same time
+MAX_RUNNING = 2
+
+# seconds after which the tasks deferred at startup are started, if no page
+# has finished loading before
+STARTUP_DEFER_TIMEOUT = 10
+
+# number of finished tasks remembered for the webmacs://tasks page
+HISTORY_SIZE = 20
+
+# threads of the worker pool, see run_in_worker. Long jobs (parsing the
+# adblock rules) stay away from the Qt global thread pool.
+WORKER_THREADS = 2
 
 
 class Task(QObject):
@@ -30,10 +56,16 @@ class Task(QObject):
     """
     finished = Signal()
     description = None
+    #: the default priority, see :meth:`TaskRunner.run`.
+    priority = PRIORITY_NORMAL
 
     def __init__(self):
         QObject.__init__(self)
         self.__error = None
+        self.__progress = None
+        # set by the TaskRunner
+        self.queued_at = None
+        self.started_at = None
 
     @Slot()
     def start(self):
@@ -62,34 +94,267 @@ class Task(QObject):
     def set_error(self, message):
         self.__error = message
 
+    def set_progress(self, done, total=None):
+        """
+        Report the progress of the task, shown on the webmacs://tasks page.
+        """
+        self.__progress = (done, total)
+
+    def progress(self):
+        """
+        The (done, total) progress of the task, or None if not reported.
+        """
+        return self.__progress
+
     def __str__(self):
         return self.description or self.__class__.__name__
 
 
 class TaskRunner(QObject):
-    def __init__(self):
+    """
+    Run the tasks by priority, with at most max_running of them at the same
+    time.
+
+    Until a page has finished loading (or STARTUP_DEFER_TIMEOUT), only the high
+    priority tasks are started, so the others do not slow down the startup.
+    Tasks are started one per main loop iteration.
+    """
+
+    def __init__(self, max_running=MAX_RUNNING):
         QObject.__init__(self)
+        self.max_running = max_running
         self.running_tasks = set()
+        #: summaries of the last finished tasks, most recent first
+        self.finished_tasks = deque(maxlen=HISTORY_SIZE)
+        self._pending = []
+        self._counter = itertools.count()
+        self._deferring = True
+        self._scheduled = False
+        hooks.webbuffer_load_finished.add(self._end_deferral)
+        QTimer.singleShot(STARTUP_DEFER_TIMEOUT * 1000, self._end_deferral)
 
-    def run(self, task):
+    def run(self, task, priority=None):
         """
-        Run the task in the next main loop iteration.
+        Queue the task, it is started in a next main loop iteration.
+
+        :param priority: the priority, defaults to the task priority.
         """
-        task.finished.connect(self._on_task_finished)
-        call_later(task.start)
-        logging.info(f"Starting task {task}")
-        self.running_tasks.add(task)
+        if priority is not None:
+            task.priority = priority
+        task.queued_at = time.time()
+        heapq.heappush(self._pending, (task.priority, next(self._counter),
+                                       task))
+        self._schedule()
+        return task
+
+    def pending_tasks(self):
+        """
+        Returns the tasks not started yet, in the order they will be.
+        """
+        return [task for _, _, task in sorted(self._pending)]
+
+    def cancel(self, task):
+        """
+        Cancel a pending or running task. Returns True if it was.
+        """
+        for i, (_, _, pending) in enumerate(self._pending):
+            if pending is task:
+                del self._pending[i]
+                heapq.heapify(self._pending)
+                logging.info(f"Task {task}: cancelled.")
+                return True
+        if task not in self.running_tasks:
+            return False
+        self.running_tasks.remove(task)
+        task.finished.disconnect(self._on_task_finished)
+        task.abort()
+        logging.info(f"Task {task}: cancelled.")
+        self._record(task, "cancelled")
+        self._schedule()
+        return True
 
     @Slot()
     def stop(self):
+        self._pending.clear()
         for task in self.running_tasks:
             task.abort()
 
+    def _end_deferral(self, *args):
+        hooks.webbuffer_load_finished.remove_if_exists(self._end_deferral)
+        if self._deferring:
+            self._deferring = False
+            self._schedule()
+
+    def _schedule(self):
+        if not self._scheduled:
+            self._scheduled = True
+            call_later(self._start_next)
+
+    def _start_next(self):
+        self._scheduled = False
+        if not self._pending or len(self.running_tasks) >= self.max_running:
+            return
+        priority, _, task = self._pending[0]
+        if self._deferring and priority > PRIORITY_HIGH:
+            return
+        heapq.heappop(self._pending)
+        task.finished.connect(self._on_task_finished)
+        task.started_at = time.time()
+        self.running_tasks.add(task)
+        logging.info(f"Starting task {task}")
+        task.start()
+        self._schedule()
+
+    def _record(self, task, state):
+        now = time.time()
+        self.finished_tasks.appendleft({
+            "description": str(task),
+            "state": state,
+            "error": task.error_message(),
+            "waited": task.started_at - task.queued_at,
+            "duration": now - task.started_at,
+            "finished_at": now,
+        })
+
     def _on_task_finished(self):
         task = self.sender()
+        if task not in self.running_tasks:
+            return
         if not task.error():
             logging.info(f"Task {task}: finished.")
         else:
             logging.error(f"Task {task}: Error {task.error_message()}")
 
         self.running_tasks.remove(task)
+        self._record(task, "error" if task.error() else "finished")
+        self._schedule()
+
+
+_EXECUTOR = None
+# futures waiting for their callbacks to be called in the main thread
+_PENDING_FUTURES = set()
+
+
+class WorkerFuture(QObject):
+    """
+    The result of a function run with :func:`run_in_worker`.
+
+    Unlike concurrent.futures.Future, the done callbacks are called in the
+    main (Qt) thread.
+    """
+    _finished = Signal()
+
+    def __init__(self):
+        QObject.__init__(self)
+        self._future = None
+        self._callbacks = []
+        self._cancelled = False
+        # queued, so that callbacks are never called from submit or cancel
+        self._finished.connect(self._on_finished,
+                               Qt.ConnectionType.QueuedConnection)
+
+    def _start(self, fn, args, kwargs):
+        _PENDING_FUTURES.add(self)
+        self._future = _executor().submit(fn, *args, **kwargs)
+        # called in the worker thread, the signal is queued to the main
+        # thread where this object lives.
+        self._future.add_done_callback(lambda _: self._finished.emit())
+
+    def add_done_callback(self, fn):
+        """
+        Call fn(future) in the main thread once the future is done. If it is
+        already done, fn is called right away.
+        """
+        if self not in _PENDING_FUTURES and self.done():
+            fn(self)
+        else:
+            self._callbacks.append(fn)
+
+    def cancel(self):
+        """
+        Cancel the call. A call already running can not be interrupted, but
+        its result is discarded: the future is cancelled anyway.
+        """
+        self._cancelled = True
+        self._future.cancel()
+        return True
+
+    def cancelled(self):
+        # also cancelled by shutdown_workers() before it started
+        return self._cancelled or self._future.cancelled()
+
+    def done(self):
+        return self._cancelled or self._future.done()
+
+    def wait(self):
+        """
+        Block until the call is done, or is cancelled before it started.
+        Unlike the done callbacks, this does not need the Qt event loop.
+        """
+        # not concurrent.futures.wait(), which never returns for the calls
+        # cancelled by the shutdown of the executor.
+        try:
+            self._future.exception()
+        except concurrent.futures.CancelledError:
+            pass
+
+    def result(self):
+        """
+        Returns the result of the call, or raises its exception. Raises
+        concurrent.futures.CancelledError if it was cancelled.
+        """
+        if self.cancelled():
+            raise concurrent.futures.CancelledError()
+        return self._future.result(timeout=0)
+
+    def exception(self):
+        if self.cancelled():
+            raise concurrent.futures.CancelledError()
+        return self._future.exception(timeout=0)
+
+    @Slot()
+    def _on_finished(self):
+        _PENDING_FUTURES.discard(self)
+        callbacks, self._callbacks = self._callbacks, []
+        if not callbacks and not self.cancelled() \
+           and self._future.exception() is not None:
+            exc = self._future.exception()
+            logging.error("Unhandled exception in a worker thread",
+                          exc_info=(type(exc), exc, exc.__traceback__))
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logging.exception("Error in a worker future callback")
+
+
+def _executor():
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+            WORKER_THREADS, thread_name_prefix="webmacs-worker")
+    return _EXECUTOR
+
+
+def run_in_worker(fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) in a thread of the worker pool, and returns a
+    :class:`WorkerFuture`.
+
+    Must be called from the main thread. fn must not use Qt objects of the
+    main thread, give it plain data and use the result in a done callback.
+    """
+    future = WorkerFuture()
+    future._start(fn, args, kwargs)
+    return future
+
+
+def shutdown_workers():
+    """
+    Cancel the calls not started yet. Running calls are finished before the
+    interpreter exits.
+    """
+    global _EXECUTOR
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _EXECUTOR = None
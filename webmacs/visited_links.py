@@ -14,8 +14,10 @@
 # along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
 
 import sqlite3
+import threading
 from datetime import datetime
 from . import variables
+from .task import run_in_worker
 
 
 visited_links_display_limit = variables.define_variable(
@@ -27,13 +29,36 @@ visited_links_display_limit = variables.define_variable(
 )
 
 
+def _search(conn, text, limit):
+    clauses, args = [], []
+    for word in text.split():
+        word = word.replace("\\", "\\\\").replace("%", "\\%") \
+                   .replace("_", "\\_")
+        clauses.append("(url LIKE ? ESCAPE '\\'"
+                       " OR title LIKE ? ESCAPE '\\')")
+        args.extend(("%" + word + "%",) * 2)
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    return [(row[0], row[1]) for row in conn.execute(
+        "select url, title from visitedlinks %s order by lastseen DESC"
+        " LIMIT %d" % (where, limit), args
+    )]
+
+
 class VisitedLinks(object):
     def __init__(self, dbbath):
-        self._conn = sqlite3.connect(dbbath)
+        if dbbath == ":memory:":
+            # shared, so that the worker connection sees the same database
+            dbbath = "file:visitedlinks-%d?mode=memory&cache=shared" \
+                % id(self)
+        self._path = dbbath
+        self._conn = sqlite3.connect(dbbath, uri=dbbath.startswith("file:"))
         self._conn.execute("""
         CREATE TABLE IF NOT EXISTS visitedlinks
         (url TEXT PRIMARY KEY, title TEXT, lastseen DATE);
         """)
+        # connection used by the worker threads for the searches
+        self._reader = None
+        self._reader_lock = threading.Lock()
 
     def visit(self, url, title):
         self._conn.execute("""
@@ -48,6 +73,41 @@ class VisitedLinks(object):
             " LIMIT %d" % visited_links_display_limit.value
         )]
 
+    def search(self, text, limit):
+        """
+        Returns (url, title) of the most recently visited links containing
+        every word of the given text in their url or title.
+        """
+        return _search(self._conn, text, limit)
+
+    def search_in_worker(self, text, limit):
+        """
+        Like :meth:`search`, but the query runs in a worker thread on its own
+        connection. Returns a :class:`webmacs.task.WorkerFuture`.
+        """
+        return run_in_worker(self._worker_search, text, limit)
+
+    def _worker_search(self, text, limit):
+        with self._reader_lock:
+            if self._reader is None:
+                self._reader = sqlite3.connect(
+                    self._path, uri=self._path.startswith("file:"),
+                    check_same_thread=False)
+                # do not wait for the writes of the main connection when the
+                # database is shared in memory
+                self._reader.execute("PRAGMA read_uncommitted = 1")
+            return _search(self._reader, text, limit)
+
+    def close_reader(self):
+        """
+        Close the connection of the worker threads, waiting for a running
+        search. It is opened again by the next search.
+        """
+        with self._reader_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
     def remove(self, url):
         self._conn.execute("""
         DELETE from visitedlinks WHERE url = ?
@@ -16,13 +16,16 @@
 import logging
 import time
 import json
+import zlib
 
-from PyQt6.QtCore import QUrl, pyqtSlot as Slot
+from PyQt6.QtCore import QUrl, QByteArray, QDataStream, QIODevice, \
+    pyqtSlot as Slot
+from PyQt6.QtGui import QIcon
 from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineScript
 from PyQt6.QtWebChannel import QWebChannel
 from collections import namedtuple
 
-from . import hooks, variables, windows
+from . import hooks, variables, windows, content_scripts
 from . import BUFFERS, current_minibuffer, minibuffer_show_info, \
     current_buffer, call_later, current_window, recent_buffers
 from .content_handler import WebContentHandler
@@ -44,9 +47,49 @@ close_buffer_close_window = variables.define_variable(
     type=variables.String(choices=("never", "all", "all-but-last")),
 )
 
+# used by the buffer list prompts, defined here so that it can be set before
+# the buffer commands are loaded.
+switch_buffer_current_color = variables.define_variable(
+    "switch-buffer-current-color",
+    "The color to use for the current buffer in the switch-buffer list."
+    " Set to an empty string if you don't want a special color.",
+    "#c0d5f7",
+    type=variables.String(),
+)
+
+
+# a tuple of QUrl, str to delay loading of a page, with the compressed
+# navigation history to restore if any (see serialize_history).
+DelayedLoadingUrl = namedtuple("DelayedLoadingUrl", ("url", "title",
+                                                     "history"),
+                               defaults=(None,))
+
+
+def serialize_history(history):
+    """
+    Returns the given QWebEngineHistory serialized and compressed, as bytes.
+    """
+    data = QByteArray()
+    stream = QDataStream(data, QIODevice.OpenModeFlag.WriteOnly)
+    stream << history
+    return zlib.compress(bytes(data))
 
-# a tuple of QUrl, str to delay loading of a page.
-DelayedLoadingUrl = namedtuple("DelayedLoadingUrl", ("url", "title"))
+
+def restore_history(history, blob):
+    """
+    Restore a QWebEngineHistory from the result of serialize_history.
+    """
+    data = QByteArray(zlib.decompress(blob))
+    stream = QDataStream(data, QIODevice.OpenModeFlag.ReadOnly)
+    stream >> history
+
+
+def _insert_buffer(buff):
+    cb = current_buffer()
+    if cb:
+        BUFFERS.insert(BUFFERS.index(cb) + 1, buff)
+    else:
+        BUFFERS.append(buff)
 
 
 def close_buffer(wb):
@@ -77,6 +120,11 @@ def close_buffer(wb):
             # associate the first buffer that does not have any view yet
             view.setBuffer(invisibles[0])
 
+    if isinstance(wb, BufferPlaceholder):
+        BUFFERS.remove(wb)
+        hooks.webbuffer_closed(wb)
+        return True
+
     internal_view = wb.internal_view()
     if internal_view:
         # remove the associated internal page view (might be causing a crash
@@ -107,25 +155,29 @@ class WebBuffer(QWebEnginePage):
         JSMessageLevel.ErrorMessageLevel: logging.ERROR,
     }
 
-    def __init__(self, url=None):
+    def __init__(self, url=None, placeholder=None):
         """
         Create a webbuffer.
 
         :param url: the url to use for the buffer. Must be an instance of QUrl,
             an str or None to not load any url.
+        :param placeholder: a :class:`BufferPlaceholder` this buffer replaces.
         """
         QWebEnginePage.__init__(self, app().profile.q_profile, None)
-        self.last_use = time.time()
-        cb = current_buffer()
-        if cb:
-            BUFFERS.insert(BUFFERS.index(cb) + 1, self)
+        if placeholder is not None:
+            self.last_use = placeholder.last_use
+            BUFFERS[BUFFERS.index(placeholder)] = self
+            hooks.webbuffer_replaced(placeholder, self)
         else:
-            BUFFERS.append(self)
+            self.last_use = time.time()
+            _insert_buffer(self)
         hooks.webbuffer_created(self)
 
         self.fullScreenRequested.connect(self._on_full_screen_requested)
         self.featurePermissionRequested.connect(self._on_feature_requested)
         self._content_handler = WebContentHandler(self)
+        # the content script modules injected in this page
+        self._content_modules = set()
         channel = QWebChannel(self)
         channel.registerObject("contentHandler", self._content_handler)
 
@@ -136,11 +188,15 @@ class WebBuffer(QWebEnginePage):
         self.authenticationRequired.connect(self.handle_authentication)
         self.linkHovered.connect(self.on_url_hovered)
         self.titleChanged.connect(self.__on_title_changed)
+        self.urlChanged.connect(self.__on_url_changed)
         self.__delay_loading_url = None
+        self.__history_blob = None
         self.__keymap_mode = Mode.KEYMAP_NORMAL
         self.__mode = get_mode("standard-mode")
         self.__text_edit_mark = False
         self._internal_view = None
+        # never frozen while hidden, see the lifecycle module
+        self.keep_alive = False
 
         if url:
             if isinstance(url, DelayedLoadingUrl):
@@ -151,6 +207,19 @@ class WebBuffer(QWebEnginePage):
     def internal_view(self):
         return self._internal_view
 
+    @property
+    def last_use(self):
+        """
+        The time this buffer was last displayed.
+        """
+        return self.__last_use
+
+    @last_use.setter
+    def last_use(self, value):
+        self.__last_use = value
+        # keep the buffers ordered by use
+        BUFFERS.last_use_changed(self)
+
     def view(self):
         iv = self._internal_view
         try:
@@ -186,6 +255,36 @@ class WebBuffer(QWebEnginePage):
     def delayed_loading_url(self):
         return self.__delay_loading_url
 
+    def load_delayed(self):
+        """
+        Load the delayed url if any, restoring its navigation history.
+        """
+        delayed = self.__delay_loading_url
+        if delayed is None:
+            return
+        if delayed.history:
+            self.__delay_loading_url = None
+            try:
+                # this navigates to the current history item
+                restore_history(self.history(), delayed.history)
+                return
+            except Exception:
+                logging.exception("Unable to restore the history of %s",
+                                  delayed.url.toString())
+        self.load(delayed.url)
+
+    def history_blob(self):
+        """
+        Returns the navigation history as given by serialize_history, or
+        None if there is no history.
+        """
+        delayed = self.__delay_loading_url
+        if delayed:
+            return delayed.history
+        if self.__history_blob is None and self.history().count() > 0:
+            self.__history_blob = serialize_history(self.history())
+        return self.__history_blob
+
     def url(self):
         if self.__delay_loading_url:
             return self.__delay_loading_url.url
@@ -226,37 +325,76 @@ class WebBuffer(QWebEnginePage):
     def scroll_by(self, x=0, y=0):
         self.runJavaScript("window.scrollBy(%d, %d);" % (x, y))
 
+    def _inject_content_module(self, module):
+        """
+        Inject a content script module in the page, and returns the code
+        initializing it in the current document of the main frame.
+        """
+        frame_api = content_scripts.frame_api()
+        script = QWebEngineScript()
+        script.setName("webmacs-module-" + module)
+        # after the bootstrap, injected at document creation
+        script.setInjectionPoint(
+            QWebEngineScript.InjectionPoint.DocumentReady)
+        script.setWorldId(QWebEngineScript.ScriptWorldId.ApplicationWorld)
+        script.setRunsOnSubFrames(True)
+        if frame_api:
+            source = content_scripts.module_source(module)
+            script.setSourceCode(source)
+            self.scripts().insert(script)
+            frames = self.mainFrame().children()
+            while frames:
+                frame = frames.pop()
+                frame.runJavaScript(
+                    source, QWebEngineScript.ScriptWorldId.ApplicationWorld)
+                frames.extend(frame.children())
+            return source
+        # the module is defined in the bootstrap
+        script.setSourceCode(content_scripts.load_script(module))
+        self.scripts().insert(script)
+        return content_scripts.load_script(module, sub_frames=True)
+
+    def run_content_script(self, module, script, callback=None):
+        """
+        Run script in the application world of the page, injecting first
+        the content script module it requires (see webmacs.content_scripts)
+        if it is not injected yet.
+        """
+        if module not in self._content_modules:
+            script = self._inject_content_module(module) + script
+            self._content_modules.add(module)
+        if callback is None:
+            self.runJavaScript(
+                script, QWebEngineScript.ScriptWorldId.ApplicationWorld)
+        else:
+            self.runJavaScript(
+                script, QWebEngineScript.ScriptWorldId.ApplicationWorld,
+                callback)
+
     def start_select_browser_objects(self, selector, method="filter",
                                      method_options=None):
-        self.runJavaScript(
+        self.run_content_script(
+            "hint",
             "hints.selectBrowserObjects(%r, %r, %r);"
-            % (selector, method, json.dumps(method_options)),
-            QWebEngineScript.ScriptWorldId.ApplicationWorld)
+            % (selector, method, json.dumps(method_options)))
 
     def stop_select_browser_objects(self):
-        self.runJavaScript(
-            "hints.clearBrowserObjects();",
-            QWebEngineScript.ScriptWorldId.ApplicationWorld)
+        self.run_content_script("hint", "hints.clearBrowserObjects();")
 
     def select_next_browser_object(self, forward=True):
-        self.runJavaScript(
-            "hints.activateNextHint(%s);" % ("false" if forward else "true",),
-            QWebEngineScript.ScriptWorldId.ApplicationWorld)
+        self.run_content_script(
+            "hint",
+            "hints.activateNextHint(%s);" % ("false" if forward else "true",))
 
     def filter_browser_objects(self, text):
-        self.runJavaScript(
-            "hints.filterSelection(%r);" % text,
-            QWebEngineScript.ScriptWorldId.ApplicationWorld)
+        self.run_content_script("hint", "hints.filterSelection(%r);" % text)
 
     def focus_active_browser_object(self):
-        self.runJavaScript(
-            "hints.followCurrentLink();",
-            QWebEngineScript.ScriptWorldId.ApplicationWorld)
+        self.run_content_script("hint", "hints.followCurrentLink();")
 
     def select_visible_hint(self, hint_id):
-        self.runJavaScript(
-            "hints.selectVisibleHint(%r);" % hint_id,
-            QWebEngineScript.ScriptWorldId.ApplicationWorld)
+        self.run_content_script("hint",
+                                "hints.selectVisibleHint(%r);" % hint_id)
 
     @Slot("QWebEngineFullScreenRequest")
     def _on_full_screen_requested(self, request):
@@ -403,6 +541,71 @@ class WebBuffer(QWebEnginePage):
         if self.view():
             self.view().main_window.update_title(title)
 
+    @Slot(QUrl)
+    def __on_url_changed(self, url):
+        # the history has changed
+        self.__history_blob = None
+
 
 # alias to create a web buffer
 create_buffer = WebBuffer
+
+
+class BufferPlaceholder(object):
+    """
+    A buffer that has not been displayed yet, e.g. restored from the session.
+
+    It is cheap: it only holds a :class:`DelayedLoadingUrl` and its last use
+    time, and it is replaced by a real :class:`WebBuffer` in
+    :const:`webmacs.BUFFERS` when it is first displayed in a view (see
+    :meth:`materialize`).
+
+    Unlike :class:`WebBuffer`, creating a placeholder does not call the
+    webbuffer_created hook, this is done when it is materialized.
+    """
+    __slots__ = ("_delayed", "_buffer", "_last_use")
+
+    def __init__(self, delayed, last_use=None):
+        self._delayed = delayed
+        self._buffer = None
+        self._last_use = time.time() if last_use is None else last_use
+        _insert_buffer(self)
+
+    @property
+    def last_use(self):
+        return self._last_use
+
+    @last_use.setter
+    def last_use(self, value):
+        self._last_use = value
+        BUFFERS.last_use_changed(self)
+
+    def materialize(self):
+        """
+        Returns the :class:`WebBuffer` replacing this placeholder, creating it
+        if needed.
+        """
+        if self._buffer is None:
+            self._buffer = WebBuffer(self._delayed, placeholder=self)
+        return self._buffer
+
+    def url(self):
+        return self._delayed.url
+
+    def title(self):
+        return self._delayed.title
+
+    def icon(self):
+        return QIcon()
+
+    def delayed_loading_url(self):
+        return self._delayed
+
+    def history_blob(self):
+        return self._delayed.history
+
+    def view(self):
+        return None
+
+    def internal_view(self):
+        return None
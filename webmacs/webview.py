@@ -21,7 +21,7 @@ from PyQt6.QtCore import QEvent
 
 from .keyboardhandler import local_keymap, set_local_keymap, \
     LOCAL_KEYMAP_SETTER
-from . import windows, variables
+from . import windows, variables, hooks
 
 
 def _update_stylesheets(var):
@@ -79,12 +79,23 @@ class WebView(QFrame):
             if iv:
                 iv.setFocus()
 
+        previous = self.buffer()
         self._detach_view()
+        if previous is not None and previous is not buffer:
+            hooks.webbuffer_hidden(previous)
 
         if buffer is None:
             self.main_window.update_title()
             return
 
+        from .webbuffer import BufferPlaceholder
+        if isinstance(buffer, BufferPlaceholder):
+            buffer = buffer.materialize()
+        elif buffer.lifecycleState() != buffer.LifecycleState.Active:
+            # frozen or discarded by the lifecycle policy; a discarded
+            # buffer is reloaded.
+            buffer.setLifecycleState(buffer.LifecycleState.Active)
+
         if buffer._internal_view is None:
             buffer._internal_view = InternalWebView(self)
             buffer._internal_view.setPage(buffer)
@@ -93,9 +104,9 @@ class WebView(QFrame):
 
         self._attach_view(buffer._internal_view)
 
-        url = buffer.delayed_loading_url()
-        if url:
-            buffer.load(url.url)
+        buffer.load_delayed()
+        if buffer is not previous:
+            hooks.webbuffer_shown(buffer)
         self.main_window.update_title()
         LOCAL_KEYMAP_SETTER.buffer_opened_in_view(buffer)
         # mark the buffer to be the most recently opened
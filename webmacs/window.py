@@ -18,7 +18,7 @@ from PyQt6.QtCore import Qt, QRect
 
 from .minibuffer import Minibuffer
 from .egrid import ViewGridLayout
-from . import WINDOWS_HANDLER
+from .windows_handler import WINDOWS_HANDLER
 from . import hooks, variables
 
 
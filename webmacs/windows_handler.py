@@ -0,0 +1,63 @@
+# This file is part of webmacs.
+#
+# webmacs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# webmacs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with webmacs.  If not, see <http://www.gnu.org/licenses/>.
+
+from PyQt6.QtCore import QObject, QEvent
+
+from . import hooks
+
+
+# handler for windows, to be able to list them and determine the one currently
+# active.
+class WindowsHandler(QObject):
+    def __init__(self, parent=None):
+        QObject.__init__(self, parent)
+        self.windows = []
+        self.current_window = None
+
+    def _on_last_window_closing(self):
+        from . import daemon
+        if daemon.DAEMON is not None:
+            # a daemon keeps running without windows.
+            return False
+        # last window is closed, do not remove it from the list but exit the
+        # application. This is required from proper session saving.
+        from .application import app
+        app().quit()
+        return True
+
+    def register_window(self, window):
+        window.installEventFilter(self)
+        self.windows.append(window)
+        hooks.window_created(window)
+
+    def eventFilter(self, window, event):
+        t = event.type()
+        if t == QEvent.Type.WindowActivate:
+            self.current_window = window
+            hooks.window_activated(window)
+        elif t == QEvent.Type.Close:
+            if window.quit_if_last_closed and len(self.windows) == 1:
+                if self._on_last_window_closing():
+                    return True
+            self.windows.remove(window)
+            window.deleteLater()
+            if window == self.current_window:
+                self.current_window = None
+            hooks.window_closed(window)
+
+        return QObject.eventFilter(self, window, event)
+
+
+WINDOWS_HANDLER = WindowsHandler()